@@ -0,0 +1,330 @@
+"""
+Compiled binary cache of GTFS tables, kept in a directory next to the feed.
+
+Each table is stored as one `.npy` file per column. Numeric columns are
+written as-is and memory-mapped on load. String columns are stored as
+integer codes plus a table of the unique strings, and loaded as a
+`StringColumn` with the codes memory-mapped. Entries are keyed by the
+size, modification time and content hash of the source files, so a
+changed feed is rebuilt automatically the next time it is loaded.
+
+What's cached is the parsed columns, which skips reading and tokenizing
+the CSV files. The table classes (`Stops`, `Trips`, ...) still build
+their per-row objects from the columns, when the table is first used.
+"""
+
+
+import hashlib
+import json
+import numpy as np
+import os
+from pathlib import Path
+import shutil
+from typing import Callable, Dict, Iterator, List, Optional, TypeAlias
+
+
+class StringColumn:
+	"""
+	A cached string column as integer codes into its unique strings. Only
+	the unique strings are held in memory, rows are decoded as they're 
+	indexed or iterated. `np.asarray()` decodes the whole column.
+	"""
+	_codes: np.ndarray
+	_strings: np.ndarray
+
+	def __init__(
+		self,
+		codes: np.ndarray,
+		strings: np.ndarray
+	) -> None:
+		"""
+		"""
+		self._codes = codes
+		self._strings = strings
+
+	@property
+	def codes(self) -> np.ndarray: return self._codes
+	@property
+	def strings(self) -> np.ndarray: return self._strings
+
+	def __len__(self) -> int:
+		return len(self._codes)
+
+	def __getitem__(
+		self,
+		i: "int|np.integer|slice|np.ndarray"
+	) -> "str|np.ndarray":
+		"""
+		A single row is a `str`, anything else an array of them.
+		"""
+		if isinstance(i, (int, np.integer)):
+			return str(self._strings[self._codes[i]])
+
+		return self._strings[self._codes[i]]
+
+	def __iter__(self) -> Iterator[str]:
+		for code in self._codes:
+			yield str(self._strings[code])
+
+	def __array__(
+		self,
+		dtype: Optional[np.dtype] = None,
+		copy: Optional[bool] = None
+	) -> np.ndarray:
+		values = self._strings[self._codes]
+
+		if dtype is not None:
+			return values.astype(dtype)
+		return values
+
+
+Columns: TypeAlias = Dict[str, "np.ndarray|StringColumn"]
+
+
+class FeedCache:
+	"""
+	`manifest.json` records, per table, the fingerprint of its source files
+	and which columns are string tables.
+
+	{table_name: {
+		"version": [cache format version, table layout version],
+		"sources": {file_name: {"size": int, "mtime_ns": int, "hash": str}},
+		"columns": {column_name: "array"|"strings"}
+	}}
+	"""
+	_format_version: int = 1
+	_hash_chunk_size: int = 1 << 20
+
+	_cache_dir: Path
+	_manifest_path: Path
+	_manifest: Dict[str, Dict]
+
+	def __init__(
+		self,
+		feed_path: Path,
+		cache_dir: Optional[Path] = None
+	) -> None:
+		"""
+		By default the cache for `gtfs/MTS_JUN25` lives in
+		`gtfs/MTS_JUN25.cache`.
+		"""
+		feed_path = Path(feed_path)
+
+		if cache_dir is None:
+			cache_dir = feed_path.with_name(feed_path.name + ".cache")
+
+		self._cache_dir = Path(cache_dir)
+		self._manifest_path = self._cache_dir / "manifest.json"
+
+		try:
+			with open(self._manifest_path, 'r') as f:
+				self._manifest = json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			self._manifest = {}
+
+	def __repr__(self) -> str:
+		return f"FeedCache(cache_dir={self._cache_dir})"
+
+	@property
+	def cache_dir(self) -> Path: return self._cache_dir
+
+	@classmethod
+	def hash_file(
+		cls,
+		path: Path
+	) -> str:
+		"""
+		"""
+		h = hashlib.blake2b(digest_size = 16)
+
+		with open(path, 'rb') as f:
+			while True:
+				chunk = f.read(cls._hash_chunk_size)
+				if not chunk:
+					break
+				h.update(chunk)
+
+		return h.hexdigest()
+
+	@classmethod
+	def fingerprint(
+		cls,
+		paths: List[Path]
+	) -> Dict[str, Dict]:
+		"""
+		"""
+		fp: Dict[str, Dict] = {}
+
+		for path in paths:
+			stat = os.stat(path)
+			fp[Path(path).name] = {
+				"size": stat.st_size,
+				"mtime_ns": stat.st_mtime_ns,
+				"hash": cls.hash_file(path)
+			}
+
+		return fp
+
+	def _is_fresh(
+		self,
+		table_name: str,
+		paths: List[Path],
+		version: int
+	) -> bool:
+		"""
+		Size and mtime are checked first. The content hash is only computed
+		when the size matches but the mtime doesn't (e.g. a re-download of
+		the same feed), and a match refreshes the stored mtime.
+		"""
+		try:
+			entry = self._manifest[table_name]
+		except KeyError:
+			return False
+
+		if entry.get("version") != [self._format_version, version]:
+			return False
+
+		sources = entry["sources"]
+
+		if sorted(sources.keys()) != sorted(Path(p).name for p in paths):
+			return False
+
+		touched = False
+
+		for path in paths:
+			rec = sources[Path(path).name]
+
+			try:
+				stat = os.stat(path)
+			except FileNotFoundError:
+				return False
+
+			if stat.st_size != rec["size"]:
+				return False
+
+			if stat.st_mtime_ns == rec["mtime_ns"]:
+				continue
+
+			if self.hash_file(path) != rec["hash"]:
+				return False
+
+			rec["mtime_ns"] = stat.st_mtime_ns
+			touched = True
+
+		if touched:
+			self._write_manifest()
+
+		return True
+
+	def _write_manifest(self) -> None:
+		"""
+		"""
+		self._cache_dir.mkdir(parents = True, exist_ok = True)
+
+		tmp_path = self._manifest_path.with_suffix(".json.tmp")
+
+		with open(tmp_path, 'w') as f:
+			json.dump(self._manifest, f, indent = 1)
+
+		os.replace(tmp_path, self._manifest_path)
+
+	def _read_table(
+		self,
+		table_name: str
+	) -> Columns:
+		"""
+		"""
+		table_dir = self._cache_dir / table_name
+		cols: Columns = {}
+
+		for col, kind in self._manifest[table_name]["columns"].items():
+			if kind == "strings":
+				cols[col] = StringColumn(
+					np.load(table_dir / f"{col}.npy", mmap_mode = 'r'),
+					np.load(table_dir / f"{col}.strings.npy")
+				)
+			else:
+				cols[col] = np.load(table_dir / f"{col}.npy", mmap_mode = 'r')
+
+		return cols
+
+	def _write_table(
+		self,
+		table_name: str,
+		cols: Columns
+	) -> Dict[str, str]:
+		"""
+		Writes into a scratch directory first so an interrupted write never
+		leaves a half-built table behind a valid manifest entry.
+		"""
+		table_dir = self._cache_dir / table_name
+		tmp_dir = self._cache_dir / f"{table_name}.tmp"
+
+		shutil.rmtree(tmp_dir, ignore_errors = True)
+		tmp_dir.mkdir(parents = True)
+
+		kinds: Dict[str, str] = {}
+
+		for col, values in cols.items():
+			values = np.asarray(values)
+
+			if values.dtype.kind in ('U', 'S', 'O'):
+				strings, codes = np.unique(
+					values.astype(str),
+					return_inverse = True
+				)
+				np.save(tmp_dir / f"{col}.npy", codes.astype(np.int32))
+				np.save(tmp_dir / f"{col}.strings.npy", strings)
+				kinds[col] = "strings"
+			else:
+				np.save(tmp_dir / f"{col}.npy", values)
+				kinds[col] = "array"
+
+		shutil.rmtree(table_dir, ignore_errors = True)
+		os.replace(tmp_dir, table_dir)
+
+		return kinds
+
+	def load(
+		self,
+		table_name: str,
+		source_paths: List[Path],
+		build: Callable[[], Columns],
+		version: int = 1
+	) -> Columns:
+		"""
+		Returns the cached columns for `table_name` if `source_paths` are
+		unchanged since they were cached, otherwise calls `build()` and
+		caches its result. Bump `version` when the layout `build()` returns
+		changes.
+		"""
+		source_paths = [Path(p) for p in source_paths]
+
+		if self._is_fresh(table_name, source_paths, version):
+			try:
+				return self._read_table(table_name)
+			except (FileNotFoundError, ValueError, OSError):
+				pass ## fall through and rebuild
+
+		cols = build()
+
+		try:
+			kinds = self._write_table(table_name, cols)
+		except OSError:
+			## Read-only feed location, etc. The cache is only an optimization.
+			return cols
+
+		self._manifest[table_name] = {
+			"version": [self._format_version, version],
+			"sources": self.fingerprint(source_paths),
+			"columns": kinds
+		}
+		self._write_manifest()
+
+		return self._read_table(table_name)
+
+	def clear(self) -> None:
+		"""
+		"""
+		shutil.rmtree(self._cache_dir, ignore_errors = True)
+		self._manifest = {}
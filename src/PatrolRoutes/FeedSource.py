@@ -0,0 +1,139 @@
+"""
+Where a GTFS feed's tables are read from: a directory of `.txt` files or
+the zip archive agencies publish them in.
+
+Zip members are read straight from the archive. Each one is decompressed
+incrementally as the CSV parser reads it in chunks, so nothing is
+extracted to disk and a member is never held in memory whole.
+
+`read_csv_filtered()` drops unwanted rows chunk by chunk as a table is
+parsed, so filtered loads only ever hold the rows they keep.
+"""
+
+
+from contextlib import contextmanager
+import pandas as pd
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterator, List
+import zipfile
+
+
+CSV_CHUNK_ROWS: int = 1 << 18
+
+
+class MissingTableException(FileNotFoundError):
+	def __init__(
+		self,
+		feed_path: Path,
+		table_name: str
+	) -> None:
+		"""
+		"""
+		super().__init__(f"{feed_path} has no {table_name}.txt.")
+
+
+class FeedSource:
+	"""
+	Zip archives may keep the tables in a subdirectory (e.g. when the feed
+	directory itself was zipped), members are found by file name.
+	"""
+	_path: Path
+	_members: Dict[str, str] ## table file name: archive member name
+
+	def __init__(
+		self,
+		feed_path: Path
+	) -> None:
+		"""
+		"""
+		self._path = Path(feed_path)
+		self._members = {}
+
+		if self.is_zip:
+			with zipfile.ZipFile(self._path) as zf:
+				for info in zf.infolist():
+					name = Path(info.filename).name
+
+					if info.is_dir() or (name in self._members):
+						continue
+
+					self._members[name] = info.filename
+
+	def __repr__(self) -> str:
+		return f"FeedSource(path={self._path})"
+
+	@property
+	def path(self) -> Path: return self._path
+
+	@property
+	def is_zip(self) -> bool:
+		return self._path.is_file() and zipfile.is_zipfile(self._path)
+
+	def has_table(
+		self,
+		table_name: str
+	) -> bool:
+		"""
+		"""
+		file_name = f"{table_name}.txt"
+
+		if self.is_zip:
+			return file_name in self._members
+
+		return (self._path / file_name).is_file()
+
+	def source_paths(
+		self,
+		table_name: str
+	) -> List[Path]:
+		"""
+		Files `table_name` is read from, to fingerprint for `FeedCache`. For
+		an archive that's the whole archive, so the cache is rebuilt once
+		per new version of it.
+		"""
+		if self.is_zip:
+			return [self._path]
+
+		return [self._path / f"{table_name}.txt"]
+
+	@contextmanager
+	def open(
+		self,
+		table_name: str
+	) -> "Iterator[Path|IO[bytes]]":
+		"""
+		The table's path in a directory feed, otherwise a binary stream of
+		the archive member. Either can be passed to `pd.read_csv()`.
+		"""
+		if not self.has_table(table_name):
+			raise MissingTableException(self._path, table_name)
+
+		if not self.is_zip:
+			yield self._path / f"{table_name}.txt"
+			return
+
+		with zipfile.ZipFile(self._path) as zf:
+			with zf.open(self._members[f"{table_name}.txt"]) as member:
+				yield member
+
+
+def read_csv_filtered(
+	table: "Path|IO[bytes]",
+	keep: "Callable[[pd.DataFrame], pd.Series]",
+	chunk_rows: int = CSV_CHUNK_ROWS,
+	**read_csv_kwargs: Any
+) -> pd.DataFrame:
+	"""
+	`pd.read_csv(table, **read_csv_kwargs)`, but read `chunk_rows` rows at
+	a time and only keeping the rows of each chunk `keep()` is true for.
+	"""
+	chunks = [
+		chunk[keep(chunk).to_numpy(dtype = bool)]
+		for chunk in pd.read_csv(
+			table,
+			chunksize = chunk_rows,
+			**read_csv_kwargs
+		)
+	]
+
+	return pd.concat(chunks, ignore_index = True)
@@ -14,12 +14,16 @@ where actual objects are stored.
 """
 
 
+from collections import OrderedDict
 from datetime import datetime
+import numpy as np
 from pathlib import Path
-from typing import Iterator, List
+from typing import Callable, IO, Iterable, Iterator, List, Optional, Set
 
 
-from .GTFSService import DateServices
+from .FeedCache import Columns, FeedCache
+from .FeedSource import FeedSource
+from .GTFSService import DateServices, ServiceExceptions
 from .Trips import Trips, Trip
 from .Settings import Settings
 from .Shapes import Shapes
@@ -27,58 +31,85 @@ from .Stops import Stops, Stop
 from .StopTimes import StopTimes, StopTime
 
 
+class TablesLoadedException(Exception):
+	def __init__(
+		self,
+		gtfs: "GTFS",
+		loaded_tables: List[str]
+	) -> None:
+		"""
+		"""
+		super().__init__(
+			f"Can't restrict {gtfs}, {', '.join(loaded_tables)} already "
+			f"loaded."
+		)
+
+
 class GTFS:
 	"""
 	Container + parser for all of the above. Route is top level, has trips,
 	which have a shape and two or more stops. 
 	"""
 	_gtfs_strf: str = "%Y%m%d"
+	_date_cache_size: int = 8 ## service dates to keep active trip masks for
 
 	_gtfs_dir: Path
-	_services: DateServices
-	_trips: Trips
-	_stops: Stops
-	_stop_times: StopTimes
-	_shapes: Shapes
+	_source: FeedSource
+	_settings: Settings
+	_cache: Optional[FeedCache]
+
+	## Each table is parsed the first time it's used, see the properties
+	_services: Optional[DateServices]
+	_trips: Optional[Trips]
+	_stops: Optional[Stops]
+	_stop_times: Optional[StopTimes]
+	_shapes: Optional[Shapes]
+
+	## Set by `restrict()`, `None` loads everything
+	_service_ids: Optional[List[str]]
+	_stop_ids: Optional[Set[int]]
+	_trip_cols: Optional[Columns] ## trips read with the restrictions
+
+	## Date string: `StopTimes.trip_mask()` of the trips running that day,
+	## least recently used first
+	_date_trip_masks: "OrderedDict[str, np.ndarray]"
 
 	def __init__(
 		self,
 		gtfs_dir: Path,
-		settings: Settings
+		settings: Settings,
+		use_cache: bool = True,
+		cache_dir: Optional[Path] = None
 	) -> None:
 		"""
-		"""
-		self._gtfs_dir = gtfs_dir
+		`gtfs_dir` is the feed directory or its zip archive, which is read
+		without extracting it.
 
-		print(f"Loading GTFS set at {self._gtfs_dir}...")
-
-		print("\tLoading service info...")
-		self._services = DateServices(
-			self._gtfs_dir / "calendar.txt",
-			self._gtfs_dir / "calendar_dates.txt"
-		)
+		With `use_cache`, parsed tables are stored in a `FeedCache` next to 
+		the feed (or in `cache_dir`) and memory-mapped on later loads. For
+		an archive, tables are rebuilt whenever the archive changes.
 
-		print("\tLoading stop times...")
-		self._stop_times = StopTimes(self._gtfs_dir / "stop_times.txt")
+		Nothing is read here. Tables are loaded on first access, so ones
+		that are never used (e.g. shapes) cost nothing.
+		"""
+		self._gtfs_dir = Path(gtfs_dir)
+		self._source = FeedSource(self._gtfs_dir)
+		self._settings = settings
 
-		print("\tLoading stops...")
-		self._stops = Stops(
-			self._gtfs_dir / "stops.txt",
-			self._stop_times
-		)
+		if use_cache:
+			self._cache = FeedCache(self._gtfs_dir, cache_dir)
+		else:
+			self._cache = None
 
-		print("\tLoading shapes...")
-		self._shapes = Shapes(
-			self._gtfs_dir / "shapes.txt"
-		)
+		self._services = None
+		self._trips = None
+		self._stops = None
+		self._stop_times = None
+		self._shapes = None
 
-		print("\tLoading trips...")
-		self._trips = Trips(
-			self._gtfs_dir / "trips.txt",
-			settings,
-			self._stop_times,
-			self._shapes
-		)
+		self._service_ids = None
+		self._stop_ids = None
+		self._trip_cols = None
 
 		## TODO: Need to rewrite this entire codebase around a SQLAlchemy 
 		## or similar in-memory relational database interface to
@@ -87,41 +118,242 @@ class GTFS:
 		## Also not actually using this, trip can maybe add stops to shapes, not sure
 
 		#print("\tAdding stops to shapes...")
-		#self._shapes.add_stops(
-		#	self._stops,
-		#	self._trips
+		#self.shapes.add_stops(
+		#	self.stops,
+		#	self.trips
 		#)
 
-		print("done")
+		self._date_trip_masks = OrderedDict()
 	
 	def __repr__(self) -> str:
 		return f"GTFS(gtfs_dir={self._gtfs_dir})"
-	
+
+	def _read_columns(
+		self,
+		table_name: str,
+		read_columns: "Callable[[Path|IO[bytes]], Columns]"
+	) -> Columns:
+		"""
+		Columns of `<table_name>.txt`, from the feed cache when possible.
+		"""
+		def build() -> Columns:
+			with self._source.open(table_name) as table:
+				return read_columns(table)
+
+		if self._cache is None:
+			return build()
+
+		return self._cache.load(
+			table_name,
+			self._source.source_paths(table_name),
+			build
+		)
+
+	@property
+	def services(self) -> DateServices:
+		if self._services is None:
+			print(f"Loading service info from {self._gtfs_dir}...")
+			self._services = DateServices(
+				self._read_columns("calendar", DateServices.read_columns),
+				self._read_columns(
+					"calendar_dates", ServiceExceptions.read_columns
+				)
+			)
+		return self._services
+
+	@property
+	def stop_times(self) -> StopTimes:
+		if self._stop_times is None:
+			if self.is_restricted:
+				trip_ids = self._trip_columns()["trip_id"]
+
+				print(f"Loading stop times from {self._gtfs_dir} (filtered)...")
+				with self._source.open("stop_times") as table:
+					cols = StopTimes.read_columns(
+						table,
+						trip_ids = trip_ids.tolist(),
+						stop_ids = self._stop_ids
+					)
+			else:
+				print(f"Loading stop times from {self._gtfs_dir}...")
+				cols = self._read_columns("stop_times", StopTimes.read_columns)
+
+			self._stop_times = StopTimes(cols)
+		return self._stop_times
+
+	@property
+	def stops(self) -> Stops:
+		"""
+		Stop times of a stop are only loaded when used, see 
+		`Stop.stop_times`.
+		"""
+		if self._stops is None:
+			print(f"Loading stops from {self._gtfs_dir}...")
+			self._stops = Stops(
+				self._read_columns("stops", Stops.read_columns),
+				self._get_stop_times
+			)
+		return self._stops
+
+	@property
+	def shapes(self) -> Shapes:
+		if self._shapes is None:
+			print(f"Loading shapes from {self._gtfs_dir}...")
+			self._shapes = Shapes(
+				self._read_columns("shapes", Shapes.read_columns)
+			)
+		return self._shapes
+
+	@property
+	def trips(self) -> Trips:
+		"""
+		Trip shapes are only loaded when one is used, see `Trip.shape`.
+		"""
+		if self._trips is None:
+			stop_times = self.stop_times
+			print(f"Loading trips from {self._gtfs_dir}...")
+			self._trips = Trips(
+				self._trip_columns(),
+				self._settings,
+				stop_times,
+				self._get_shapes,
+				skip_missing_stoptimes = self.is_restricted
+			)
+		return self._trips
+
+	def _get_shapes(self) -> Shapes:
+		"""
+		A method rather than a lambda so trips can still be pickled.
+		"""
+		return self.shapes
+
+	def _get_stop_times(self) -> StopTimes:
+		"""
+		A method rather than a lambda so stops can still be pickled.
+		"""
+		return self.stop_times
+
+	def _trip_columns(self) -> Columns:
+		"""
+		"""
+		if not self.is_restricted:
+			return self._read_columns("trips", Trips.read_columns)
+
+		if self._trip_cols is None:
+			with self._source.open("trips") as table:
+				self._trip_cols = Trips.read_columns(
+					table,
+					route_is_excluded = self._settings.route_is_excluded,
+					service_ids = self._service_ids
+				)
+
+		return self._trip_cols
+
+	@property
+	def is_restricted(self) -> bool:
+		return (self._service_ids is not None) or (self._stop_ids is not None)
+
+	def restrict(
+		self,
+		service_date: Optional[datetime] = None,
+		stop_ids: Optional[Iterable[int]] = None
+	) -> None:
+		"""
+		Only load the trips running on `service_date` (and not on excluded
+		routes), and only their stop times at `stop_ids`, e.g. the stops in
+		a `PolygonBoundary`. Rows are dropped while the tables are read, so
+		load time and memory scale with what's kept rather than the whole
+		feed. Restricted tables bypass the `FeedCache`.
+
+		Has to be called before trips or stop times are loaded. Afterwards
+		trips with no stop times left are skipped, and stops only have
+		their kept stop times.
+		"""
+		loaded = [
+			name for name in self.loaded_tables if name in ("stop_times", "trips")
+		]
+		if len(loaded) > 0:
+			raise TablesLoadedException(self, loaded)
+
+		if service_date is not None:
+			self._service_ids = self.services.get_date_service_ids(service_date)
+
+		if stop_ids is not None:
+			self._stop_ids = set(stop_ids)
+
+		self._trip_cols = None
+
+	@property
+	def loaded_tables(self) -> List[str]:
+		"""
+		Names of the tables parsed so far.
+		"""
+		return [
+			name for name, table in [
+				("services", self._services),
+				("stop_times", self._stop_times),
+				("stops", self._stops),
+				("shapes", self._shapes),
+				("trips", self._trips)
+			]
+			if table is not None
+		]
+
 	def get_date_trips(
 		self,
 		service_date: datetime
 	) -> List[Trip]:
 		"""
 		"""
-		date_service_ids = self._services.get_date_service_ids(service_date)
+		date_service_ids = self.services.get_date_service_ids(service_date)
 
 		ret_trips: List[Trip] = []
 
 		for service_id in date_service_ids:
 			try:
-				ret_trips += self._trips.get_service_trips(service_id)
+				ret_trips += self.trips.get_service_trips(service_id)
 			except KeyError:
 				continue
 
 		return ret_trips
 
+	def get_date_trip_mask(
+		self,
+		service_date: datetime
+	) -> np.ndarray:
+		"""
+		`StopTimes.trip_mask()` of the trips running on `service_date`. 
+		Computed once per date and kept for the `_date_cache_size` most 
+		recently used dates.
+		"""
+		key = service_date.strftime(self._gtfs_strf)
+
+		try:
+			mask = self._date_trip_masks[key]
+		except KeyError:
+			pass
+		else:
+			self._date_trip_masks.move_to_end(key)
+			return mask
+
+		mask = self.stop_times.trip_mask(
+			trip.trip_id for trip in self.get_date_trips(service_date)
+		)
+
+		self._date_trip_masks[key] = mask
+
+		if len(self._date_trip_masks) > self._date_cache_size:
+			self._date_trip_masks.popitem(last = False)
+
+		return mask
+
 	def get_trip(
 		self,
 		trip_id: int
 	) -> Trip:
 		"""
 		"""
-		return self._trips[trip_id]
+		return self.trips[trip_id]
 	
 	def get_stop(
 		self,
@@ -129,7 +361,7 @@ class GTFS:
 	) -> Stop:
 		"""
 		"""
-		return self._stops[stop_id]
+		return self.stops[stop_id]
 	
 	def get_stop_stoptimes_on_date(
 		self,
@@ -137,28 +369,13 @@ class GTFS:
 		stop_id: int
 	) -> List[StopTime]:
 		"""
+		Stop times at `stop_id` of the trips running on `service_date`,
+		sorted by departure. `KeyError` if the stop has no stop times.
 		"""
-		trips_on_date_d = {
-			trip.trip_id: trip
-			for trip in self.get_date_trips(service_date)
-		}
-
-		all_stop_stoptimes = self._stop_times.get_stop_stoptimes(stop_id)
-
-		ret_stop_stoptimes: List[StopTime] = []
-
-		for stop_time in all_stop_stoptimes:
-			try:
-				trips_on_date_d[stop_time.trip_id]
-				ret_stop_stoptimes.append(stop_time)
-			except KeyError:
-				continue
-
-		return ret_stop_stoptimes
-	
-	@property
-	def stops(self) -> Stops:
-		return self._stops
+		return self.stop_times.get_stop_stoptimes(
+			stop_id,
+			self.get_date_trip_mask(service_date)
+		)
 
 
 
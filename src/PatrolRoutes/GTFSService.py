@@ -4,14 +4,17 @@ for holidays.
 """
 
 
-from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from enum import Enum
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Callable, Dict, List, Literal
+from typing import (
+	Dict, IO, Iterator, List, Literal, Tuple
+)
 
 
+from .FeedCache import Columns
 from .Utils import append_to_dict_of_lists, insert_in_dict_of_dicts
 
 
@@ -31,95 +34,50 @@ class ServExcepEnum(Enum):
 			)
 		
 class Service:
-	_gtfs_strf: str = "%Y%m%d"
-
-	_svc_excep: "ServiceExceptions"
-
-	_service_id: str
-	_service_days: "DateServices._ServiceDays"
-	_start_date: datetime
-	_end_date: datetime
-	_service_name: str
-
-	_is_in_service: Dict[str, bool]
+	"""
+	One service's row of the `DateServices` calendar.
+	"""
+	_dates: "DateServices"
+	_index: int
 
 	def __init__(
 		self,
-		calendar_row: pd.Series,
-		svc_excp: "ServiceExceptions"
+		dates: "DateServices",
+		index: int
 	) -> None:
 		"""
 		"""
-		self._svc_excep = svc_excp
-		self._is_in_service = {}
-		self._service_id = calendar_row.iloc[0]
-		
-		self._service_days = DateServices._ServiceDays(
-			*[
-				self._service_id
-			] + [
-				[
-					self._parse_day(elem) 
-					for elem in calendar_row.to_list()[1:8]
-				]
-			] # type: ignore
-		)
-
-		self._start_date = datetime.strptime(
-			str(calendar_row.iloc[8]),
-			self._gtfs_strf
-		)
-
-		self._end_date = datetime.strptime(
-			str(calendar_row.iloc[9]),
-			self._gtfs_strf
-		)
-
-		self._service_name = calendar_row.iloc[10]
-
-		## Populate in service dates
-		## https://stackoverflow.com/a/1060330/26707652
+		self._dates = dates
+		self._index = index
 
-		n_days = (self._end_date - self._start_date).days
-
-		for day_n in range(n_days):
-			day = self._start_date + timedelta(day_n)
-
-			is_regularly_scheduled = self._service_days.runs_on_day_of_week(
-				day.weekday()
-			)
-
-			is_added = self._svc_excep.service_is_added(
-				self.service_id, 
-				day
-			)
-
-			is_removed = self._svc_excep.service_is_removed(
-				self.service_id,
-				day
-			)
-
-			self._is_in_service[day.strftime(self._gtfs_strf)] = (
-				(is_regularly_scheduled and (not is_removed))
-				or ((not is_regularly_scheduled) and is_added)
-			)
-
-	def _parse_day(self, s: Literal["0"]|Literal["1"]) -> bool: 
-		return bool(int(s))
-		
 	def runs_on_date(
 		self,
 		service_date: date
 	) -> bool:
-		try:
-			return self._is_in_service[
-				service_date.strftime(self._gtfs_strf)
-			]
-		except KeyError:
+		"""
+		"""
+		day = self._dates._day_index(service_date)
+
+		if (day < 0) or (day >= self._dates._runs.shape[1]):
 			return False
+
+		return bool(self._dates._runs[self._index, day])
+
+	def dates(
+		self,
+		start: date,
+		end: date
+	) -> List[date]:
+		"""
+		Dates from `start` to `end`, inclusive, that the service runs on.
+		"""
+		runs = self._dates.runs_matrix(start, end)[self._index]
+		start = DateServices._as_date(start)
+
+		return [start + timedelta(int(day)) for day in np.flatnonzero(runs)]
 	
 	@property
-	def service_id(self) -> str: return self._service_id
+	def service_id(self) -> str: return self._dates._service_ids[self._index]
 
 
 class ServiceExceptions:
@@ -130,19 +88,22 @@ class ServiceExceptions:
 
 	def __init__(
 		self,
-		calendar_dates_path: Path
+		calendar_dates: "Path|Columns"
 	) -> None:
 		"""
+		`calendar_dates` is either the path to calendar_dates.txt or the 
+		columns returned by `ServiceExceptions.read_columns()`.
 		"""
 		self._excep = {}
 
-		df = pd.read_csv(calendar_dates_path)
+		if not isinstance(calendar_dates, dict):
+			calendar_dates = self.read_columns(calendar_dates)
 
-		for _, row in df.iterrows():
-			service_id = str(row.iloc[0])
-			service_date = str(row.iloc[1])
+		for i in range(len(calendar_dates["service_id"])):
+			service_id = str(calendar_dates["service_id"][i])
+			service_date = str(calendar_dates["date"][i])
 			excep_type: ServExcepEnum = ServExcepEnum.get(
-				row.iloc[2]
+				int(calendar_dates["exception_type"][i]) # type: ignore
 			)
 
 			insert_in_dict_of_dicts(
@@ -152,6 +113,24 @@ class ServiceExceptions:
 				excep_type
 			)
 
+	@classmethod
+	def read_columns(
+		cls,
+		calendar_dates_path: "Path|IO[bytes]"
+	) -> Columns:
+		"""
+		"""
+		df = pd.read_csv(
+			calendar_dates_path,
+			dtype = {"service_id": str, "date": str}
+		)
+
+		return {
+			"service_id": df["service_id"].to_numpy(dtype = str),
+			"date": df["date"].to_numpy(dtype = str),
+			"exception_type": df["exception_type"].to_numpy(dtype = np.int8)
+		}
+
 	def _check_type(
 		self,
 		service_id: str,
@@ -169,6 +148,18 @@ class ServiceExceptions:
 		
 		return actual_excep_type == queried_excep_type
 	
+	def __iter__(self) -> Iterator[Tuple[str, date, ServExcepEnum]]:
+		"""
+		(service ID, date, exception type) of every exception.
+		"""
+		for service_id, date_d in self._excep.items():
+			for date_s, excep_type in date_d.items():
+				yield (
+					service_id,
+					datetime.strptime(date_s, self._gtfs_strf).date(),
+					excep_type
+				)
+
 	def service_is_added(
 		self,
 		service_id: str,
@@ -200,58 +191,173 @@ class DateServices:
 	"""	
 	A summary of calendar.txt and calendar_dates.txt listing each 
 	day's service IDs. 
+
+	Compiled into a (service x day) boolean matrix covering every date in
+	the feed's calendars and exceptions, end dates included. Day 0 is the
+	earliest of them. Date queries are an index into it and date ranges a
+	slice. Services only listed in calendar_dates.txt are included.
 	"""
 	_gtfs_strf: str = "%Y%m%d"
 
-	_calendar_path: Path
-	_calendar_dates_path: Path
+	_weekdays: List[str] = [
+		"monday", "tuesday", "wednesday", "thursday",
+		"friday", "saturday", "sunday"
+	]
 	
 	_svc_d: Dict[str, Service]
 	_excep: ServiceExceptions
 
-	@dataclass
-	class _ServiceDays:
-		_service_id: str
-		_runs_day_of_week: List[bool] ## 0th is Monday, 6th is Sunday
-
-		def runs_on_day_of_week(
-			self,
-			weekday_num: int
-		) -> bool:
-			"""
-			This is not sufficient to determine if the trip actually runs
-			because this class doesn't know the start and end dates of the
-			service. 
-			"""
-			try:
-				return self._runs_day_of_week[weekday_num]
-			except IndexError:
-				raise IndexError(
-					f"Expected number between 0 (Monday) and 6 (Sunday), "
-					f"got {weekday_num}."
-				)
+	_service_ids: List[str] ## calendar.txt order, then calendar_dates.txt
+	_origin: date ## date of day 0
+	_runs: np.ndarray ## (service index, day) -> runs that day
 
 	def __init__(
 		self,
-		calendar_path: Path,
-		calendar_dates_path: Path
+		calendar: "Path|Columns",
+		calendar_dates: "Path|Columns"
+	) -> None:
+		"""
+		Both arguments are either paths to the GTFS files or the columns
+		returned by `DateServices.read_columns()` and 
+		`ServiceExceptions.read_columns()`.
+		"""
+		self._excep = ServiceExceptions(calendar_dates)
+
+		if not isinstance(calendar, dict):
+			calendar = self.read_columns(calendar)
+
+		self._compile(calendar)
+
+		self._svc_d = {
+			service_id: Service(self, i)
+			for i, service_id in enumerate(self._service_ids)
+		}
+
+	def _compile(
+		self,
+		calendar: Columns
 	) -> None:
 		"""
+		Build `_runs`: weekly pattern within each calendar period, then 
+		the exceptions on top.
+		"""
+		self._service_ids = [str(svc_id) for svc_id in calendar["service_id"]]
+		n_calendar = len(self._service_ids)
+
+		starts = [self._parse_date(d) for d in calendar["start_date"]]
+		ends = [self._parse_date(d) for d in calendar["end_date"]]
+
+		exceptions = list(self._excep)
+
+		known = set(self._service_ids)
+		for svc_id, _, _ in exceptions:
+			if svc_id not in known:
+				known.add(svc_id)
+				self._service_ids.append(svc_id)
+
+		all_dates = starts + ends + [d for _, d, _ in exceptions]
+
+		if len(all_dates) == 0:
+			self._origin = date(1970, 1, 1)
+			self._runs = np.zeros((len(self._service_ids), 0), dtype = bool)
+			return
+
+		self._origin = min(all_dates)
+		n_days = (max(all_dates) - self._origin).days + 1
+
+		day = np.arange(n_days)
+		weekday = (self._origin.weekday() + day) % 7
+
+		self._runs = np.zeros((len(self._service_ids), n_days), dtype = bool)
+
+		if n_calendar > 0:
+			weekly = np.column_stack([
+				np.asarray(calendar[day_name], dtype = np.int8) != 0
+				for day_name in self._weekdays
+			])
+
+			start_day = np.asarray([(d - self._origin).days for d in starts])
+			end_day = np.asarray([(d - self._origin).days for d in ends])
+
+			self._runs[:n_calendar] = (
+				weekly[:, weekday]
+				& (day[None, :] >= start_day[:, None])
+				& (day[None, :] <= end_day[:, None])
+			)
+
+		svc_index = {svc_id: i for i, svc_id in enumerate(self._service_ids)}
+
+		for svc_id, excep_date, excep_type in exceptions:
+			self._runs[svc_index[svc_id], (excep_date - self._origin).days] = (
+				excep_type == ServExcepEnum.SERVICE_ADDED
+			)
+
+	@classmethod
+	def _parse_date(
+		cls,
+		date_s: str
+	) -> date:
+		"""
+		"""
+		return datetime.strptime(str(date_s), cls._gtfs_strf).date()
+
+	@classmethod
+	def _as_date(
+		cls,
+		service_date: date
+	) -> date:
+		"""
+		`datetime`s are also `date`s, but can't be subtracted from them.
 		"""
-		self._calendar_path = calendar_path
-		self._calendar_dates_path = calendar_dates_path
+		if isinstance(service_date, datetime):
+			return service_date.date()
+		return service_date
 
-		self._excep = ServiceExceptions(
-			self._calendar_dates_path
+	def _day_index(
+		self,
+		service_date: date
+	) -> int:
+		"""
+		"""
+		return (self._as_date(service_date) - self._origin).days
+
+	@classmethod
+	def read_columns(
+		cls,
+		calendar_path: "Path|IO[bytes]"
+	) -> Columns:
+		"""
+		"""
+		calendar_df = pd.read_csv(
+			calendar_path,
+			dtype = {
+				"service_id": str,
+				"start_date": str,
+				"end_date": str,
+				"service_name": str
+			}
 		)
 
-		self._svc_d = {}
+		cols: Columns = {
+			"service_id": calendar_df["service_id"].to_numpy(dtype = str),
+			"start_date": calendar_df["start_date"].to_numpy(dtype = str),
+			"end_date": calendar_df["end_date"].to_numpy(dtype = str)
+		}
+
+		for day in cls._weekdays:
+			cols[day] = calendar_df[day].to_numpy(dtype = np.int8)
+
+		if "service_name" in calendar_df.columns:
+			cols["service_name"] = (
+				calendar_df["service_name"].fillna("").to_numpy(dtype = str)
+			)
+		else:
+			cols["service_name"] = np.full(len(calendar_df), "", dtype = str)
 
-		calendar_df = pd.read_csv(str(self._calendar_path))
+		return cols
 
-		for _, row in calendar_df.iterrows():
-			new_svc = Service(row, self._excep)
-			self._svc_d[new_svc.service_id] = new_svc
+	@property
+	def service_ids(self) -> List[str]: return list(self._service_ids)
 
 	def service_runs_on_date(
 		self,
@@ -268,13 +374,45 @@ class DateServices:
 	) -> List[str]:
 		"""
 		"""
-		ret_svc_ids: List[str] = []
+		day = self._day_index(service_date)
 
-		for svc_id in self._svc_d.keys():
-			try:
-				if self._svc_d[svc_id].runs_on_date(service_date):
-					ret_svc_ids.append(svc_id)
-			except KeyError:
-				continue
+		if (day < 0) or (day >= self._runs.shape[1]):
+			return []
 
-		return ret_svc_ids
\ No newline at end of file
+		return [
+			self._service_ids[i] for i in np.flatnonzero(self._runs[:, day])
+		]
+
+	def runs_matrix(
+		self,
+		start: date,
+		end: date
+	) -> np.ndarray:
+		"""
+		(service x day) boolean matrix from `start` to `end`, inclusive, 
+		with services in `service_ids` order. Days outside the feed's
+		calendar are all false.
+		"""
+		start_day = self._day_index(start)
+		n_days = self._day_index(end) - start_day + 1
+
+		runs = np.zeros((len(self._service_ids), max(0, n_days)), dtype = bool)
+
+		lo = max(start_day, 0)
+		hi = min(start_day + n_days, self._runs.shape[1])
+
+		if lo < hi:
+			runs[:, lo - start_day:hi - start_day] = self._runs[:, lo:hi]
+
+		return runs
+
+	def get_service_dates(
+		self,
+		service_id: str,
+		start: date,
+		end: date
+	) -> List[date]:
+		"""
+		Dates from `start` to `end`, inclusive, that `service_id` runs on.
+		"""
+		return self._svc_d[service_id].dates(start, end)
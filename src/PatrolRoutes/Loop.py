@@ -3,61 +3,225 @@ Build trips based on the segment graph
 """
 
 from abc import ABC, abstractmethod
+from enum import Enum
 import numpy as np
-from typing import Generic, Iterator, List, Optional, overload, TypeVar
+import time
+from typing import (
+	Callable, Dict, Generic, Iterator, List, Optional, overload, TypedDict,
+	TypeVar
+)
 
 
 from .GTFSTime import GTFSTime
 from .motd import motd
 from .Duration import BaseDuration, Hours, Minutes, Seconds
-from .LoopNode import LoopNode, TripNode, WaitingNode, WalkingNode, LoopLL
+from .LoopNode import (
+	LoopNode, LoopStepJSON, TripNode, WaitingNode, WalkingNode, LoopLL
+)
+from .SearchStats import DeadEnd, SearchPhase, SearchStats
 from .Settings import Settings
-from .SegmentGraph import SegmentGraph
-from .SegmentGraph import Edge as SegmentEdge
-from .SegmentGraph import TripEdge as SegmentTripEdge
-from .SegmentGraph import TransferEdge as SegmentTransferEdge
+from .SegmentGraph import CSRGraph, EdgeKind, SegmentGraph, TripEdgeRanges
 from .Stops import Stop
 from .Utils import RouteStyle as RS
 
 
+class SearchStatus(Enum):
+	PAUSED = 1 ## more of the search space left, call `Loop.resume()`
+	FOUND = 2
+	EXHAUSTED = 3 ## no loop satisfies the constraints
+
+
+class StopReason(Enum):
+	"""
+	Why `Loop.search()` returned.
+	"""
+	FOUND = 1
+	EXHAUSTED = 2
+	MAX_EXPANSIONS = 3 ## expansion budget used up, the search is paused
+	TIME_LIMIT = 4 ## wall-clock budget used up, the search is paused
+
+
+## Expansions between clock checks in `Loop.search()`
+_CLOCK_CHECK_EXPANSIONS = 256
+
+
+class LoopJSON(TypedDict):
+	"""
+	A loop as written to JSON Lines. Everything but the seed and status is
+	empty/`None` if no loop was found. `text` is the `str()` rendering, if
+	asked for.
+	"""
+	loop_number: int
+	seed: int
+	status: str
+	stop_reason: Optional[str] ## `StopReason` name, if run with `search()`
+	origin_station: Optional[str] ## `Stop.standard_stop_name` of the first stop
+	start_stop_name: Optional[str]
+	departure_time: Optional[str]
+	arrival_time: Optional[str]
+	duration_seconds: Optional[int]
+	n_segments: int
+	route_ids: List[str]
+	steps: List[LoopStepJSON]
+	text: Optional[str]
+
+
+class _NodeCheck(Enum):
+	DEAD = 1
+	EXTENDABLE = 2
+	COMPLETE = 3
+
+
+class SearchFrame:
+	"""
+	One level of the loop search stack: a node already in the loop and the
+	shuffled outgoing edge IDs still to try after it.
+	"""
+	__slots__ = ("_node", "_candidates", "_next")
+
+	_node: LoopNode
+	_candidates: np.ndarray
+	_next: int
+
+	def __init__(
+		self,
+		node: LoopNode,
+		candidates: np.ndarray
+	) -> None:
+		"""
+		"""
+		self._node = node
+		self._candidates = candidates
+		self._next = 0
+
+	def __repr__(self) -> str:
+		return (
+			f"SearchFrame(segment_number={self._node.segment_number}, "
+			f"edge_id={self._node.edge_id}, "
+			f"remaining={len(self._candidates) - self._next})"
+		)
+
+	@property
+	def node(self) -> LoopNode: return self._node
+
+	@property
+	def remaining_candidates(self) -> np.ndarray:
+		return self._candidates[self._next:]
+
+
 class Loop:
 	"""
 	Representation of a single looping trip. 
+
+	The search is a depth-first search over the `CSRGraph` with an explicit
+	stack of `SearchFrame`s, one per segment of the partial loop. It can be
+	run to the end with `build()`, or in steps with `start()` and 
+	`resume(max_expansions)`, in which case `frontier` shows the stack 
+	between steps. Either way a seed always gives the same loop. `search()`
+	runs it within an expansion and/or wall-clock budget.
 	"""
 	_loop_num: int
 	_seed: int
 	_sg: SegmentGraph
-	_loop_max_dur: Optional[BaseDuration]
-	_loop_min_dur: Optional[BaseDuration]
+	_g: CSRGraph
+	_loop_max_sec: Optional[int]
+	_loop_min_sec: Optional[int]
 	_loop_min_seg: Optional[int]
-	_trip_min_dur: Optional[BaseDuration]
+	_trip_min_sec: Optional[int]
 	_consec_route_ok: bool
+	_prune: bool
+	_start_edges: TripEdgeRanges ## trip edges a loop can start with
 
 	_s: Settings
 
 	_ll: LoopLL
 
+	## Search state
+	_rng: Optional[np.random.Generator]
+	_root_rng: Optional[np.random.Generator] ## draws start edges only
+	## Lazy shuffle of `_start_edges`: positions < _next_root are drawn, 
+	## _root_swaps holds the positions whose value has been swapped
+	_next_root: int
+	_root_swaps: Dict[int, int]
+	_stack: List[SearchFrame]
+	_status: Optional[SearchStatus]
+	_n_expansions: int
+	_return_bound: Optional[np.ndarray] ## CSRGraph.earliest_return() for the current origin
+	_stop_reason: Optional[StopReason] ## of the last `search()`
+	_best_partial: List[int] ## edge IDs of the longest extendable partial loop
+
+	## Instrumentation, see `instrument()`
+	_stats: Optional[SearchStats]
+	_progress: Optional[Callable[[SearchStats], None]]
+	_progress_every: int
+
 	def __init__(
 		self,
 		loop_number: int,
 		seed: int,
 		sg: SegmentGraph,
-		settings: Settings
+		settings: Settings,
+		prune: bool = True,
+		origin_station: Optional[str] = None,
+		start_after: Optional[GTFSTime] = None,
+		start_before: Optional[GTFSTime] = None
 	) -> None:
 		"""
+		With `prune`, partial loops that can't get back to their first 
+		station within the maximum loop duration are abandoned early (see
+		`CSRGraph.earliest_return()`). This skips the same dead branches 
+		either way, but pruned branches don't draw from the random 
+		generator, so a seed gives a different (still valid) loop than
+		with `prune = False`.
+
+		`origin_station` (a stop name, standardized like 
+		`Stop.standard_stop_name`) and the inclusive `start_after` and 
+		`start_before` departure times restrict where and when the loop 
+		can start. Raises `KeyError` for an unknown station.
 		"""
 		self._loop_num = loop_number
 		self._seed = seed
 		self._sg = sg
+		self._g = sg.csr
 
-		self._loop_max_dur = settings.loop_max_duration
-		self._loop_min_dur = settings.loop_min_duration
+		## Durations are compared as whole seconds in the search
+		self._loop_max_sec = self._optional_seconds(settings.loop_max_duration)
+		self._loop_min_sec = self._optional_seconds(settings.loop_min_duration)
 		self._loop_min_seg = settings.loop_min_segments
-		self._trip_min_dur = settings.trip_min_duration
+		self._trip_min_sec = self._optional_seconds(settings.trip_min_duration)
 		self._consec_route_ok = settings.allow_consecutive_same_route
+		self._prune = prune
 
 		self._s = settings ## Save for route masking
 
+		origin = None
+		if origin_station is not None:
+			origin = self._g.station_index(
+				Stop.standardize_stop_name(origin_station)
+			)
+
+		self._start_edges = self._g.trip_edges_from(
+			origin,
+			None if start_after is None else int(start_after),
+			None if start_before is None else int(start_before)
+		)
+
+		self._rng = None
+		self._root_rng = None
+		self._next_root = 0
+		self._root_swaps = {}
+		self._stack = []
+		self._ll = LoopLL()
+		self._status = None
+		self._n_expansions = 0
+		self._return_bound = None
+		self._stop_reason = None
+		self._best_partial = []
+
+		self._stats = None
+		self._progress = None
+		self._progress_every = 0
+
 	def __str__(self) -> str:
 		#first_dep = self.first_departure_time.to_fstr(use_ampm=True)
 		#last_arr = self.last_arrival_time.to_fstr(use_ampm=True)
@@ -79,10 +243,9 @@ class Loop:
 		node = self._ll.root
 		while node is not None:
 			if isinstance(node, TripNode):
-				assert isinstance(node.segment_edge, SegmentTripEdge)
 				route_tokens.append(
 					RS(
-						node.segment_edge.trip.route_id,
+						self._g.route_id(self._g.edge_route(node.edge_id)),
 						self._s
 					).route_name
 				)
@@ -103,16 +266,71 @@ class Loop:
 		================================================
 		""" + ''.join([str(node) for node in nodes_l])
 	
-	def get_signature(self) -> str:
+	def to_json_dict(
+		self,
+		include_text: bool = False
+	) -> LoopJSON:
 		"""
 		"""
-		node_names: List[str] = []
+		assert self._status is not None
+
+		loop_d: LoopJSON = {
+			"loop_number": self._loop_num,
+			"seed": int(self._seed),
+			"status": self._status.name,
+			"stop_reason": (
+				None if self._stop_reason is None else self._stop_reason.name
+			),
+			"origin_station": None,
+			"start_stop_name": None,
+			"departure_time": None,
+			"arrival_time": None,
+			"duration_seconds": None,
+			"n_segments": 0,
+			"route_ids": [],
+			"steps": [],
+			"text": None
+		}
+
+		if self._status != SearchStatus.FOUND:
+			return loop_d
 
-		node = self._ll.root
+		first = self._ll.root
+		last = self._ll.last
+		assert (first is not None) and (last is not None)
+
+		node = first
 		while node is not None:
-			node_names.append(node.name)
+			if isinstance(node, TripNode):
+				loop_d["route_ids"].append(
+					self._g.route_id(node.route_index)
+				)
 
-		return '__'.join(node_names)
+			loop_d["steps"].append(node.to_step())
+			node = node.next
+
+		loop_d["origin_station"] = self._g.station_name(self._ll.origin_station)
+		loop_d["start_stop_name"] = first.from_stop.stop_name
+		loop_d["departure_time"] = first.from_departure_time.to_fstr()
+		loop_d["arrival_time"] = last.to_arrival_time.to_fstr()
+		loop_d["duration_seconds"] = self._ll.cumulative_seconds
+		loop_d["n_segments"] = self._ll.n_segments
+
+		if include_text:
+			loop_d["text"] = str(self)
+
+		return loop_d
+
+	def get_signature(self) -> int:
+		"""
+		128 bit hash of the loop's edge IDs (see `LoopLL.signature`), kept up 
+		to date as the search goes, so this is O(1). Signatures only compare
+		between loops built on the same `SegmentGraph`. 0 unless a loop was
+		found.
+		"""
+		if self._status != SearchStatus.FOUND:
+			return 0
+		return self._ll.signature
 	
 	def __eq__(self, other: object) -> bool:
 		"""
@@ -120,62 +338,66 @@ class Loop:
 		if not isinstance(other, Loop):
 			return False
 		
-		return self.get_signature() == other.get_signature()
+		if self.get_signature() != other.get_signature():
+			return False
+
+		return self.edge_ids == other.edge_ids
 	
 	def __hash__(self) -> int:
 		"""
 		"""
 		return hash(self.get_signature())
 
+	@classmethod
+	def _optional_seconds(
+		cls,
+		duration: Optional[BaseDuration]
+	) -> Optional[int]:
+		"""
+		"""
+		if duration is None:
+			return None
+		return int(duration)
+
 	def _debug_print(self, msg, tabs = 0):
 		#print(('\t'*tabs) + msg)
 		return
 	
-	def _is_walking_edge(
-		self,
-		edge: SegmentTransferEdge,
-	) -> bool:
-		return edge.prv_node.stop.stop_id != edge.nxt_node.stop.stop_id
-	
-	def _is_waiting_edge(
-		self,
-		edge: SegmentTransferEdge
-	) -> bool:
-		return edge.prv_node.stop.stop_id == edge.nxt_node.stop.stop_id
-
-	def _has_failed(
+	def _failure(
 		self,
 		last_node: LoopNode,
 		tabs: int = 0
-	) -> bool:
+	) -> Optional[DeadEnd]:
 		"""
+		Which constraint the loop ending in `last_node` breaks, if any.
 		"""
 		## Check if maximum duration has been exceeded
-		if self._loop_max_dur is not None:
-			if self._ll.cumulative_duration > self._loop_max_dur:
+		if self._loop_max_sec is not None:
+			if self._ll.cumulative_seconds > self._loop_max_sec:
 				self._debug_print("Failed for exceeding max duration.", tabs)
-				return True
+				return DeadEnd.MAX_DURATION
 			
 		## Check if trip just added, check if it's too short
-		if (self._trip_min_dur is not None) and (isinstance(last_node, TripNode)):
-			if last_node.segment_edge.duration < self._trip_min_dur:
-				return True
+		if (self._trip_min_sec is not None) and (isinstance(last_node, TripNode)):
+			if last_node.duration_seconds < self._trip_min_sec:
+				return DeadEnd.SHORT_TRIP
 			
 		## Check if consecutive trips on same route added
 		if (not self._consec_route_ok) and isinstance(last_node, TripNode) and (last_node.segment_number > 1):
-			assert last_node.prev is not None
-			assert isinstance(last_node.prev.prev, TripNode)
-
-			last_trip_node = last_node.prev.prev
-
-			last_trip = last_trip_node.segment_edge.prv_node.trip
-			curr_trip = last_node.segment_edge.prv_node.trip
-
-			if last_trip.route_id == curr_trip.route_id:
-				return True
+			if self._ll.previous_route == self._ll.last_route:
+				return DeadEnd.SAME_ROUTE
 		
 		## No failure cases found
-		return False
+		return None
+
+	def _has_failed(
+		self,
+		last_node: LoopNode,
+		tabs: int = 0
+	) -> bool:
+		"""
+		"""
+		return self._failure(last_node, tabs) is not None
 	
 	def _is_complete(
 		self,
@@ -189,8 +411,8 @@ class Loop:
 		if not self._ll.returns_to_first_stop:
 			return False
 		
-		if self._loop_min_dur is not None:
-			if self._ll.cumulative_duration < self._loop_min_dur:
+		if self._loop_min_sec is not None:
+			if self._ll.cumulative_seconds < self._loop_min_sec:
 				return False
 			
 		if self._loop_min_seg is not None:
@@ -201,122 +423,486 @@ class Loop:
 		## _has_failed() returns False	
 		return True
 
-	LOOP_T = TypeVar("LOOP_T", bound = TripNode|WaitingNode|WalkingNode)
-	def _build_recursive(
+	def _new_node(
 		self,
-		last_node: LOOP_T,
-		rng: np.random.Generator,
-		tabs: int = 0
-	) -> Optional[LOOP_T]:
+		segment_number: int,
+		edge_id: int
+	) -> LoopNode:
 		"""
 		"""
-		if self._has_failed(last_node, tabs = tabs):
-			return None
-		
-		if self._is_complete(last_node):
-			return last_node
-		
-		nxt_seg_num = last_node._seg_num + 1
-		curr_end_st = last_node._segment.nxt_node
+		kind = self._g.edge_kind(edge_id)
 
-		candidate_next_edges = curr_end_st.get_shuffled_next_edges(rng)
+		if kind == EdgeKind.TRIP:
+			return TripNode(
+				self._loop_num, segment_number, self._g, edge_id, self._s
+			)
+		elif kind == EdgeKind.WAITING:
+			return WaitingNode(
+				self._loop_num, segment_number, self._g, edge_id, self._s
+			)
+		elif kind == EdgeKind.WALKING:
+			return WalkingNode(
+				self._loop_num, segment_number, self._g, edge_id, self._s
+			)
+		else:
+			raise ValueError("Shouldn't see this, problem parsing edge types")
 
-		if len(candidate_next_edges) == 0: ## no options
-			self._debug_print("Failed for no more options", tabs = tabs)
-			return None
-		
-		for candidate_next_edge in candidate_next_edges:
-			if isinstance(candidate_next_edge, SegmentTripEdge):
-				candidate_node = TripNode(
-					self._loop_num,
-					nxt_seg_num,
-					candidate_next_edge,
-					self._s
+	def _next_candidate(
+		self,
+		frame: SearchFrame
+	) -> Optional[LoopNode]:
+		"""
+		Pops the next candidate off `frame`, skipping edges that would put
+		two trips or two transfers in a row. `None` once it runs out.
+		"""
+		last_is_trip = isinstance(frame._node, TripNode)
+		nxt_seg_num = frame._node.segment_number + 1
+
+		while frame._next < len(frame._candidates):
+			edge_id = int(frame._candidates[frame._next])
+			frame._next += 1
+
+			## Trips and transfers have to alternate
+			if last_is_trip == (self._g.edge_kind(edge_id) == EdgeKind.TRIP):
+				continue
+
+			return self._new_node(nxt_seg_num, edge_id)
+
+		return None
+
+	def _cannot_return_in_time(
+		self,
+		last_node: LoopNode
+	) -> bool:
+		"""
+		"""
+		if (self._return_bound is None) or (self._loop_max_sec is None):
+			return False
+
+		end_node = last_node.to_node_id
+
+		min_remaining = (
+			int(self._return_bound[end_node])
+			- int(self._g.node_arrival[end_node])
+		)
+
+		return self._ll.cumulative_seconds + min_remaining > self._loop_max_sec
+
+	def _enter(
+		self,
+		node: LoopNode
+	) -> _NodeCheck:
+		"""
+		Check a node that was just added to the end of the loop. If it can
+		be extended, its shuffled candidates are pushed as a new frame.
+		"""
+		assert self._rng is not None
+
+		stats = self._stats
+		t = time.perf_counter() if stats is not None else 0.0
+
+		dead_end = self._failure(node)
+
+		if dead_end is None:
+			if self._is_complete(node):
+				if stats is not None:
+					stats.add_time(SearchPhase.CHECK, t)
+				return _NodeCheck.COMPLETE
+
+			if self._cannot_return_in_time(node):
+				self._debug_print("Failed for not being able to return in time")
+				dead_end = DeadEnd.CANNOT_RETURN
+
+		if stats is not None:
+			t = stats.add_time(SearchPhase.CHECK, t)
+
+		if dead_end is None:
+			candidates = self._g.get_shuffled_out_edges(
+				node.to_node_id, self._rng
+			)
+
+			if stats is not None:
+				stats.add_time(SearchPhase.EXPAND, t)
+
+			if len(candidates) == 0: ## no options
+				self._debug_print("Failed for no more options")
+				dead_end = DeadEnd.NO_OPTIONS
+
+		if dead_end is not None:
+			if stats is not None:
+				stats.add_dead_end(
+					dead_end, int(self._g.node_station[node.to_node_id])
 				)
+			return _NodeCheck.DEAD
 
-			elif isinstance(candidate_next_edge, SegmentTransferEdge):
-				self._debug_print("FOUND A TRANSFER EDGE", tabs = tabs)
-				if self._is_waiting_edge(candidate_next_edge):
-					candidate_node = WaitingNode(
-						self._loop_num,
-						nxt_seg_num,
-						candidate_next_edge,
-						self._s
-					)
+		self._stack.append(SearchFrame(node, candidates))
 
-				elif self._is_walking_edge(candidate_next_edge):
-					candidate_node = WalkingNode(
-						self._loop_num,
-						nxt_seg_num,
-						candidate_next_edge,
-						self._s
-					)
+		if len(self._stack) > len(self._best_partial):
+			self._best_partial = [frame._node.edge_id for frame in self._stack]
+
+			if stats is not None:
+				stats._max_depth = max(stats._max_depth, len(self._stack))
 
-				else:
-					raise RuntimeError(
-						f"Should never see this. Something wrong with waiting/walking logic"
+		return _NodeCheck.EXTENDABLE
+
+	@property
+	def status(self) -> Optional[SearchStatus]: return self._status
+
+	@property
+	def n_expansions(self) -> int: return self._n_expansions
+
+	@property
+	def frontier(self) -> List[SearchFrame]:
+		"""
+		Copy of the search stack, from the first segment of the partial loop
+		to the last.
+		"""
+		return list(self._stack)
+
+	@property
+	def stop_reason(self) -> Optional[StopReason]: return self._stop_reason
+
+	@property
+	def stats(self) -> Optional[SearchStats]:
+		"""
+		`None` unless `instrument()` was called.
+		"""
+		return self._stats
+
+	def instrument(
+		self,
+		progress: Optional[Callable[[SearchStats], None]] = None,
+		progress_every: int = 10000
+	) -> SearchStats:
+		"""
+		Collect `SearchStats` for the search from here on, and call 
+		`progress` with them every `progress_every` expansions. Returns the
+		stats, which are updated in place and reset by `start()`. Without
+		this, the search only pays for a `None` check per step.
+		"""
+		if self._stats is None:
+			self._stats = SearchStats(self._g)
+
+		self._progress = progress
+		self._progress_every = max(1, progress_every)
+
+		return self._stats
+
+	@property
+	def best_partial(self) -> List[int]:
+		"""
+		`CSRGraph` edge IDs of the partial loop with the most segments the
+		search has reached that could still be extended, or of the loop once
+		one is found. For when a `search()` runs out of budget.
+		"""
+		if self._status == SearchStatus.FOUND:
+			return self.edge_ids
+		return list(self._best_partial)
+
+	@property
+	def seed(self) -> int: return self._seed
+
+	@property
+	def loop_number(self) -> int: return self._loop_num
+
+	@property
+	def edge_ids(self) -> List[int]:
+		"""
+		`CSRGraph` edge IDs of the loop's segments, in order. Empty unless
+		a loop was found.
+		"""
+		if self._status != SearchStatus.FOUND:
+			return []
+
+		edge_ids: List[int] = []
+
+		node = self._ll.root
+		while node is not None:
+			edge_ids.append(node.edge_id)
+			node = node.next
+
+		return edge_ids
+
+	@classmethod
+	def from_edge_ids(
+		cls,
+		loop_number: int,
+		seed: int,
+		sg: SegmentGraph,
+		settings: Settings,
+		edge_ids: List[int],
+		prune: bool = True,
+		stop_reason: Optional[StopReason] = None
+	) -> "Loop":
+		"""
+		Rebuild a finished search from `edge_ids`, as if `build()` had been
+		run for `seed`. An empty list means the search was exhausted. The
+		edge IDs are only meaningful against the same `SegmentGraph`.
+
+		If `stop_reason` says a `search()` ran out of budget, `edge_ids` is
+		its `best_partial` instead, and the loop is `PAUSED`. Resuming it
+		starts the search over.
+		"""
+		loop = cls(loop_number, seed, sg, settings, prune = prune)
+		loop._stop_reason = stop_reason
+
+		if stop_reason in (StopReason.MAX_EXPANSIONS, StopReason.TIME_LIMIT):
+			loop._status = SearchStatus.PAUSED
+			loop._best_partial = list(edge_ids)
+			return loop
+
+		if len(edge_ids) == 0:
+			loop._status = SearchStatus.EXHAUSTED
+			return loop
+
+		loop._ll = LoopLL()
+
+		prev_node = loop._new_node(1, edge_ids[0])
+		loop._ll.root = prev_node
+
+		for seg_num, edge_id in enumerate(edge_ids[1:], start = 2):
+			node = loop._new_node(seg_num, edge_id)
+			loop._ll.connect_nodes(prev_node, node)
+			prev_node = node
+
+		loop._status = SearchStatus.FOUND
+
+		return loop
+
+	def _draw_start_edge(self) -> int:
+		"""
+		Next edge of a Fisher-Yates shuffle of `_start_edges` that is only
+		carried out as far as it's been drawn, so starting a search doesn't
+		cost O(trip edges).
+		"""
+		assert self._root_rng is not None
+
+		i = self._next_root
+		j = int(self._root_rng.integers(i, len(self._start_edges)))
+
+		k = self._root_swaps.get(j, j)
+		self._root_swaps[j] = self._root_swaps.get(i, i)
+		self._root_swaps.pop(i, None)
+
+		self._next_root += 1
+
+		return self._start_edges.edge_id(k)
+
+	def start(self) -> None:
+		"""
+		Reset the search to the beginning for this loop's seed.
+		"""
+		self._rng = np.random.default_rng(self._seed)
+
+		## Separate stream, so the start order only depends on the seed and
+		## not on how many branches were shuffled in between
+		self._root_rng = np.random.default_rng(
+			np.random.SeedSequence(self._seed).spawn(1)[0]
+		)
+
+		self._next_root = 0
+		self._root_swaps = {}
+		self._stack = []
+		self._status = SearchStatus.PAUSED
+		self._n_expansions = 0
+		self._stop_reason = None
+		self._best_partial = []
+
+		if self._stats is not None:
+			self._stats.reset()
+
+	def _count_expansion(
+		self,
+		stats: SearchStats
+	) -> None:
+		"""
+		"""
+		stats._n_expansions += 1
+
+		if (
+			(self._progress is not None)
+			and (stats._n_expansions % self._progress_every == 0)
+		):
+			self._progress(stats)
+
+	def resume(
+		self,
+		max_expansions: Optional[int] = None
+	) -> SearchStatus:
+		"""
+		Continue the search until a loop is found, every option has been 
+		tried, or `max_expansions` more nodes have been tried. Starts the
+		search first if needed.
+		"""
+		## Never started, or rebuilt by `from_edge_ids()` after a budget ran out
+		if (self._status is None) or (
+			(self._status == SearchStatus.PAUSED) and (self._rng is None)
+		):
+			self.start()
+
+		if self._status != SearchStatus.PAUSED:
+			assert self._status is not None
+			return self._status
+
+		if self._stats is None:
+			return self._resume(max_expansions)
+
+		t = time.perf_counter()
+
+		try:
+			return self._resume(max_expansions)
+		finally:
+			self._stats._search_sec += time.perf_counter() - t
+
+	def _resume(
+		self,
+		max_expansions: Optional[int]
+	) -> SearchStatus:
+		"""
+		"""
+		stats = self._stats
+
+		n_expanded = 0
+
+		while (max_expansions is None) or (n_expanded < max_expansions):
+			## Start a new loop from the next trip edge
+			if len(self._stack) == 0:
+				if self._next_root >= len(self._start_edges):
+					self._status = SearchStatus.EXHAUSTED
+					return self._status
+
+				t = time.perf_counter() if stats is not None else 0.0
+
+				edge_id = self._draw_start_edge()
+
+				self._ll = LoopLL()
+
+				root = self._new_node(1, edge_id)
+				self._ll.root = root
+
+				if self._prune:
+					self._return_bound = self._g.earliest_return(
+						self._ll.origin_station
 					)
-				
-			else:
-				raise ValueError("Shouldn't see this, problem parsing edge types")
-			
-			self._debug_print(f"Trying {candidate_node.name}", tabs = tabs)
-			
-			if not (isinstance(last_node, TripNode) ^ isinstance(candidate_node, TripNode)):
-				self._debug_print("Failed for trying to be a consecutive trip node", tabs = tabs)
+
+				if stats is not None:
+					stats._n_starts += 1
+					stats.add_time(SearchPhase.START, t)
+
+				n_expanded += 1
+				self._n_expansions += 1
+
+				if stats is not None:
+					self._count_expansion(stats)
+
+				if self._enter(root) == _NodeCheck.COMPLETE:
+					self._status = SearchStatus.FOUND
+					return self._status
+
 				continue
 
-			self._ll.connect_nodes(last_node, candidate_node)
+			frame = self._stack[-1]
+			candidate_node = self._next_candidate(frame)
 
-			checked_candidate = self._build_recursive(
-				candidate_node,
-				rng,
-				tabs = tabs + 1
-			)
+			## Every option after this node failed, backtrack
+			if candidate_node is None:
+				self._stack.pop()
 
-			if checked_candidate is None:
-				self._ll.disconnect_nodes(last_node, candidate_node)
-			else:
-				return last_node
-			
-		self._debug_print("Got through all options and they were bad", tabs = tabs)
-		return None ## none of options worked
+				if len(self._stack) > 0:
+					self._ll.disconnect_nodes(self._stack[-1]._node, frame._node)
 
-	def build(
+				if stats is not None:
+					stats._n_backtracks += 1
+
+				continue
+
+			n_expanded += 1
+			self._n_expansions += 1
+
+			if stats is not None:
+				self._count_expansion(stats)
+
+			self._ll.connect_nodes(frame._node, candidate_node)
+
+			check = self._enter(candidate_node)
+
+			if check == _NodeCheck.COMPLETE:
+				self._status = SearchStatus.FOUND
+				return self._status
+			elif check == _NodeCheck.DEAD:
+				self._ll.disconnect_nodes(frame._node, candidate_node)
+
+		return self._status
+
+	def search(
 		self,
-		verbose = False
-	) -> None:
+		max_expansions: Optional[int] = None,
+		time_limit: Optional[BaseDuration] = None
+	) -> StopReason:
 		"""
+		Continue the search (see `resume()`) for at most `max_expansions`
+		more nodes and `time_limit` of wall-clock time, whichever runs out
+		first. Returns why it stopped, which is also kept as `stop_reason`.
+		If a budget ran out, `best_partial` is the furthest the search got
+		and calling this again picks up where it left off.
 		"""
-		rng = np.random.default_rng(self._seed)
+		deadline = None
+		if time_limit is not None:
+			deadline = time.monotonic() + int(time_limit)
 
-		trip_edges = np.asarray(self._sg.trip_edges)
+		n_left = max_expansions
 
-		rng.shuffle(trip_edges)
+		while True:
+			step = n_left
+			if deadline is not None:
+				step = _CLOCK_CHECK_EXPANSIONS if step is None else min(
+					step, _CLOCK_CHECK_EXPANSIONS
+				)
 
-		trip_edges = trip_edges.tolist()
+			n_before = self._n_expansions
+			status = self.resume(step)
 
-		for trip_edge in trip_edges:
-			self._ll = LoopLL()
+			if status == SearchStatus.FOUND:
+				self._stop_reason = StopReason.FOUND
+				break
 
-			first_trip = TripNode(
-				self._loop_num,
-				1,
-				trip_edge,
-				self._s
-			)
-			self._ll.root = first_trip
+			if status == SearchStatus.EXHAUSTED:
+				self._stop_reason = StopReason.EXHAUSTED
+				break
 
-			_ = self._build_recursive(
-				first_trip,
-				rng,
-			)
+			if n_left is not None:
+				n_left -= self._n_expansions - n_before
 
-			#if self._ll.root is not None:
-			if (self._ll.last is not None) and self._is_complete(self._ll.last):
-				return
-			
-			
-		print("No valid trips under current constraints.")
+				if n_left <= 0:
+					self._stop_reason = StopReason.MAX_EXPANSIONS
+					break
 
-			
+			if (deadline is not None) and (time.monotonic() >= deadline):
+				self._stop_reason = StopReason.TIME_LIMIT
+				break
+
+		return self._stop_reason
+
+	def build(
+		self,
+		verbose = False,
+		max_expansions: Optional[int] = None,
+		time_limit: Optional[BaseDuration] = None
+	) -> StopReason:
+		"""
+		Search from the beginning, within the budget if given (see
+		`search()`).
+		"""
+		self.start()
+
+		reason = self.search(max_expansions, time_limit)
+
+		if reason == StopReason.EXHAUSTED:
+			print("No valid trips under current constraints.")
+		elif reason != StopReason.FOUND:
+			print(
+				f"No loop found within the search budget after "
+				f"{self._n_expansions} expansions."
+			)
+
+		return reason
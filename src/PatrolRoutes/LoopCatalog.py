@@ -0,0 +1,250 @@
+"""
+On-disk catalog of generated loops, so they can be looked up by origin, time,
+duration and routes instead of searching again.
+"""
+
+
+from datetime import datetime
+import json
+from pathlib import Path
+import sqlite3
+from typing import Iterable, List, Optional, Sequence
+
+
+from . import GTFS_STRF
+from .Duration import BaseDuration
+from .GTFSTime import GTFSTime
+from .Loop import Loop, LoopJSON, SearchStatus
+from .Stops import Stop
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loops (
+	loop_id INTEGER PRIMARY KEY,
+	service_date TEXT NOT NULL,
+	signature TEXT NOT NULL,
+	seed INTEGER NOT NULL,
+	origin_station TEXT NOT NULL,
+	start_sec INTEGER NOT NULL,
+	end_sec INTEGER NOT NULL,
+	duration_sec INTEGER NOT NULL,
+	n_segments INTEGER NOT NULL,
+	route_set TEXT NOT NULL,
+	loop_json TEXT NOT NULL,
+	UNIQUE (service_date, signature)
+);
+
+CREATE TABLE IF NOT EXISTS loop_routes (
+	route_id TEXT NOT NULL,
+	loop_id INTEGER NOT NULL REFERENCES loops (loop_id),
+	PRIMARY KEY (route_id, loop_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS loops_origin_start ON loops (origin_station, start_sec);
+CREATE INDEX IF NOT EXISTS loops_start ON loops (start_sec);
+CREATE INDEX IF NOT EXISTS loops_duration ON loops (duration_sec);
+CREATE INDEX IF NOT EXISTS loops_segments ON loops (n_segments);
+CREATE INDEX IF NOT EXISTS loops_route_set ON loops (route_set);
+"""
+
+
+class LoopCatalog:
+	"""
+	SQLite database of found loops, one row per distinct loop per service
+	date. Loops are saved with `add()` and looked up with `query()`, which
+	returns them as `LoopJSON`, the same as the batch mode writes.
+
+	Route sets are stored as the sorted, distinct route IDs joined by ','.
+	Stations are `Stop.standard_stop_name`s.
+	"""
+	_path: Path
+	_conn: sqlite3.Connection
+
+	def __init__(
+		self,
+		path: Path
+	) -> None:
+		"""
+		Opens the catalog at `path`, creating it if it doesn't exist.
+		"""
+		self._path = path
+		self._conn = sqlite3.connect(path)
+		self._conn.executescript(_SCHEMA)
+
+	def __enter__(self) -> "LoopCatalog":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+	def __len__(self) -> int:
+		return self._conn.execute("SELECT COUNT(*) FROM loops").fetchone()[0]
+
+	@property
+	def path(self) -> Path: return self._path
+
+	def close(self) -> None:
+		"""
+		"""
+		self._conn.commit()
+		self._conn.close()
+
+	def commit(self) -> None:
+		"""
+		"""
+		self._conn.commit()
+
+	@classmethod
+	def route_set(
+		cls,
+		route_ids: Iterable[str]
+	) -> str:
+		"""
+		"""
+		return ','.join(sorted(set(route_ids)))
+
+	@classmethod
+	def _signature(
+		cls,
+		loop_d: LoopJSON
+	) -> str:
+		"""
+		Identifies a loop by its steps, so the same loop found from different
+		seeds is only saved once.
+		"""
+		return '__'.join([
+			f"{step['kind']}-{step['from_stop_id']}-{step['departure_time']}"
+			f"-{step['to_stop_id']}-{step['arrival_time']}"
+			for step in loop_d["steps"]
+		])
+
+	def add(
+		self,
+		loop: Loop,
+		service_date: datetime
+	) -> Optional[int]:
+		"""
+		Save a found loop. Returns its row ID, or `None` if the loop wasn't
+		found or is already in the catalog. Call `commit()` (or `close()`)
+		to write to disk.
+		"""
+		if loop.status != SearchStatus.FOUND:
+			return None
+
+		loop_d = loop.to_json_dict()
+
+		assert loop_d["origin_station"] is not None
+		assert loop_d["departure_time"] is not None
+		assert loop_d["arrival_time"] is not None
+
+		cur = self._conn.execute(
+			"""
+			INSERT OR IGNORE INTO loops (
+				service_date, signature, seed, origin_station, start_sec,
+				end_sec, duration_sec, n_segments, route_set, loop_json
+			) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+			""",
+			(
+				service_date.strftime(GTFS_STRF),
+				self._signature(loop_d),
+				loop_d["seed"],
+				loop_d["origin_station"],
+				int(GTFSTime.from_fstr(loop_d["departure_time"])),
+				int(GTFSTime.from_fstr(loop_d["arrival_time"])),
+				loop_d["duration_seconds"],
+				loop_d["n_segments"],
+				self.route_set(loop_d["route_ids"]),
+				json.dumps(loop_d)
+			)
+		)
+
+		if cur.rowcount == 0:
+			return None
+
+		loop_id = cur.lastrowid
+
+		self._conn.executemany(
+			"INSERT INTO loop_routes (route_id, loop_id) VALUES (?, ?)",
+			[(route_id, loop_id) for route_id in set(loop_d["route_ids"])]
+		)
+
+		return loop_id
+
+	def query(
+		self,
+		origin_station: Optional[str] = None,
+		start_after: Optional[GTFSTime] = None,
+		start_before: Optional[GTFSTime] = None,
+		min_duration: Optional[BaseDuration] = None,
+		max_duration: Optional[BaseDuration] = None,
+		min_segments: Optional[int] = None,
+		max_segments: Optional[int] = None,
+		routes: Optional[Sequence[str]] = None,
+		route_set: Optional[Sequence[str]] = None,
+		service_date: Optional[datetime] = None,
+		limit: Optional[int] = None
+	) -> List[LoopJSON]:
+		"""
+		Loops matching every given filter, earliest start first. Time and
+		duration bounds are inclusive. `origin_station` is standardized like
+		`Stop.standard_stop_name`. `routes` are route IDs the loop has to
+		use (among others), `route_set` the exact set of route IDs it uses.
+		"""
+		where: List[str] = []
+		params: List[object] = []
+
+		if origin_station is not None:
+			where.append("origin_station = ?")
+			params.append(Stop.standardize_stop_name(origin_station))
+
+		for column, op, value in [
+			("start_sec", ">=", start_after),
+			("start_sec", "<=", start_before),
+			("duration_sec", ">=", min_duration),
+			("duration_sec", "<=", max_duration),
+			("n_segments", ">=", min_segments),
+			("n_segments", "<=", max_segments)
+		]:
+			if value is not None:
+				where.append(f"{column} {op} ?")
+				params.append(int(value))
+
+		if route_set is not None:
+			where.append("route_set = ?")
+			params.append(self.route_set(route_set))
+
+		if (routes is not None) and (len(routes) > 0):
+			route_ids = sorted(set(routes))
+
+			where.append(
+				f"""
+				loop_id IN (
+					SELECT loop_id FROM loop_routes
+					WHERE route_id IN ({', '.join('?'*len(route_ids))})
+					GROUP BY loop_id
+					HAVING COUNT(*) = ?
+				)
+				"""
+			)
+			params.extend(route_ids)
+			params.append(len(route_ids))
+
+		if service_date is not None:
+			where.append("service_date = ?")
+			params.append(service_date.strftime(GTFS_STRF))
+
+		sql = "SELECT loop_json FROM loops"
+
+		if len(where) > 0:
+			sql += " WHERE " + " AND ".join(where)
+
+		sql += " ORDER BY start_sec, loop_id"
+
+		if limit is not None:
+			sql += " LIMIT ?"
+			params.append(limit)
+
+		return [
+			json.loads(loop_json)
+			for (loop_json,) in self._conn.execute(sql, params)
+		]
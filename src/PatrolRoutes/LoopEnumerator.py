@@ -0,0 +1,458 @@
+"""
+List every loop that satisfies the `Settings.loop` constraints, rather than
+the first one a random search runs into.
+"""
+
+
+from enum import Enum
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+from .Duration import BaseDuration, Minutes
+from .GTFSTime import GTFSTime
+from .Loop import Loop
+from .SegmentGraph import CSRGraph, SegmentGraph
+from .Settings import Settings
+from .Stops import Stop
+
+
+_INF = float("inf")
+
+## (node ID, arrived by trip, last route, segments up to the minimum,
+## origin station, elapsed time bucket)
+_StateKey = Tuple[int, bool, int, int, int, int]
+
+
+class _Outcome(Enum):
+	DEAD = 1
+	COMPLETE = 2
+	EXTENDABLE = 3
+
+
+class _EnumFrame:
+	"""
+	A state on the enumeration stack. `gap_lo`/`gap_hi` narrow down, as
+	children are ruled out, to an open range of remaining durations that no
+	loop completion from this state can have.
+	"""
+	__slots__ = (
+		"_key", "_duration", "_to_node", "_is_trip", "_elapsed",
+		"_n_segments", "_last_route", "_candidates", "_next", "_alive",
+		"_gap_lo", "_gap_hi"
+	)
+
+	_key: _StateKey
+	_duration: int
+	_to_node: int
+	_is_trip: bool
+	_elapsed: int
+	_n_segments: int
+	_last_route: int
+	_candidates: np.ndarray
+	_next: int
+	_alive: bool ## a loop was found below, or a branch below wasn't searched
+	_gap_lo: float
+	_gap_hi: float
+
+	def __init__(
+		self,
+		key: _StateKey,
+		duration: int,
+		to_node: int,
+		is_trip: bool,
+		elapsed: int,
+		n_segments: int,
+		last_route: int,
+		candidates: np.ndarray,
+		gap_lo: float
+	) -> None:
+		"""
+		"""
+		self._key = key
+		self._duration = duration
+		self._to_node = to_node
+		self._is_trip = is_trip
+		self._elapsed = elapsed
+		self._n_segments = n_segments
+		self._last_route = last_route
+		self._candidates = candidates
+		self._next = 0
+		self._alive = False
+		self._gap_lo = gap_lo
+		self._gap_hi = _INF
+
+	def narrow(
+		self,
+		lo: float,
+		hi: float
+	) -> None:
+		"""
+		"""
+		self._gap_lo = max(self._gap_lo, lo)
+		self._gap_hi = min(self._gap_hi, hi)
+
+
+class LoopEnumerator:
+	"""
+	Depth-first enumeration of every valid loop, in the same sense as
+	`Loop`: segments alternate between trips and transfers, and a loop ends
+	at the first trip back to its origin station that meets the duration
+	and segment minimums.
+
+	Subtrees with no valid loop are remembered so they're only searched
+	once. The rest of a loop only depends on the state it's in: the node,
+	whether it got there by trip, the last route, the segment count (up to
+	the minimum), the origin and the elapsed time. When a state turns out
+	dead, every completion from it is known to fall outside the loop
+	duration limits, and the search also learns a range of remaining
+	durations no completion has. That range is saved under the state with
+	its elapsed time rounded down to `bucket`. Any later state with the
+	same key whose remaining duration limits fall inside the range is dead
+	as well, whatever loop it came from. Loops are never skipped, so the
+	output is the same with `memoize = False`, only slower.
+	"""
+	_sg: SegmentGraph
+	_g: CSRGraph
+	_s: Settings
+	_loop_max_sec: Optional[int]
+	_loop_min_sec: Optional[int]
+	_loop_min_seg: int
+	_trip_min_sec: Optional[int]
+	_consec_route_ok: bool
+	_bucket_sec: int
+	_memoize: bool
+
+	_dead: Dict[_StateKey, Tuple[float, float]]
+	_n_expansions: int
+	_n_memo_hits: int
+	_n_loops: int
+
+	def __init__(
+		self,
+		sg: SegmentGraph,
+		settings: Settings,
+		bucket: BaseDuration = Minutes(5),
+		memoize: bool = True
+	) -> None:
+		"""
+		"""
+		self._sg = sg
+		self._g = sg.csr
+		self._s = settings
+
+		self._loop_max_sec = Loop._optional_seconds(settings.loop_max_duration)
+		self._loop_min_sec = Loop._optional_seconds(settings.loop_min_duration)
+		self._loop_min_seg = settings.loop_min_segments or 0
+		self._trip_min_sec = Loop._optional_seconds(settings.trip_min_duration)
+		self._consec_route_ok = settings.allow_consecutive_same_route
+
+		self._bucket_sec = max(1, int(bucket))
+		self._memoize = memoize
+
+		self._dead = {}
+		self._n_expansions = 0
+		self._n_memo_hits = 0
+		self._n_loops = 0
+
+	@property
+	def n_expansions(self) -> int: return self._n_expansions
+
+	@property
+	def n_memo_hits(self) -> int: return self._n_memo_hits
+
+	@property
+	def n_dead_states(self) -> int: return len(self._dead)
+
+	def _window(
+		self,
+		elapsed: int
+	) -> Tuple[float, float]:
+		"""
+		Remaining durations that would finish a loop within the limits.
+		"""
+		lo = -_INF if self._loop_min_sec is None else self._loop_min_sec - elapsed
+		hi = _INF if self._loop_max_sec is None else self._loop_max_sec - elapsed
+		return lo, hi
+
+	def _remember(
+		self,
+		frame: _EnumFrame
+	) -> None:
+		"""
+		"""
+		gap = (frame._gap_lo, frame._gap_hi)
+
+		old = self._dead.get(frame._key)
+
+		## Two overlapping gaps make a bigger one
+		if (old is not None) and (old[0] < gap[1]) and (gap[0] < old[1]):
+			gap = (min(old[0], gap[0]), max(old[1], gap[1]))
+
+		self._dead[frame._key] = gap
+
+	def _visit(
+		self,
+		edge_id: int,
+		parent_elapsed: int,
+		parent_n_segments: int,
+		parent_route: int,
+		origin: int,
+		bound: Optional[np.ndarray]
+	) -> Tuple[_Outcome, float, float, Optional[_EnumFrame]]:
+		"""
+		Check the state after taking `edge_id`, with the same rules as
+		`Loop`. Dead states come with a range of remaining durations (from
+		the parent) that no completion through them has.
+		"""
+		g = self._g
+
+		self._n_expansions += 1
+
+		is_trip = edge_id < g.n_trip_edges
+		src, dst = g.edge_endpoints(edge_id)
+
+		duration = int(g.node_departure[dst]) - int(g.node_arrival[src])
+		elapsed = parent_elapsed + duration
+		n_segments = parent_n_segments + 1
+
+		## Failures, see `Loop._has_failed()`
+		if (self._loop_max_sec is not None) and (elapsed > self._loop_max_sec):
+			return _Outcome.DEAD, -_INF, duration, None
+
+		last_route = parent_route
+
+		if is_trip:
+			if (self._trip_min_sec is not None) and (duration < self._trip_min_sec):
+				return _Outcome.DEAD, -_INF, _INF, None
+
+			if not self._consec_route_ok:
+				last_route = int(g.node_route[src])
+
+				if last_route == parent_route:
+					return _Outcome.DEAD, -_INF, _INF, None
+
+		## Complete, see `Loop._is_complete()`
+		can_end = (
+			is_trip
+			and (int(g.node_station[dst]) == origin)
+			and (n_segments >= self._loop_min_seg)
+		)
+
+		if can_end and (
+			(self._loop_min_sec is None) or (elapsed >= self._loop_min_sec)
+		):
+			return _Outcome.COMPLETE, 0, 0, None
+
+		## Can't get back in time, see `Loop._cannot_return_in_time()`
+		if bound is not None:
+			assert self._loop_max_sec is not None
+
+			if int(bound[dst]) == CSRGraph.UNREACHABLE:
+				return _Outcome.DEAD, -_INF, _INF, None
+
+			min_remaining = int(bound[dst]) - int(g.node_arrival[dst])
+
+			if elapsed + min_remaining > self._loop_max_sec:
+				return _Outcome.DEAD, -_INF, duration + min_remaining, None
+
+		key = (
+			dst, is_trip, last_route, min(n_segments, self._loop_min_seg),
+			origin, elapsed // self._bucket_sec
+		)
+
+		if self._memoize:
+			gap = self._dead.get(key)
+
+			if gap is not None:
+				lo, hi = self._window(elapsed)
+
+				## An infinite end of the gap covers an infinite end of the
+				## window, there's no duration there either way
+				covers_lo = (gap[0] == -_INF) or (gap[0] < lo)
+				covers_hi = (gap[1] == _INF) or (hi < gap[1])
+
+				if covers_lo and covers_hi:
+					self._n_memo_hits += 1
+					return _Outcome.DEAD, duration + gap[0], duration + gap[1], None
+
+		## Ending here is only too short, so no completion from here takes
+		## 0 seconds
+		gap_lo = 0 if can_end else -_INF
+
+		candidates = g.out_edges(dst)
+
+		if len(candidates) == 0:
+			return _Outcome.DEAD, duration + gap_lo, _INF, None
+
+		return _Outcome.EXTENDABLE, 0, 0, _EnumFrame(
+			key, duration, dst, is_trip, elapsed, n_segments, last_route,
+			candidates, gap_lo
+		)
+
+	def _root_edges(
+		self,
+		origin_station: Optional[str],
+		start_after: Optional[GTFSTime],
+		start_before: Optional[GTFSTime]
+	) -> np.ndarray:
+		"""
+		Trip edge IDs, in order, that a loop can start with.
+		"""
+		g = self._g
+
+		origin = None
+		if origin_station is not None:
+			origin = g.station_index(Stop.standardize_stop_name(origin_station))
+
+		return g.trip_edges_from(
+			origin,
+			None if start_after is None else int(start_after),
+			None if start_before is None else int(start_before)
+		).to_array()
+
+	def _may_extend(
+		self,
+		edge_ids: List[int],
+		frame: _EnumFrame
+	) -> bool:
+		"""
+		Whether to search below the partial loop `edge_ids`, which ends in
+		the state `frame`. Always for plain enumeration, subclasses can cut
+		branches that can't hold a loop they want.
+		"""
+		return True
+
+	def _search(
+		self,
+		root_edges: np.ndarray
+	) -> Iterator[List[int]]:
+		"""
+		Edge IDs of every valid loop starting with one of `root_edges`, in
+		depth-first order.
+		"""
+		g = self._g
+
+		sources = g.trip_edge_sources()
+
+		for root_edge in root_edges:
+			root_edge = int(root_edge)
+
+			origin = int(g.node_station[sources[root_edge]])
+
+			bound = None
+			if self._loop_max_sec is not None:
+				bound = g.earliest_return(origin)
+
+			outcome, _, _, root = self._visit(root_edge, 0, 0, -1, origin, bound)
+
+			if outcome == _Outcome.COMPLETE:
+				yield [root_edge]
+				continue
+
+			path: List[int] = [root_edge]
+
+			if (root is None) or (not self._may_extend(path, root)):
+				continue
+
+			stack: List[_EnumFrame] = [root]
+
+			while len(stack) > 0:
+				frame = stack[-1]
+
+				edge_id = self._next_candidate(frame)
+
+				## Every option after this state was tried, backtrack
+				if edge_id is None:
+					stack.pop()
+					path.pop()
+
+					if not frame._alive:
+						self._remember(frame)
+
+					if len(stack) > 0:
+						parent = stack[-1]
+
+						if frame._alive:
+							parent._alive = True
+						else:
+							parent.narrow(
+								frame._duration + frame._gap_lo,
+								frame._duration + frame._gap_hi
+							)
+
+					continue
+
+				outcome, lo, hi, child = self._visit(
+					edge_id, frame._elapsed, frame._n_segments,
+					frame._last_route, origin, bound
+				)
+
+				if outcome == _Outcome.COMPLETE:
+					frame._alive = True
+					yield path + [edge_id]
+				elif outcome == _Outcome.DEAD:
+					frame.narrow(lo, hi)
+				else:
+					assert child is not None
+					path.append(edge_id)
+
+					if self._may_extend(path, child):
+						stack.append(child)
+					else:
+						## Not searched, so not known to be dead either
+						path.pop()
+						frame._alive = True
+
+	def enumerate(
+		self,
+		origin_station: Optional[str] = None,
+		start_after: Optional[GTFSTime] = None,
+		start_before: Optional[GTFSTime] = None
+	) -> Iterator[Loop]:
+		"""
+		Yield every valid loop from `origin_station` (a stop name, any
+		station if `None`) whose first departure is within the given
+		(inclusive) times. Loops come out grouped by their first trip edge,
+		in edge ID order, and are numbered from 0 across calls. They weren't
+		drawn from a seed, so `Loop.seed` is -1.
+
+		Dead states found here are kept for later calls.
+		"""
+		for edge_ids in self._search(
+			self._root_edges(origin_station, start_after, start_before)
+		):
+			yield self._new_loop(edge_ids)
+
+	def _next_candidate(
+		self,
+		frame: _EnumFrame
+	) -> Optional[int]:
+		"""
+		Next outgoing edge of `frame` that keeps trips and transfers
+		alternating, `None` once there are none left.
+		"""
+		n_trip_edges = self._g.n_trip_edges
+
+		while frame._next < len(frame._candidates):
+			edge_id = int(frame._candidates[frame._next])
+			frame._next += 1
+
+			if frame._is_trip != (edge_id < n_trip_edges):
+				return edge_id
+
+		return None
+
+	def _new_loop(
+		self,
+		edge_ids: List[int]
+	) -> Loop:
+		"""
+		"""
+		loop = Loop.from_edge_ids(
+			self._n_loops, -1, self._sg, self._s, edge_ids
+		)
+
+		self._n_loops += 1
+
+		return loop
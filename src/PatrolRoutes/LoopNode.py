@@ -4,13 +4,16 @@ Data structures for the main route-finding algorithm in Loop.py
 
 
 from abc import ABC, abstractmethod, ABCMeta
-from typing import Generic, List, Tuple, Type, TypeVar, Optional
+from typing import cast, Generic, List, Tuple, Type, TypedDict, TypeVar, Optional
 
 
-from .Duration import BaseDuration, Minutes
+from .Duration import BaseDuration, Minutes, Seconds
 from .GTFSTime import GTFSTime
 #from .LinkedList import LLContainerNode, LLContainer
-from .LinkedList import BaseLLNode, BaseLL
+from .LinkedList import (
+	BaseLLNode, BaseLL, InvalidConnectionException, InvalidDisconnectionException
+)
+from .SegmentGraph import CSRGraph
 from .SegmentGraph import Edge as SegmentEdge
 from .SegmentGraph import TripEdge as SegmentTripEdge
 from .SegmentGraph import TransferEdge as SegmentTransferEdge
@@ -22,10 +25,42 @@ from .Utils import RouteStyle as RS
 #O = Optional ## Going to be typing this a lot, no pun intended.
 
 
+class LoopStepJSON(TypedDict):
+	"""
+	One segment of a loop as written to JSON. Route and trip fields are only
+	set for "trip" steps, `distance_miles` only for "walk" steps.
+	"""
+	segment_number: int
+	kind: str ## "trip", "wait" or "walk"
+	from_stop_id: int
+	from_stop_name: str
+	to_stop_id: int
+	to_stop_name: str
+	departure_time: str
+	arrival_time: str
+	duration_seconds: int
+	route_id: Optional[str]
+	route_name: Optional[str]
+	trip_id: Optional[int]
+	headsign: Optional[str]
+	n_stops: Optional[int]
+	distance_miles: Optional[float]
+
+
 SEG_EDGE_T = TypeVar("SEG_EDGE_T", bound = SegmentEdge)
 NXT_PRV_T = TypeVar("NXT_PRV_T", bound = "LoopNode") ## These are conveniently always the same type(s)
 class LoopNode(BaseLLNode[NXT_PRV_T, NXT_PRV_T], ABC, Generic[NXT_PRV_T, SEG_EDGE_T]):
-	_segment: SEG_EDGE_T
+	"""
+	One segment of a loop, i.e. one edge of the `CSRGraph`. Only the edge ID
+	is stored; the `Edge` object is built the first time `segment_edge` is
+	read, which in practice is only when printing a finished loop.
+	"""
+	_graph: CSRGraph
+	_edge_id: int
+	_from_node: int
+	_to_node: int
+	_duration_sec: int
+	_segment: Optional[SEG_EDGE_T]
 	_prv: Optional[NXT_PRV_T]
 	_nxt: Optional[NXT_PRV_T]
 
@@ -37,7 +72,8 @@ class LoopNode(BaseLLNode[NXT_PRV_T, NXT_PRV_T], ABC, Generic[NXT_PRV_T, SEG_EDG
 		self,
 		loop_number: int,
 		segment_number: int,
-		segment: SEG_EDGE_T,
+		graph: CSRGraph,
+		edge_id: int,
 		settings: Settings
 	) -> None:
 		"""
@@ -45,37 +81,113 @@ class LoopNode(BaseLLNode[NXT_PRV_T, NXT_PRV_T], ABC, Generic[NXT_PRV_T, SEG_EDG
 		## initializes neighbors to None
 		super().__init__()
 
-		self._segment = segment
+		self._graph = graph
+		self._edge_id = edge_id
+		self._from_node, self._to_node = graph.edge_endpoints(edge_id)
+		self._duration_sec = int(
+			graph.node_departure[self._to_node]
+			- graph.node_arrival[self._from_node]
+		)
+		self._segment = None
 		self._loop_num = loop_number
 		self._seg_num = segment_number
 		self._s = settings
 
 	@property
-	def name(self) -> str: return self._segment.name
+	def name(self) -> str: return self._graph.edge_name(self._edge_id)
+
+	@property
+	def edge_id(self) -> int: return self._edge_id
 
 	@property
 	def segment_number(self) -> int: return self._seg_num
 
 	@property
-	def from_stop(self) -> Stop: return self._segment.prv_node.stop
+	def from_node_id(self) -> int: return self._from_node
+
+	@property
+	def to_node_id(self) -> int: return self._to_node
+
+	@property
+	def duration_seconds(self) -> int: return self._duration_sec
 
 	@property
-	def to_stop(self) -> Stop: return self._segment.nxt_node.stop
+	def from_station(self) -> int:
+		"""
+		Station index in the `CSRGraph`, the same for every stop with the
+		same standard stop name.
+		"""
+		return int(self._graph.node_station[self._from_node])
 
 	@property
-	def segment_edge(self) -> SEG_EDGE_T: return self._segment
+	def to_station(self) -> int:
+		"""
+		"""
+		return int(self._graph.node_station[self._to_node])
+
+	@property
+	def route_index(self) -> int:
+		"""
+		Route index in the `CSRGraph` for trip segments, -1 for transfers.
+		"""
+		return -1
+
+	@property
+	def duration(self) -> BaseDuration: return Seconds(self.duration_seconds)
+
+	@property
+	def from_stop(self) -> Stop: return self._graph.node(self._from_node).stop
+
+	@property
+	def to_stop(self) -> Stop: return self._graph.node(self._to_node).stop
+
+	@property
+	def segment_edge(self) -> SEG_EDGE_T:
+		if self._segment is None:
+			self._segment = cast(SEG_EDGE_T, self._graph.edge(self._edge_id))
+		return self._segment
 
 	@property
 	def from_departure_time(self) -> GTFSTime: 
-		return self._segment.prv_node.departure_time
+		return GTFSTime(int(self._graph.node_departure[self._from_node]))
 	
 	@property
 	def to_arrival_time(self) -> GTFSTime:
-		return self._segment.nxt_node.arrival_time
+		return GTFSTime(int(self._graph.node_arrival[self._to_node]))
+
+	@property
+	@abstractmethod
+	def step_kind(self) -> str:
+		pass
+
+	def to_step(self) -> LoopStepJSON:
+		"""
+		Structured version of `__str__()`.
+		"""
+		from_stop = self.from_stop
+		to_stop = self.to_stop
+
+		return {
+			"segment_number": self._seg_num,
+			"kind": self.step_kind,
+			"from_stop_id": from_stop.stop_id,
+			"from_stop_name": from_stop.stop_name,
+			"to_stop_id": to_stop.stop_id,
+			"to_stop_name": to_stop.stop_name,
+			"departure_time": self.from_departure_time.to_fstr(),
+			"arrival_time": self.to_arrival_time.to_fstr(),
+			"duration_seconds": self._duration_sec,
+			"route_id": None,
+			"route_name": None,
+			"trip_id": None,
+			"headsign": None,
+			"n_stops": None,
+			"distance_miles": None
+		}
 
 
 class TripNode(LoopNode["WaitingNode|WalkingNode", SegmentTripEdge]):
-	_segment: SegmentTripEdge
+	_segment: Optional[SegmentTripEdge]
 	_prv: "Optional[WaitingNode|WalkingNode]"
 	_nxt: "Optional[WaitingNode|WalkingNode]"
 
@@ -83,22 +195,46 @@ class TripNode(LoopNode["WaitingNode|WalkingNode", SegmentTripEdge]):
 	_seg_num: int
 	_s: Settings
 
+	@property
+	def route_index(self) -> int:
+		return int(self._graph.node_route[self._from_node])
+
+	@property
+	def step_kind(self) -> str: return "trip"
+
+	def to_step(self) -> LoopStepJSON:
+		"""
+		"""
+		step = super().to_step()
+
+		trip = self.segment_edge.trip
+
+		step["route_id"] = trip.route_id
+		step["route_name"] = RS(trip.route_id, self._s).route_name
+		step["trip_id"] = trip.trip_id
+		step["headsign"] = trip.trip_headsign
+		step["n_stops"] = int(self._graph.edge_distance(self._edge_id))
+
+		return step
+
 	def __str__(self) -> str:
 		"""
 		"""
+		segment = self.segment_edge
+
 		from_dep_time = self.from_departure_time.to_fstr(use_ampm = True)
 
-		rte = RS(self._segment.trip.route_id, self._s)
+		rte = RS(segment.trip.route_id, self._s)
 
-		hdsgn = self._segment.trip.trip_headsign
+		hdsgn = segment.trip.trip_headsign
 
-		dirname = self._segment.trip
+		dirname = segment.trip
 
 		from_stop_name = self.from_stop.stop_name
 
-		dist = self._segment.distance
+		dist = segment.distance
 
-		duration = Minutes(self._segment.duration)
+		duration = Minutes(segment.duration)
 
 		to_arr_time = self.to_arrival_time.to_fstr(use_ampm = True)
 
@@ -116,7 +252,7 @@ class WaitingNode(LoopNode["TripNode", SegmentTransferEdge]):
 	"""
 	Use this when transfer is at the same stop.
 	"""
-	_segment: SegmentTransferEdge
+	_segment: Optional[SegmentTransferEdge]
 	_prv: "Optional[TripNode]"
 	_nxt: "Optional[TripNode]"
 
@@ -124,28 +260,33 @@ class WaitingNode(LoopNode["TripNode", SegmentTransferEdge]):
 	_seg_num: int
 	_s: Settings
 
+	@property
+	def step_kind(self) -> str: return "wait"
+
 	def __str__(self) -> str:
+		segment = self.segment_edge
+
 		from_dep_time = self.from_departure_time.to_fstr(use_ampm = True)
 
 		from_stop_name = self.from_stop.stop_name
 
-		nxt_rte = RS(self._segment.nxt_node.trip.route_id, self._s)
+		nxt_rte = RS(segment.nxt_node.trip.route_id, self._s)
 
-		nxt_dirname = self._segment.nxt_node.trip.direction_name
+		nxt_dirname = segment.nxt_node.trip.direction_name
 
-		nxt_rte_hdsgn = self._segment.nxt_node.trip.trip_headsign
+		nxt_rte_hdsgn = segment.nxt_node.trip.trip_headsign
 
 		to_arr_time = self.to_arrival_time.to_fstr(
 			use_ampm = True
 		)
 
-		to_dep_time = self._segment.nxt_node.departure_time.to_fstr(
+		to_dep_time = segment.nxt_node.departure_time.to_fstr(
 			use_ampm = True
 		)
 
 		ttime = (
-			self._segment.nxt_node.departure_time
-			- self._segment.prv_node.arrival_time
+			segment.nxt_node.departure_time
+			- segment.prv_node.arrival_time
 		)
 
 		return f"""STEP {self._seg_num} | Wait here | {Minutes(ttime)} transfer
@@ -160,7 +301,7 @@ class WalkingNode(LoopNode["TripNode", SegmentTransferEdge]):
 	"""
 	Use this when transfer is between different stops.
 	"""
-	_segment: SegmentTransferEdge
+	_segment: Optional[SegmentTransferEdge]
 	_prv: "Optional[TripNode]"
 	_nxt: "Optional[TripNode]"
 
@@ -168,7 +309,19 @@ class WalkingNode(LoopNode["TripNode", SegmentTransferEdge]):
 	_seg_num: int
 	_s: Settings
 
+	@property
+	def step_kind(self) -> str: return "walk"
+
+	def to_step(self) -> LoopStepJSON:
+		"""
+		"""
+		step = super().to_step()
+		step["distance_miles"] = self._graph.edge_distance(self._edge_id)
+		return step
+
 	def __str__(self) -> str:
+		segment = self.segment_edge
+
 		from_dep_time = self.from_departure_time.to_fstr(
 			use_ampm = True
 		)
@@ -183,24 +336,24 @@ class WalkingNode(LoopNode["TripNode", SegmentTransferEdge]):
 		else:
 			walk_inst = f"Walk to {self.to_stop.stop_name} for"
 
-		nxt_rte = RS(self._segment.nxt_node.trip.route_id, self._s)
+		nxt_rte = RS(segment.nxt_node.trip.route_id, self._s)
 
-		nxt_dirname = self._segment.nxt_node.trip.direction_name
+		nxt_dirname = segment.nxt_node.trip.direction_name
 
-		distance = self._segment.distance
+		distance = segment.distance
 
 		ttime = (
-			self._segment.nxt_node.departure_time
-			- self._segment.prv_node.arrival_time
+			segment.nxt_node.departure_time
+			- segment.prv_node.arrival_time
 		)
 
 		to_arr_time = self.to_arrival_time.to_fstr(use_ampm = True)
 
-		to_dep_time = self._segment.nxt_node.departure_time.to_fstr(
+		to_dep_time = segment.nxt_node.departure_time.to_fstr(
 			use_ampm = True
 		)
 
-		nxt_rte_hdsgn = self._segment.nxt_node.trip.trip_headsign
+		nxt_rte_hdsgn = segment.nxt_node.trip.trip_headsign
 
 		if same_tc_intersection:
 			inst_header = f"Walk to {nxt_rte.prefixed_route_name} (to {nxt_rte_hdsgn}) in {Minutes(ttime)}"
@@ -216,10 +369,28 @@ class WalkingNode(LoopNode["TripNode", SegmentTransferEdge]):
 		"""
 
 
+## Loop signatures are a polynomial hash of the edge IDs modulo a 127 bit 
+## prime, which fits in 16 bytes and can be extended one edge at a time
+SIGNATURE_MOD = (1 << 127) - 1
+_SIGNATURE_BASE = 0x1F3D5B79A2C4E6081F3D5B79A2C4E609
+
+
 class LoopLL(BaseLL[LoopNode]):
+	"""
+	Nodes can only be added to or removed from the end of the list, which
+	lets the list keep running totals of the loop so far. Every property
+	below is O(1), however long the loop is.
+	"""
 	_root: Optional[LoopNode[WalkingNode|WaitingNode, SegmentTripEdge]]
 	_inc: List[Tuple[Type[LoopNode], Type[LoopNode]]]
 
+	_last: Optional[LoopNode]
+	_cum_sec: int
+	_n_segments: int
+	_trip_routes: List[int] ## route index of each trip segment, in order
+	_origin_station: int
+	_signatures: List[int] ## signature of the loop up to each segment
+
 	def __init__(
 		self
 	) -> None:
@@ -235,21 +406,130 @@ class LoopLL(BaseLL[LoopNode]):
 			(WaitingNode, WalkingNode)
 		])
 
+		self._last = None
+		self._cum_sec = 0
+		self._n_segments = 0
+		self._trip_routes = []
+		self._origin_station = -1
+		self._signatures = []
+
 	@property
-	def cumulative_duration(self) -> BaseDuration:
+	def root(self) -> Optional[LoopNode]: return self._root
+	@root.setter
+	def root(self, node: LoopNode) -> None:
+		if self._root is not None:
+			raise RuntimeError(
+				f"Cannot set root of this linked list to {node} "
+				f"because it is already {self._root}."
+			)
+
+		self._root = node
+		self._last = node
+		self._cum_sec = node.duration_seconds
+		self._n_segments = 1
+		self._trip_routes = [] if node.route_index < 0 else [node.route_index]
+		self._origin_station = node.from_station
+		self._signatures = [self._extend_signature(0, node)]
+
+	@classmethod
+	def _extend_signature(
+		cls,
+		signature: int,
+		node: LoopNode
+	) -> int:
 		"""
 		"""
-		if self._root is None:
-			return Minutes(0)
+		return (signature*_SIGNATURE_BASE + node.edge_id + 1) % SIGNATURE_MOD
+
+	@property
+	def last(self) -> Optional[LoopNode]: return self._last
+
+	def connect_nodes(
+		self,
+		node1: LoopNode,
+		node2: LoopNode
+	) -> None:
+		"""
+		Append `node2` after `node1`, which has to be the last node.
+		"""
+		if node1 is not self._last:
+			raise InvalidConnectionException(node1, node2)
+
+		super().connect_nodes(node1, node2)
+
+		self._last = node2
+		self._cum_sec += node2.duration_seconds
+		self._n_segments += 1
+
+		if node2.route_index >= 0:
+			self._trip_routes.append(node2.route_index)
+
+		self._signatures.append(
+			self._extend_signature(self._signatures[-1], node2)
+		)
+
+	def disconnect_nodes(
+		self,
+		node1: LoopNode,
+		node2: LoopNode
+	) -> None:
+		"""
+		Remove `node2`, which has to be the last node, from after `node1`.
+		"""
+		if node2 is not self._last:
+			raise InvalidDisconnectionException(node1, node2)
+
+		super().disconnect_nodes(node1, node2)
+
+		self._last = node1
+		self._cum_sec -= node2.duration_seconds
+		self._n_segments -= 1
 
-		curr = self._root
-		duration = curr.segment_edge.duration
+		if node2.route_index >= 0:
+			self._trip_routes.pop()
 
-		while curr.next is not None:
-			curr = curr.next
-			duration += curr.segment_edge.duration
+		self._signatures.pop()
 
-		return duration
+	@property
+	def cumulative_seconds(self) -> int: return self._cum_sec
+
+	@property
+	def cumulative_duration(self) -> BaseDuration: return Seconds(self._cum_sec)
+
+	@property
+	def n_segments(self) -> int: return self._n_segments
+
+	@property
+	def last_route(self) -> int:
+		"""
+		Route index of the last trip segment, -1 if there isn't one.
+		"""
+		if len(self._trip_routes) == 0:
+			return -1
+		return self._trip_routes[-1]
+
+	@property
+	def previous_route(self) -> int:
+		"""
+		Route index of the trip segment before the last one, -1 if there
+		isn't one.
+		"""
+		if len(self._trip_routes) < 2:
+			return -1
+		return self._trip_routes[-2]
+
+	@property
+	def origin_station(self) -> int: return self._origin_station
+
+	@property
+	def signature(self) -> int:
+		"""
+		Hash of the `CSRGraph` edge IDs in the list, less than 
+		`SIGNATURE_MOD`. 0 if the list is empty. 
+		"""
+		if len(self._signatures) == 0:
+			return 0
+		return self._signatures[-1]
 	
 	@property
 	def first_stop(self) -> Optional[Stop]:
@@ -257,25 +537,21 @@ class LoopLL(BaseLL[LoopNode]):
 		"""
 		if self._root is None:
 			return None
-		return self._root.segment_edge.prv_node.stop
+		return self._root.from_stop
 	
 	@property
 	def last_stop(self) -> Optional[Stop]:
 		"""
 		"""
-		if self.last is None:
+		if self._last is None:
 			return None
-		return self.last.to_stop
+		return self._last.to_stop
 	
 	@property
 	def returns_to_first_stop(self) -> bool:
-		first = self.first_stop
-		last = self.last_stop
-
-		if (first is None) or (last is None):
+		if self._last is None:
 			return False
-		else:
-			return first.standard_stop_name == last.standard_stop_name
+		return self._last.to_station == self._origin_station
 	
 	def is_within_time_limit(
 		self,
@@ -283,4 +559,4 @@ class LoopLL(BaseLL[LoopNode]):
 	) -> bool:
 		"""
 		"""
-		return self.cumulative_duration < time_limit
\ No newline at end of file
+		return self._cum_sec < int(time_limit)
@@ -0,0 +1,289 @@
+"""
+Draw loops uniformly (or by weight) from every valid loop, rather than the
+first one a random search runs into.
+"""
+
+
+from bisect import bisect_right
+import numpy as np
+import random
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+
+from .GTFSTime import GTFSTime
+from .Loop import Loop
+from .LoopEnumerator import LoopEnumerator, _EnumFrame, _Outcome
+from .SegmentGraph import SegmentGraph
+from .Settings import Settings
+
+
+Weight = Union[int, float]
+
+## Like `_StateKey`, but with the exact elapsed seconds
+_ExactKey = Tuple[int, bool, int, int, int, int]
+
+## Outgoing choices of a state with completions: edge IDs, the state each
+## leads to (`None` if taking it completes the loop), and the running total
+## of their weights
+_Choices = Tuple[List[int], List[Optional[_ExactKey]], List[Weight]]
+
+
+class LoopSampler(LoopEnumerator):
+	"""
+	Samples from the same loops `LoopEnumerator` lists. The graph is time
+	ordered, so the states of a partial loop form a DAG. One pass counts the
+	completions of every state that can reach one. After that a loop is
+	drawn by walking from a start, picking each next edge in proportion to
+	the completions behind it, which is O(segments * log(branching)).
+
+	With `edge_weight`, a loop is drawn in proportion to the product of its
+	edge weights instead of uniformly.
+	"""
+	_edge_weight: Optional[Callable[[int], float]]
+	_counts: Dict[_ExactKey, Weight]
+	_choices: Dict[_ExactKey, _Choices]
+	_roots: Dict[Tuple[Optional[str], Optional[int], Optional[int]], _Choices]
+
+	def __init__(
+		self,
+		sg: SegmentGraph,
+		settings: Settings,
+		edge_weight: Optional[Callable[[int], float]] = None
+	) -> None:
+		"""
+		`edge_weight` takes a `CSRGraph` edge ID and returns a positive
+		weight.
+		"""
+		super().__init__(sg, settings)
+
+		self._edge_weight = edge_weight
+		self._counts = {}
+		self._choices = {}
+		self._roots = {}
+
+	@property
+	def n_states(self) -> int:
+		"""
+		States with at least one completion.
+		"""
+		return len(self._choices)
+
+	def _weight(
+		self,
+		edge_id: int
+	) -> Weight:
+		"""
+		"""
+		if self._edge_weight is None:
+			return 1
+		return self._edge_weight(edge_id)
+
+	def _exact_key(
+		self,
+		frame: _EnumFrame
+	) -> _ExactKey:
+		"""
+		"""
+		return frame._key[:5] + (frame._elapsed,)
+
+	def _count_from(
+		self,
+		root: _EnumFrame,
+		origin: int,
+		bound: Optional[np.ndarray]
+	) -> Weight:
+		"""
+		Count the completions of `root` and every state below it that isn't
+		counted yet, post-order with an explicit stack.
+		"""
+		stack: List[Tuple[_EnumFrame, _ExactKey, _Choices]] = [
+			(root, self._exact_key(root), ([], [], []))
+		]
+		## Edge taken into each stack entry after the first
+		edges_in: List[int] = []
+
+		total: Weight = 0
+
+		while len(stack) > 0:
+			frame, key, choices = stack[-1]
+
+			edge_id = self._next_candidate(frame)
+
+			if edge_id is None:
+				stack.pop()
+
+				n_completions = choices[2][-1] if len(choices[2]) > 0 else 0
+				self._counts[key] = n_completions
+
+				if n_completions > 0:
+					self._choices[key] = choices
+
+				if len(stack) == 0:
+					total = n_completions
+				else:
+					self._add_choice(
+						stack[-1][2], edges_in.pop(), key, n_completions
+					)
+
+				continue
+
+			outcome, _, _, child = self._visit(
+				edge_id, frame._elapsed, frame._n_segments,
+				frame._last_route, origin, bound
+			)
+
+			if outcome == _Outcome.COMPLETE:
+				self._add_choice(choices, edge_id, None, 1)
+
+			elif outcome == _Outcome.EXTENDABLE:
+				assert child is not None
+				child_key = self._exact_key(child)
+
+				if child_key in self._counts:
+					self._add_choice(
+						choices, edge_id, child_key, self._counts[child_key]
+					)
+				else:
+					stack.append((child, child_key, ([], [], [])))
+					edges_in.append(edge_id)
+
+		return total
+
+	def _add_choice(
+		self,
+		choices: _Choices,
+		edge_id: int,
+		child_key: Optional[_ExactKey],
+		n_completions: Weight
+	) -> None:
+		"""
+		"""
+		if n_completions <= 0:
+			return
+
+		weight = self._weight(edge_id)*n_completions
+		prv_total = choices[2][-1] if len(choices[2]) > 0 else 0
+
+		choices[0].append(edge_id)
+		choices[1].append(child_key)
+		choices[2].append(prv_total + weight)
+
+	def _root_choices(
+		self,
+		origin_station: Optional[str],
+		start_after: Optional[GTFSTime],
+		start_before: Optional[GTFSTime]
+	) -> _Choices:
+		"""
+		Counting pass for the starts allowed by the arguments, cached.
+		"""
+		cache_key = (
+			origin_station,
+			None if start_after is None else int(start_after),
+			None if start_before is None else int(start_before)
+		)
+
+		try:
+			return self._roots[cache_key]
+		except KeyError:
+			pass
+
+		g = self._g
+		sources = g.trip_edge_sources()
+
+		choices: _Choices = ([], [], [])
+
+		for root_edge in self._root_edges(origin_station, start_after, start_before):
+			root_edge = int(root_edge)
+
+			origin = int(g.node_station[sources[root_edge]])
+
+			bound = None
+			if self._loop_max_sec is not None:
+				bound = g.earliest_return(origin)
+
+			outcome, _, _, root = self._visit(root_edge, 0, 0, -1, origin, bound)
+
+			if outcome == _Outcome.COMPLETE:
+				self._add_choice(choices, root_edge, None, 1)
+
+			elif outcome == _Outcome.EXTENDABLE:
+				assert root is not None
+				root_key = self._exact_key(root)
+
+				if root_key not in self._counts:
+					self._count_from(root, origin, bound)
+
+				self._add_choice(
+					choices, root_edge, root_key, self._counts[root_key]
+				)
+
+		self._roots[cache_key] = choices
+
+		return choices
+
+	def count(
+		self,
+		origin_station: Optional[str] = None,
+		start_after: Optional[GTFSTime] = None,
+		start_before: Optional[GTFSTime] = None
+	) -> Weight:
+		"""
+		Number of loops `LoopEnumerator.enumerate()` would yield for the
+		same arguments, or their total weight with `edge_weight`.
+		"""
+		totals = self._root_choices(origin_station, start_after, start_before)[2]
+		return totals[-1] if len(totals) > 0 else 0
+
+	def _pick(
+		self,
+		choices: _Choices,
+		rng: random.Random
+	) -> Tuple[int, Optional[_ExactKey]]:
+		"""
+		"""
+		totals = choices[2]
+
+		if isinstance(totals[-1], int):
+			r = rng.randrange(totals[-1])
+		else:
+			r = rng.random()*totals[-1]
+
+		i = min(bisect_right(totals, r), len(totals) - 1)
+
+		return choices[0][i], choices[1][i]
+
+	def sample(
+		self,
+		n: int,
+		seed: int,
+		origin_station: Optional[str] = None,
+		start_after: Optional[GTFSTime] = None,
+		start_before: Optional[GTFSTime] = None
+	) -> Iterator[Loop]:
+		"""
+		Draw `n` loops, with replacement, from the loops allowed by the
+		arguments (see `LoopEnumerator.enumerate()`). Loops are numbered
+		0..n-1 and the same `seed` always draws the same loops. Yields
+		nothing if there are no valid loops.
+		"""
+		root_choices = self._root_choices(
+			origin_station, start_after, start_before
+		)
+
+		if len(root_choices[0]) == 0:
+			return
+
+		rng = random.Random(seed)
+
+		for loop_num in range(n):
+			edge_id, key = self._pick(root_choices, rng)
+			edge_ids = [edge_id]
+
+			while key is not None:
+				edge_id, key = self._pick(self._choices[key], rng)
+				edge_ids.append(edge_id)
+
+			yield Loop.from_edge_ids(
+				loop_num, seed, self._sg, self._s, edge_ids
+			)
@@ -3,24 +3,51 @@ Generate transit trips with specific time and segment constraints.
 """
 
 
+import json
+import multiprocessing as mp
 import numpy as np
 from pathlib import Path
-import sys
-from typing import Dict, Optional
+from typing import (
+	Dict, Iterator, List, Optional, Sequence, Set, TextIO, Tuple
+)
 
 
-from .Loop import Loop
+from .Duration import BaseDuration
+from .Loop import Loop, SearchStatus, StopReason
+from .LoopCatalog import LoopCatalog
 from .SegmentGraph import SegmentGraph
 from .Settings import Settings
 
 
-sys.setrecursionlimit(2000)
+## Set by `PatrolRoutes.generate_loops()` right before the worker pool forks,
+## so the workers inherit the graph copy-on-write instead of unpickling it
+_fork_state: Optional[Tuple[SegmentGraph, Settings]] = None
+
+
+def _build_in_worker(
+	job: Tuple[int, int, Optional[int], Optional[BaseDuration]]
+) -> Tuple[int, int, StopReason, int, List[int]]:
+	"""
+	Build one loop in a forked worker. Only the stop reason, signature and
+	edge IDs (the best partial loop if the budget ran out) go back to the 
+	parent, it rebuilds the `Loop` against its own copy of the graph.
+	"""
+	assert _fork_state is not None
+	sg, settings = _fork_state
+
+	loop_num, seed, max_expansions, time_limit = job
+
+	loop = Loop(loop_num, seed, sg, settings)
+	reason = loop.search(max_expansions, time_limit)
+
+	return loop_num, seed, reason, loop.get_signature(), loop.best_partial
 
 
 class PatrolRoutes:
 	_s: Settings
 	_sg: SegmentGraph
-	_loop_d: Dict[int, Loop]
+	_loop_d: Dict[int, Loop] ## loops built by `run_interactive_demo()`
+	_catalog: Optional[LoopCatalog] ## at `Settings.loops_path`, if set
 
 	def __init__(
 		self,
@@ -31,13 +58,18 @@ class PatrolRoutes:
 		"""
 		self._s = Settings(settings_path)
 		
+		## Loops only traverse the CSR form, so the `Edge` objects are 
+		## freed as soon as it's compiled. A compacted graph is also saved
+		## without them and never rebuilds them on load.
 		if build:
 			if self._s.segment_graph_path is not None:
 				try:
 					self._sg = SegmentGraph.load(self._s.segment_graph_path)
+					self._sg.compact()
 				except FileNotFoundError:
 					self._sg = SegmentGraph(self._s)
 					self._sg.build_graph()
+					self._sg.compact()
 					self._sg.save(self._s.segment_graph_path)
 				except EOFError:
 					raise IOError(
@@ -46,8 +78,25 @@ class PatrolRoutes:
 			else:
 				self._sg = SegmentGraph(self._s)
 				self._sg.build_graph()
+				self._sg.compact()
 
 		self._loop_d = {}
+
+		self._catalog = None
+		if self._s.loops_path is not None:
+			self._catalog = LoopCatalog(self._s.loops_path)
+
+	@property
+	def catalog(self) -> Optional[LoopCatalog]: return self._catalog
+
+	def _add_to_catalog(
+		self,
+		loop: Loop
+	) -> None:
+		"""
+		"""
+		if self._catalog is not None:
+			self._catalog.add(loop, self._s.service_date)
 	
 	def run_interactive_demo(
 		self,
@@ -70,12 +119,146 @@ class PatrolRoutes:
 			)
 
 			new_loop.build()
+			self._loop_d[new_loop.loop_number] = new_loop
+			self._add_to_catalog(new_loop)
+
+			if self._catalog is not None:
+				self._catalog.commit()
 
 			print(str(new_loop))
 
 			_ = input("Press ENTER to build the next loop.")
 
 			loop_num += 1
-			
 
-	
+	def generate_loops(
+		self,
+		n: int,
+		seeds: Optional[Sequence[int]] = None,
+		workers: int = 1,
+		distinct: bool = False,
+		max_expansions: Optional[int] = None,
+		time_limit: Optional[BaseDuration] = None
+	) -> Iterator[Loop]:
+		"""
+		Build `n` loops, one per seed (`0..n-1` by default), and yield them 
+		as they finish. With more than one worker, the loops are built in
+		forked processes that share this `SegmentGraph`, so they come back
+		in completion order; match them up by `Loop.seed` or 
+		`Loop.loop_number`. Either way a seed always gives the same loop.
+		Loops whose search was exhausted are yielded too, check 
+		`Loop.status`. Nothing is printed. Found loops are also saved to the
+		`catalog`, if there is one, and committed once all `n` are done.
+		No reference to a yielded loop is kept here.
+
+		With `distinct`, a found loop is skipped if a loop with the same
+		`Loop.get_signature()` was already yielded. Only the signatures are
+		kept for this, not the loops.
+
+		`max_expansions` and `time_limit` are a budget for each loop's search
+		(see `Loop.search()`). A loop that runs out is yielded `PAUSED`, 
+		with its `Loop.stop_reason` and `Loop.best_partial`.
+		"""
+		global _fork_state
+
+		seen: Set[int] = set()
+
+		def is_repeat(
+			status: Optional[SearchStatus],
+			signature: int
+		) -> bool:
+			if (not distinct) or (status != SearchStatus.FOUND):
+				return False
+
+			if signature in seen:
+				return True
+
+			seen.add(signature)
+			return False
+
+		if seeds is None:
+			seeds = range(n)
+		elif len(seeds) < n:
+			raise ValueError(f"Need {n} seeds, got {len(seeds)}")
+
+		jobs = [
+			(loop_num, int(seeds[loop_num]), max_expansions, time_limit)
+			for loop_num in range(n)
+		]
+
+		## Forking is what makes sharing the graph cheap, build in this
+		## process where it isn't available
+		if (workers <= 1) or ("fork" not in mp.get_all_start_methods()):
+			for loop_num, seed, _, _ in jobs:
+				loop = Loop(loop_num, seed, self._sg, self._s)
+				loop.search(max_expansions, time_limit)
+
+				if is_repeat(loop.status, loop.get_signature()):
+					continue
+
+				self._add_to_catalog(loop)
+				yield loop
+
+			if self._catalog is not None:
+				self._catalog.commit()
+			return
+
+		## Compile the CSR arrays once here rather than once per worker
+		self._sg.csr
+
+		_fork_state = (self._sg, self._s)
+
+		try:
+			with mp.get_context("fork").Pool(workers) as pool:
+				for (
+					loop_num, seed, reason, signature, edge_ids
+				) in pool.imap_unordered(_build_in_worker, jobs):
+					status = (
+						SearchStatus.FOUND if reason == StopReason.FOUND
+						else None
+					)
+
+					if is_repeat(status, signature):
+						continue
+
+					loop = Loop.from_edge_ids(
+						loop_num, seed, self._sg, self._s, edge_ids,
+						stop_reason = reason
+					)
+
+					self._add_to_catalog(loop)
+					yield loop
+		finally:
+			_fork_state = None
+
+		if self._catalog is not None:
+			self._catalog.commit()
+
+	def write_loops_jsonl(
+		self,
+		out: TextIO,
+		n: int,
+		seeds: Optional[Sequence[int]] = None,
+		workers: int = 1,
+		include_text: bool = False,
+		distinct: bool = False,
+		max_expansions: Optional[int] = None,
+		time_limit: Optional[BaseDuration] = None
+	) -> int:
+		"""
+		Write `generate_loops()` to `out` as JSON Lines, one `LoopJSON` per 
+		line in the order the loops finish. Returns the number of loops 
+		found.
+		"""
+		n_found = 0
+
+		for loop in self.generate_loops(
+			n, seeds, workers, distinct, max_expansions, time_limit
+		):
+			out.write(json.dumps(loop.to_json_dict(include_text)))
+			out.write('\n')
+
+			if loop.status == SearchStatus.FOUND:
+				n_found += 1
+
+		return n_found
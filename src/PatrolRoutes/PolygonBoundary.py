@@ -4,7 +4,7 @@ drawing more precise neighborhood map boundaries.
 
 Uses following sources for intersection/contains algorithms
 - https://www.eecs.umich.edu/courses/eecs380/HANDOUTS/PROJ2/InsidePoly.html
-- https://stackoverflow.com/questions/4449110/python-solve-equation-for-one-variable
+- https://wrfranklin.org/Research/Short_Notes/pnpoly.html
 """
 
 
@@ -12,8 +12,9 @@ from abc import ABC, abstractmethod
 from enum import Enum
 from pathlib import Path
 import numpy as np
-from sympy import Symbol, Eq, solve
-from typing import Generic, Iterator, List, Literal, Optional, overload, Tuple, TypeVar
+from typing import (
+	Generic, Iterator, List, Literal, Optional, overload, Sequence, Tuple, TypeVar
+)
 from typing_extensions import Self
 
 
@@ -181,6 +182,15 @@ class Polygon:
 			p.lon for p in self._pts
 		])
 	
+	def to_array(self) -> np.ndarray:
+		"""
+		(n_points, 2) array of (lat, lon) vertices.
+		"""
+		return np.asarray(
+			[(p.lat, p.lon) for p in self._pts],
+			dtype = np.float64
+		).reshape(-1, 2)
+
 	def iter_lines(self) -> "Iterator[LineSegment]":
 		"""
 		"""
@@ -653,26 +663,27 @@ class _LineSegment(LineSegment):
 		m1*x + b1 = m2*x + b2
 
 		(m1 - m2)*x + (b1-b2) = 0
+		x = (b2 - b1) / (m1 - m2)
 		"""
 		if isinstance(other, _HorizontalLineSegment|_VerticalLineSegment):
 			return other.intersects(self)
 		
 		assert isinstance(other, _LineSegment) #for type hinting mostly
 
-		x = Symbol('x')
 		m1 = self.slope
 		b1 = self.intercept
 
 		m2 = other.slope
 		b2 = other.intercept
 
-		try:
-			candidate_lon: float = solve((x*(m1-m2)) + (b1-b2), x)[0] #type: ignore
-		except IndexError:
+		## Parallel lines, no single intersection
+		if m1 == m2:
 			return False
 
+		candidate_lon = (b2 - b1) / (m1 - m2)
+
 		on_self = self.interp_lat(candidate_lon)
-		on_other = self.interp_lat(candidate_lon)
+		on_other = other.interp_lat(candidate_lon)
 
 		return not ((on_self is None) or (on_other is None))
 
@@ -680,6 +691,14 @@ class _LineSegment(LineSegment):
 class PolygonBoundary:
 	_p: Polygon
 
+	## Polygon edges as arrays, edge i runs from vertex i to vertex i+1
+	_lat1: np.ndarray
+	_lon1: np.ndarray
+	_lat2: np.ndarray
+	_lon2: np.ndarray
+
+	_bbox: Tuple[float, float, float, float] ## min lat, max lat, min lon, max lon
+
 	def __init__(
 		self,
 		boundary_file_path: Path
@@ -688,6 +707,21 @@ class PolygonBoundary:
 		"""
 		self._p = Polygon(boundary_file_path)
 
+		vertices = self._p.to_array()
+
+		self._lat1 = vertices[:, 0]
+		self._lon1 = vertices[:, 1]
+		self._lat2 = np.roll(self._lat1, -1)
+		self._lon2 = np.roll(self._lon1, -1)
+
+		if len(vertices) > 0:
+			self._bbox = (
+				float(self._lat1.min()), float(self._lat1.max()),
+				float(self._lon1.min()), float(self._lon1.max())
+			)
+		else:
+			self._bbox = (np.inf, -np.inf, np.inf, -np.inf)
+
 	def __eq__(
 		self,
 		other: object
@@ -733,12 +767,58 @@ class PolygonBoundary:
 		"""
 		https://www.eecs.umich.edu/courses/eecs380/HANDOUTS/PROJ2/InsidePoly.html
 		"""
-		n_intersects = 0
+		return bool(self.contains_many([other])[0])
+
+	def contains_many(
+		self,
+		points: "np.ndarray|Sequence[Point]"
+	) -> np.ndarray:
+		"""
+		Boolean mask of which points are inside the boundary. `points` is 
+		either a sequence of `Point` or an (n, 2) array of (lat, lon).
+
+		Crossing number test: cast a ray east from each point and count the
+		polygon edges it crosses, odd means inside. An edge counts when the
+		point's latitude is in [lower end, upper end) of the edge, so a ray
+		through a vertex counts it once and horizontal edges never count.
+		Points outside the bounding box are rejected before any edge math.
+		"""
+		if isinstance(points, np.ndarray):
+			coords = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+		else:
+			coords = np.asarray(
+				[(p.lat, p.lon) for p in points],
+				dtype = np.float64
+			).reshape(-1, 2)
+
+		inside = np.zeros(len(coords), dtype = bool)
+
+		min_lat, max_lat, min_lon, max_lon = self._bbox
+
+		in_bbox = np.flatnonzero(
+			(coords[:, 0] >= min_lat) & (coords[:, 0] <= max_lat)
+			& (coords[:, 1] >= min_lon) & (coords[:, 1] <= max_lon)
+		)
+
+		lat = coords[in_bbox, 0]
+		lon = coords[in_bbox, 1]
+
+		odd = np.zeros(len(in_bbox), dtype = bool)
+
+		## Loop over edges (few) and vectorize over points (many)
+		for lat1, lon1, lat2, lon2 in zip(
+			self._lat1, self._lon1, self._lat2, self._lon2
+		):
+			straddles = (lat1 > lat) != (lat2 > lat)
+
+			if not straddles.any():
+				continue
+
+			with np.errstate(divide = "ignore", invalid = "ignore"):
+				cross_lon = lon1 + (lat - lat1)*(lon2 - lon1)/(lat2 - lat1)
 
-		ray = self._get_horizontal_ray(other)
+			odd ^= straddles & (lon <= cross_lon)
 
-		for line in self._p.iter_lines():
-			if ray.intersects(line):
-				n_intersects += 1
+		inside[in_bbox] = odd
 
-		return (n_intersects > 0) and (n_intersects % 2 == 1)
\ No newline at end of file
+		return inside
\ No newline at end of file
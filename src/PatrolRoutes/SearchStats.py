@@ -0,0 +1,170 @@
+"""
+Counters and timings of a `Loop` search, for finding out why a search is
+slow. Only collected when turned on with `Loop.instrument()`.
+"""
+
+
+from enum import Enum
+import time
+from typing import Dict, TypedDict
+
+
+from .SegmentGraph import CSRGraph
+
+
+class DeadEnd(Enum):
+	"""
+	Why a partial loop couldn't be extended.
+	"""
+	MAX_DURATION = 1 ## longer than `Settings.loop_max_duration`
+	SHORT_TRIP = 2 ## trip shorter than `Settings.trip_min_duration`
+	SAME_ROUTE = 3 ## two trips in a row on the same route
+	CANNOT_RETURN = 4 ## pruned, see `CSRGraph.earliest_return()`
+	NO_OPTIONS = 5 ## no outgoing edges
+
+
+class SearchPhase(Enum):
+	START = 1 ## drawing start edges and their return bounds
+	CHECK = 2 ## checking new nodes against the constraints
+	EXPAND = 3 ## shuffling the outgoing edges of new nodes
+
+
+class SearchStatsJSON(TypedDict):
+	"""
+	Dead ends by station are keyed by `Stop.standard_stop_name`.
+	"""
+	n_expansions: int
+	n_backtracks: int
+	n_starts: int
+	max_depth: int
+	search_seconds: float
+	phase_seconds: Dict[str, float] ## `SearchPhase` name: seconds
+	dead_ends: Dict[str, int] ## `DeadEnd` name: count
+	dead_ends_by_station: Dict[str, int]
+
+
+class SearchStats:
+	"""
+	Updated in place by the `Loop` it belongs to. `search_seconds` is the
+	wall-clock time spent in `Loop.resume()`, phase times are the parts of
+	it spent on each `SearchPhase`.
+	"""
+	_g: CSRGraph
+
+	_n_expansions: int
+	_n_backtracks: int
+	_n_starts: int
+	_max_depth: int
+	_search_sec: float
+	_phase_sec: Dict[SearchPhase, float]
+	_dead_ends: Dict[DeadEnd, int]
+	_dead_end_stations: Dict[int, int] ## station index: count
+
+	def __init__(
+		self,
+		g: CSRGraph
+	) -> None:
+		"""
+		"""
+		self._g = g
+		self.reset()
+
+	def reset(self) -> None:
+		"""
+		"""
+		self._n_expansions = 0
+		self._n_backtracks = 0
+		self._n_starts = 0
+		self._max_depth = 0
+		self._search_sec = 0.0
+		self._phase_sec = {phase: 0.0 for phase in SearchPhase}
+		self._dead_ends = {dead_end: 0 for dead_end in DeadEnd}
+		self._dead_end_stations = {}
+
+	@property
+	def n_expansions(self) -> int: return self._n_expansions
+	@property
+	def n_backtracks(self) -> int: return self._n_backtracks
+	@property
+	def n_starts(self) -> int: return self._n_starts
+	@property
+	def max_depth(self) -> int: return self._max_depth
+	@property
+	def search_seconds(self) -> float: return self._search_sec
+
+	@property
+	def phase_seconds(self) -> Dict[SearchPhase, float]:
+		return dict(self._phase_sec)
+
+	@property
+	def dead_ends(self) -> Dict[DeadEnd, int]:
+		return dict(self._dead_ends)
+
+	@property
+	def dead_ends_by_station(self) -> Dict[str, int]:
+		"""
+		Dead ends by the station the partial loop ended at, most first.
+		"""
+		return {
+			self._g.station_name(station): count
+			for station, count in sorted(
+				self._dead_end_stations.items(),
+				key = lambda item: (-item[1], item[0])
+			)
+		}
+
+	def add_time(
+		self,
+		phase: SearchPhase,
+		since: float
+	) -> float:
+		"""
+		Add the time since `since` (a `time.perf_counter()` reading) to
+		`phase`. Returns the current reading, to time the next phase from.
+		"""
+		now = time.perf_counter()
+		self._phase_sec[phase] += now - since
+		return now
+
+	def add_dead_end(
+		self,
+		dead_end: DeadEnd,
+		station: int
+	) -> None:
+		"""
+		"""
+		self._dead_ends[dead_end] += 1
+		self._dead_end_stations[station] = (
+			self._dead_end_stations.get(station, 0) + 1
+		)
+
+	def to_json_dict(self) -> SearchStatsJSON:
+		"""
+		"""
+		return {
+			"n_expansions": self._n_expansions,
+			"n_backtracks": self._n_backtracks,
+			"n_starts": self._n_starts,
+			"max_depth": self._max_depth,
+			"search_seconds": self._search_sec,
+			"phase_seconds": {
+				phase.name: sec for phase, sec in self._phase_sec.items()
+			},
+			"dead_ends": {
+				dead_end.name: count
+				for dead_end, count in self._dead_ends.items()
+			},
+			"dead_ends_by_station": self.dead_ends_by_station
+		}
+
+	def __str__(self) -> str:
+		dead_ends = ", ".join([
+			f"{dead_end.name.lower()} {count}"
+			for dead_end, count in self._dead_ends.items()
+		])
+
+		return (
+			f"{self._n_expansions} expansions, {self._n_backtracks} backtracks,"
+			f" {self._n_starts} starts, max depth {self._max_depth},"
+			f" {self._search_sec:.3f}s. Dead ends: {dead_ends}."
+		)
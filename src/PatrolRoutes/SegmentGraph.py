@@ -7,14 +7,18 @@ differing routes that are less than some configurable distances apart.
 
 
 from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from enum import Enum
+from enum import Enum, IntEnum
+import heapq
 import networkx as nx
 import numpy as np
 from pathlib import Path
 import pickle
-from typing import List, Dict, Generic, Optional, overload, Type, TypeVar
+from typing import (
+	cast, List, Dict, Generic, Optional, overload, Tuple, Type, TypeVar
+)
 import warnings
 
 
@@ -26,7 +30,10 @@ from .Stops import Stop
 from .Trips import Trip
 from .Settings import Settings
 from .StopTimes import StopTimes, StopTime
-from .Utils import Point, append_to_dict_of_lists, insert_in_dict_of_dicts
+from .Utils import (
+	DEGREE_LENGTH_MILES, Point, append_to_dict_of_lists, fast_distance_miles,
+	insert_in_dict_of_dicts
+)
 
 
 @dataclass
@@ -90,51 +97,85 @@ class WalkingTransfers:
 		max_dist: float
 	) -> None:
 		"""
+		Only pairs of stops within `max_dist` miles of each other are 
+		stored. Stops are bucketed into a lat/lon grid whose cells are at 
+		least `max_dist` wide, so each stop is only compared against stops 
+		in its own and the 8 surrounding cells.
 		"""
 		self._wt_d = {}
 		self._boundary = boundary
 		self._max_dist = max_dist
 
-		n_walking_transfers = 0
-		n_waiting_tranfsers = 0
-		nz_dists = []
-
 		n_stops = len(stops)
 		print(f"Checking walking transfers for {n_stops} stops...")
 
-		for i, stop1 in enumerate(stops):
-			if i % 100 == 0:
-				print(f"Have checked {((float(i)/n_stops)*100):.2f}% of stops...")
+		## Waiting transfers
+		for stop in stops:
+			insert_in_dict_of_dicts(
+				self._wt_d,
+				stop.stop_id,
+				stop.stop_id,
+				0.0
+			)
 
-			for stop2 in stops:
+		if (n_stops < 2) or (max_dist <= 0):
+			return
 
-				if stop1 is stop2:
-					insert_in_dict_of_dicts(
-						self._wt_d,
-						stop1.stop_id,
-						stop2.stop_id,
-						0.0,
-						mirror = True
-					)
-					n_waiting_tranfsers += 1
+		stop_ids = np.asarray([stop.stop_id for stop in stops])
+		lats = np.asarray([stop.stop_point.lat for stop in stops])
+		lons = np.asarray([stop.stop_point.lon for stop in stops])
 
-				try:
-					self._wt_d[stop2.stop_id][stop1.stop_id]
+		## Longitude degrees shrink away from the equator, size the cells for
+		## the stop furthest from it so no pair within max_dist is missed.
+		lat_cell = max_dist / DEGREE_LENGTH_MILES
+		lon_cell = lat_cell / np.cos(np.radians(np.abs(lats).max()))
+
+		cell_rows = np.floor(lats / lat_cell).astype(np.int64)
+		cell_cols = np.floor(lons / lon_cell).astype(np.int64)
+
+		cells: Dict[Tuple[int, int], List[int]] = {}
+		for i in range(n_stops):
+			append_to_dict_of_lists(
+				cells,
+				(int(cell_rows[i]), int(cell_cols[i])),
+				i
+			)
+
+		n_walking_transfers = 0
+
+		for (row, col), members in cells.items():
+			candidates = np.asarray([
+				j
+				for d_row in (-1, 0, 1)
+				for d_col in (-1, 0, 1)
+				for j in cells.get((row + d_row, col + d_col), [])
+			])
+
+			for i in members:
+				## Each pair is measured once, from the stop listed first
+				others = candidates[candidates > i]
+
+				if len(others) == 0:
 					continue
-				except KeyError:
-					dist = stop1.stop_point.distance_to(stop2.stop_point)
 
-					nz_dists.append(dist)
+				dists = fast_distance_miles(
+					lats[i], lons[i], lats[others], lons[others]
+				)
 
+				for j, dist in zip(others[dists <= max_dist], dists[dists <= max_dist]):
 					insert_in_dict_of_dicts(
 						self._wt_d,
-						stop1.stop_id,
-						stop2.stop_id,
-						dist,
+						int(stop_ids[i]),
+						int(stop_ids[j]),
+						float(dist),
 						mirror = True
 					)
-
 					n_walking_transfers += 1
+
+		print(
+			f"Found {n_walking_transfers} walking transfers within "
+			f"{max_dist} miles."
+		)
 	
 	@classmethod
 	def load(
@@ -164,12 +205,27 @@ class WalkingTransfers:
 		with open(str(Path(path)), 'wb') as f:
 			pickle.dump(self, f)
 	
+	def get_nearby_stops(
+		self,
+		stop_id: int
+	) -> Dict[int, float]:
+		"""
+		{stop_id: distance} of every stop within walking distance of 
+		`stop_id`, including itself.
+		"""
+		try:
+			return self._wt_d[stop_id]
+		except KeyError:
+			return {}
+
 	def get_transfer(
 		self,
 		stop1: Stop,
 		stop2: Stop
 	) -> Optional[float]:
 		"""
+		Walking distance in miles, `None` if the stops are more than 
+		`max_dist` apart or weren't included.
 		"""
 		try:
 			return self._wt_d[stop1.stop_id][stop2.stop_id]
@@ -202,6 +258,16 @@ class StopTimeNode:
 	def __str__(self) -> str:
 		return self._stoptime.name
 
+	def __getstate__(self) -> Dict:
+		"""
+		Edges aren't pickled, following them node to node recurses once per
+		edge. `SegmentGraph` rebuilds them from its `CSRGraph` on load.
+		"""
+		state = dict(self.__dict__)
+		state["_prv_edges"] = {}
+		state["_nxt_edges"] = {}
+		return state
+
 	def get_random_next_edge(
 		self,
 		rng: np.random.Generator
@@ -432,6 +498,706 @@ class STJoinType(Enum):
 	TRANFSER = 2
 
 
+class EdgeKind(IntEnum):
+	"""
+	Edge types as returned by `CSRGraph.edge_kind()`.
+	"""
+	TRIP = 0
+	WAITING = 1 ## transfer at the same stop
+	WALKING = 2 ## transfer between different stops
+
+
+class TripEdgeRanges:
+	"""
+	A set of trip edge IDs stored as contiguous ranges, one per boarding
+	ride position (see `CSRGraph`), so start edges can be counted and drawn
+	from without listing them. Edge `k` of the set is found by binary search
+	over the ranges.
+	"""
+	__slots__ = ("_starts", "_offsets")
+
+	_starts: np.ndarray ## first edge ID of each range
+	_offsets: np.ndarray ## edges before each range, and the total at the end
+
+	def __init__(
+		self,
+		starts: np.ndarray,
+		lengths: np.ndarray
+	) -> None:
+		"""
+		"""
+		self._starts = starts
+		self._offsets = np.zeros(len(lengths) + 1, dtype = np.int64)
+		np.cumsum(lengths, out = self._offsets[1:])
+
+	def __len__(self) -> int:
+		return int(self._offsets[-1])
+
+	def edge_id(
+		self,
+		k: int
+	) -> int:
+		"""
+		The `k`-th edge ID, in the order of the ranges.
+		"""
+		i = int(np.searchsorted(self._offsets, k, side = "right")) - 1
+		return int(self._starts[i]) + k - int(self._offsets[i])
+
+	def to_array(self) -> np.ndarray:
+		"""
+		"""
+		lengths = np.diff(self._offsets)
+
+		return (
+			np.repeat(self._starts - self._offsets[:-1], lengths)
+			+ np.arange(len(self), dtype = np.int64)
+		)
+
+
+class CSRGraph:
+	"""
+	Integer-indexed, array-backed form of a built `SegmentGraph`. Node IDs
+	follow the order stoptime nodes were added to the `SegmentGraph`.
+
+	Riding a trip is implicit: each trip keeps the ordered list of its nodes
+	(a "ride"), and the trip edge from the i-th to the j-th node of a ride 
+	is a pair index computed on demand. Trip edge IDs are 
+	[0, n_trip_edges), ordered by ride, then boarding node, then alighting
+	node. Transfer edges are stored explicitly as columns and follow with
+	IDs [n_trip_edges, n_edges). Storage is linear in stoptimes and 
+	transfers, while edge IDs and the order of each node's outgoing edges 
+	are the same as when every `TripEdge` is materialized.
+
+	Transfer adjacency is stored CSR style: the outgoing transfers of node
+	`n` are `_xfer_out[_xfer_out_offsets[n]:_xfer_out_offsets[n+1]]`, 
+	incoming likewise.
+
+	Traversal only touches these arrays. `node()` and `edge()` give back 
+	the `StopTimeNode`/`Edge` objects for display.
+	"""
+	_nodes: List[StopTimeNode]
+
+	_node_trip: np.ndarray ## index into _trip_ids
+	_node_arr: np.ndarray ## seconds since midnight
+	_node_dep: np.ndarray ## seconds since midnight
+	_node_seq: np.ndarray
+	_node_route: np.ndarray ## index into _route_ids
+	_node_station: np.ndarray ## index into _station_names
+	_node_ride_pos: np.ndarray ## index into _ride_nodes, -1 if not on a ride
+
+	## Rides: nodes of ride r are _ride_nodes[_ride_offsets[r]:_ride_offsets[r+1]]
+	_ride_nodes: np.ndarray
+	_ride_offsets: np.ndarray
+	_ride_start: np.ndarray ## per ride position, start of its ride
+	_ride_end: np.ndarray ## per ride position, end of its ride
+	_pair_starts: np.ndarray ## per ride position, first trip edge boarding there
+
+	## Transfers, indexed by edge ID - n_trip_edges
+	_xfer_src: np.ndarray
+	_xfer_dst: np.ndarray
+	_xfer_kind: np.ndarray ## EdgeKind values
+	_xfer_dur: np.ndarray ## seconds
+	_xfer_dist: np.ndarray ## miles
+
+	_xfer_out_offsets: np.ndarray
+	_xfer_out: np.ndarray
+	_xfer_in_offsets: np.ndarray
+	_xfer_in: np.ndarray
+
+	_trip_ids: np.ndarray
+	_trip_route: np.ndarray ## index into _route_ids
+	_route_ids: List[str]
+	_station_names: List[str] ## `Stop.standard_stop_name`
+
+	_return_bounds: Dict[int, np.ndarray] ## origin station: earliest_return()
+
+	## Start index, built on first use by `trip_edges_from()`. Ride
+	## positions with at least one trip edge boarding there, sorted by 
+	## station then departure, and sorted by departure alone.
+	_all_trip_edges: Optional["TripEdgeRanges"]
+	_board_pos_by_station: Optional[np.ndarray]
+	_board_dep_by_station: Optional[np.ndarray]
+	_board_station_offsets: Optional[np.ndarray] ## CSR offsets per station
+	_board_pos_by_dep: Optional[np.ndarray]
+	_board_dep: Optional[np.ndarray]
+
+	def __init__(
+		self,
+		stoptime_nodes: List[StopTimeNode],
+		rides: List[List[StopTimeNode]],
+		transfer_edges: List[TransferEdge]
+	) -> None:
+		"""
+		`rides` are the nodes of each trip that can be boarded or alighted,
+		in stop order, with trips in the order their edges should be 
+		numbered.
+		"""
+		self._nodes = stoptime_nodes
+
+		n_nodes = len(stoptime_nodes)
+
+		node_index = {id(node): i for i, node in enumerate(stoptime_nodes)}
+
+		trip_index: Dict[int, int] = {}
+		route_index: Dict[str, int] = {}
+		trip_route: List[int] = []
+
+		## Stops with the same standard name are one station
+		station_index: Dict[str, int] = {}
+		stop_station: Dict[int, int] = {}
+
+		self._node_trip = np.empty(n_nodes, dtype = np.int32)
+		self._node_arr = np.empty(n_nodes, dtype = np.int32)
+		self._node_dep = np.empty(n_nodes, dtype = np.int32)
+		self._node_seq = np.empty(n_nodes, dtype = np.int32)
+		self._node_station = np.empty(n_nodes, dtype = np.int32)
+
+		for i, node in enumerate(stoptime_nodes):
+			trip = node.trip
+
+			if trip.trip_id not in trip_index:
+				trip_index[trip.trip_id] = len(trip_index)
+
+				if trip.route_id not in route_index:
+					route_index[trip.route_id] = len(route_index)
+
+				trip_route.append(route_index[trip.route_id])
+
+			self._node_trip[i] = trip_index[trip.trip_id]
+			self._node_arr[i] = int(node.arrival_time)
+			self._node_dep[i] = int(node.departure_time)
+			self._node_seq[i] = node.stop_sequence
+
+			stop = node.stop
+
+			if stop.stop_id not in stop_station:
+				station_name = stop.standard_stop_name
+
+				if station_name not in station_index:
+					station_index[station_name] = len(station_index)
+
+				stop_station[stop.stop_id] = station_index[station_name]
+
+			self._node_station[i] = stop_station[stop.stop_id]
+
+		self._trip_ids = np.asarray(list(trip_index.keys()), dtype = np.int64)
+		self._trip_route = np.asarray(trip_route, dtype = np.int32)
+		self._route_ids = list(route_index.keys())
+		self._station_names = list(station_index.keys())
+
+		self._node_route = self._trip_route[self._node_trip]
+
+		## Rides
+		ride_lens = np.asarray([len(ride) for ride in rides], dtype = np.int64)
+
+		self._ride_offsets = np.zeros(len(rides) + 1, dtype = np.int64)
+		np.cumsum(ride_lens, out = self._ride_offsets[1:])
+
+		self._ride_nodes = np.asarray(
+			[node_index[id(node)] for ride in rides for node in ride],
+			dtype = np.int32
+		)
+
+		self._ride_start = np.repeat(self._ride_offsets[:-1], ride_lens)
+		self._ride_end = np.repeat(self._ride_offsets[1:], ride_lens)
+
+		n_succ = self._ride_end - np.arange(len(self._ride_nodes)) - 1
+
+		self._pair_starts = np.zeros(len(self._ride_nodes) + 1, dtype = np.int64)
+		np.cumsum(n_succ, out = self._pair_starts[1:])
+
+		self._node_ride_pos = np.full(n_nodes, -1, dtype = np.int64)
+		self._node_ride_pos[self._ride_nodes] = np.arange(len(self._ride_nodes))
+
+		## Transfers
+		n_xfers = len(transfer_edges)
+
+		self._xfer_src = np.empty(n_xfers, dtype = np.int32)
+		self._xfer_dst = np.empty(n_xfers, dtype = np.int32)
+		self._xfer_kind = np.empty(n_xfers, dtype = np.int8)
+		self._xfer_dur = np.empty(n_xfers, dtype = np.int32)
+		self._xfer_dist = np.empty(n_xfers, dtype = np.float32)
+
+		for i, edge in enumerate(transfer_edges):
+			self._xfer_src[i] = node_index[id(edge.prv_node)]
+			self._xfer_dst[i] = node_index[id(edge.nxt_node)]
+			self._xfer_dur[i] = int(edge.duration)
+			self._xfer_dist[i] = edge.distance
+
+			if edge.prv_node.stop.stop_id == edge.nxt_node.stop.stop_id:
+				self._xfer_kind[i] = EdgeKind.WAITING
+			else:
+				self._xfer_kind[i] = EdgeKind.WALKING
+
+		self._xfer_out_offsets, self._xfer_out = self._group_edges(
+			self._xfer_src, n_nodes
+		)
+		self._xfer_in_offsets, self._xfer_in = self._group_edges(
+			self._xfer_dst, n_nodes
+		)
+
+		self._return_bounds = {}
+
+		self._all_trip_edges = None
+		self._board_pos_by_station = None
+		self._board_dep_by_station = None
+		self._board_station_offsets = None
+		self._board_pos_by_dep = None
+		self._board_dep = None
+
+	@classmethod
+	def _group_edges(
+		cls,
+		endpoint: np.ndarray,
+		n_nodes: int
+	) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		CSR offsets and edge indexes grouped by `endpoint`, keeping edge 
+		order within each group.
+		"""
+		offsets = np.zeros(n_nodes + 1, dtype = np.int64)
+		np.cumsum(
+			np.bincount(endpoint, minlength = n_nodes),
+			out = offsets[1:]
+		)
+
+		edge_ids = np.argsort(endpoint, kind = "stable").astype(np.int64)
+
+		return offsets, edge_ids
+
+	@property
+	def n_nodes(self) -> int: return len(self._nodes)
+	@property
+	def n_trip_edges(self) -> int: return int(self._pair_starts[-1])
+	@property
+	def n_edges(self) -> int: return self.n_trip_edges + len(self._xfer_src)
+
+	@property
+	def node_arrival(self) -> np.ndarray: return self._node_arr
+	@property
+	def node_departure(self) -> np.ndarray: return self._node_dep
+	@property
+	def node_trip(self) -> np.ndarray: return self._node_trip
+	@property
+	def node_route(self) -> np.ndarray: return self._node_route
+	@property
+	def node_station(self) -> np.ndarray: return self._node_station
+	@property
+	def n_stations(self) -> int: return len(self._station_names)
+
+	@property
+	def trip_edge_ids(self) -> np.ndarray:
+		"""
+		IDs of every trip edge, in the order of `SegmentGraph.trip_edges`.
+		"""
+		return np.arange(self.n_trip_edges, dtype = np.int64)
+
+	def _build_start_index(self) -> None:
+		"""
+		"""
+		board_pos = np.flatnonzero(np.diff(self._pair_starts) > 0)
+
+		self._all_trip_edges = TripEdgeRanges(
+			self._pair_starts[board_pos],
+			self._pair_starts[board_pos + 1] - self._pair_starts[board_pos]
+		)
+
+		board_nodes = self._ride_nodes[board_pos]
+
+		station = self._node_station[board_nodes]
+		dep = self._node_dep[board_nodes]
+
+		order = np.lexsort((board_pos, dep, station))
+		self._board_pos_by_station = board_pos[order]
+		self._board_dep_by_station = dep[order]
+
+		self._board_station_offsets = np.zeros(self.n_stations + 1, dtype = np.int64)
+		np.cumsum(
+			np.bincount(station, minlength = self.n_stations),
+			out = self._board_station_offsets[1:]
+		)
+
+		order = np.lexsort((board_pos, dep))
+		self._board_pos_by_dep = board_pos[order]
+		self._board_dep = dep[order]
+
+	def trip_edges_from(
+		self,
+		origin_station: Optional[int] = None,
+		start_after: Optional[int] = None,
+		start_before: Optional[int] = None
+	) -> TripEdgeRanges:
+		"""
+		Trip edges leaving `origin_station` (a station index) that depart
+		in [`start_after`, `start_before`] (seconds since midnight), in 
+		edge ID order. Any of them can be left out. Found by binary search
+		on an index of boarding positions, built on first use, so this is 
+		O(log n + matching boarding positions) and no edge list is built.
+		"""
+		if self._board_dep is None:
+			self._build_start_index()
+
+		if (origin_station is None) and (start_after is None) and (
+			start_before is None
+		):
+			assert self._all_trip_edges is not None
+			return self._all_trip_edges
+
+		if origin_station is None:
+			positions = self._board_pos_by_dep
+			deps = self._board_dep
+		else:
+			assert self._board_station_offsets is not None
+			lo = int(self._board_station_offsets[origin_station])
+			hi = int(self._board_station_offsets[origin_station + 1])
+
+			positions = self._board_pos_by_station[lo:hi]
+			deps = self._board_dep_by_station[lo:hi]
+
+		assert (positions is not None) and (deps is not None)
+
+		lo = 0
+		if start_after is not None:
+			lo = int(np.searchsorted(deps, start_after, side = "left"))
+
+		hi = len(deps)
+		if start_before is not None:
+			hi = int(np.searchsorted(deps, start_before, side = "right"))
+
+		positions = np.sort(positions[lo:hi])
+
+		return TripEdgeRanges(
+			self._pair_starts[positions],
+			self._pair_starts[positions + 1] - self._pair_starts[positions]
+		)
+
+	def trip_edge_sources(self) -> np.ndarray:
+		"""
+		From node ID of every trip edge, indexed by edge ID.
+		"""
+		return np.repeat(self._ride_nodes, np.diff(self._pair_starts))
+
+	def edge_endpoints(
+		self,
+		edge_id: int
+	) -> Tuple[int, int]:
+		"""
+		(from node ID, to node ID)
+		"""
+		n_trip = self.n_trip_edges
+
+		if edge_id >= n_trip:
+			i = edge_id - n_trip
+			return int(self._xfer_src[i]), int(self._xfer_dst[i])
+
+		pos = int(np.searchsorted(self._pair_starts, edge_id, side = "right")) - 1
+		nxt_pos = pos + 1 + edge_id - int(self._pair_starts[pos])
+
+		return int(self._ride_nodes[pos]), int(self._ride_nodes[nxt_pos])
+
+	def trip_edge_nodes(
+		self,
+		edge_id: int
+	) -> np.ndarray:
+		"""
+		Node IDs of a trip edge's ride from boarding to alighting, inclusive.
+		"""
+		pos = int(np.searchsorted(self._pair_starts, edge_id, side = "right")) - 1
+		nxt_pos = pos + 1 + edge_id - int(self._pair_starts[pos])
+
+		return self._ride_nodes[pos:nxt_pos+1]
+
+	def edge_kind(
+		self,
+		edge_id: int
+	) -> EdgeKind:
+		"""
+		"""
+		if edge_id < self.n_trip_edges:
+			return EdgeKind.TRIP
+		return EdgeKind(self._xfer_kind[edge_id - self.n_trip_edges])
+
+	def edge_duration(
+		self,
+		edge_id: int
+	) -> int:
+		"""
+		Seconds from arrival at the first node to departure from the second.
+		"""
+		src, dst = self.edge_endpoints(edge_id)
+		return int(self._node_dep[dst] - self._node_arr[src])
+
+	def edge_distance(
+		self,
+		edge_id: int
+	) -> float:
+		"""
+		Number of stops for trip edges, miles for transfers.
+		"""
+		if edge_id >= self.n_trip_edges:
+			return float(self._xfer_dist[edge_id - self.n_trip_edges])
+
+		src, dst = self.edge_endpoints(edge_id)
+		return float(self._node_seq[dst] - self._node_seq[src])
+
+	def edge_trip(
+		self,
+		edge_id: int
+	) -> int:
+		"""
+		Trip index of a trip edge, -1 for transfers.
+		"""
+		if edge_id >= self.n_trip_edges:
+			return -1
+
+		src, _ = self.edge_endpoints(edge_id)
+		return int(self._node_trip[src])
+
+	def out_edges(
+		self,
+		node_id: int
+	) -> np.ndarray:
+		"""
+		Trip edges to each later node of the ride, then transfers.
+		"""
+		xfers = self._xfer_out[
+			self._xfer_out_offsets[node_id]:self._xfer_out_offsets[node_id+1]
+		] + self.n_trip_edges
+
+		pos = self._node_ride_pos[node_id]
+
+		if pos < 0:
+			return xfers
+
+		trips = np.arange(
+			self._pair_starts[pos],
+			self._pair_starts[pos+1],
+			dtype = np.int64
+		)
+
+		return np.concatenate((trips, xfers))
+
+	def in_edges(
+		self,
+		node_id: int
+	) -> np.ndarray:
+		"""
+		Trip edges from each earlier node of the ride, then transfers.
+		"""
+		xfers = self._xfer_in[
+			self._xfer_in_offsets[node_id]:self._xfer_in_offsets[node_id+1]
+		] + self.n_trip_edges
+
+		pos = self._node_ride_pos[node_id]
+
+		if pos < 0:
+			return xfers
+
+		ride_start = int(self._ride_offsets[
+			np.searchsorted(self._ride_offsets, pos, side = "right") - 1
+		])
+
+		prv_pos = np.arange(ride_start, pos, dtype = np.int64)
+
+		trips = self._pair_starts[prv_pos] + (pos - prv_pos - 1)
+
+		return np.concatenate((trips, xfers))
+
+	UNREACHABLE: int = np.iinfo(np.int64).max
+
+	def earliest_return(
+		self,
+		origin_station: int
+	) -> np.ndarray:
+		"""
+		For every node, the earliest departure time (seconds since midnight)
+		of a node at `origin_station` that can be reached from it by one or
+		more edges, the last being a trip edge. `UNREACHABLE` if there is no
+		such node. Cached per origin station.
+
+		A loop currently ending at node `n` can't finish in less than 
+		`earliest_return(origin)[n] - node_arrival[n]` more seconds, as 
+		segment durations add up to at least the time between them.
+
+		Computed with a reverse Dijkstra-style search from the nodes at the
+		origin station: nodes are settled in increasing order of the return
+		time they pass to their predecessors. A settled node gives its 
+		value to every earlier node of its ride, and a per-ride pointer 
+		skips the earlier nodes that already have a smaller one, so each
+		ride is swept once.
+		"""
+		try:
+			return self._return_bounds[origin_station]
+		except KeyError:
+			pass
+
+		bound = np.full(self.n_nodes, self.UNREACHABLE, dtype = np.int64)
+
+		## What a node passes back to earlier nodes of its ride: its own 
+		## departure if a loop can end there, otherwise its bound. Transfer
+		## predecessors only get its bound, a loop can't end on a transfer.
+		ride_value = np.full(self.n_nodes, self.UNREACHABLE, dtype = np.int64)
+
+		ride_positions = np.arange(len(self._ride_nodes))
+
+		is_end = (
+			(self._node_station[self._ride_nodes] == origin_station)
+			& (ride_positions > self._ride_start)
+		)
+
+		end_nodes = self._ride_nodes[is_end]
+		ride_value[end_nodes] = self._node_dep[end_nodes]
+
+		## (value, node, passes to ride predecessors)
+		heap: List[Tuple[int, int, bool]] = [
+			(int(ride_value[node]), int(node), True)
+			for node in np.unique(end_nodes)
+		]
+		heapq.heapify(heap)
+
+		ride_settled = np.zeros(self.n_nodes, dtype = bool)
+		bound_settled = np.zeros(self.n_nodes, dtype = bool)
+
+		## Ride positions before covered[r] already have a value <= anything
+		## still in the heap
+		covered = self._ride_offsets[:-1].copy()
+		ride_of_pos = np.repeat(
+			np.arange(len(covered)),
+			np.diff(self._ride_offsets)
+		)
+
+		def relax(node: int, val: int) -> None:
+			if val < bound[node]:
+				bound[node] = val
+				heapq.heappush(heap, (val, node, False))
+
+				if val < ride_value[node]:
+					ride_value[node] = val
+					heapq.heappush(heap, (val, node, True))
+
+		while len(heap) > 0:
+			val, node, to_ride = heapq.heappop(heap)
+
+			if to_ride:
+				if ride_settled[node]:
+					continue
+				ride_settled[node] = True
+
+				pos = self._node_ride_pos[node]
+
+				if pos < 0:
+					continue
+
+				ride = ride_of_pos[pos]
+
+				for prv_pos in range(int(covered[ride]), int(pos)):
+					relax(int(self._ride_nodes[prv_pos]), val)
+
+				covered[ride] = max(covered[ride], pos)
+
+			else:
+				if bound_settled[node]:
+					continue
+				bound_settled[node] = True
+
+				for eid in self._xfer_in[
+					self._xfer_in_offsets[node]:self._xfer_in_offsets[node+1]
+				]:
+					relax(int(self._xfer_src[eid]), val)
+
+		self._return_bounds[origin_station] = bound
+
+		return bound
+
+	def get_shuffled_out_edges(
+		self,
+		node_id: int,
+		rng: np.random.Generator
+	) -> np.ndarray:
+		"""
+		Same permutation `StopTimeNode.get_shuffled_next_edges()` draws for
+		the same generator state.
+		"""
+		edge_ids = self.out_edges(node_id)
+
+		rng.shuffle(edge_ids)
+
+		return edge_ids
+
+	def edge_route(
+		self,
+		edge_id: int
+	) -> int:
+		"""
+		Route index of a trip edge (see `route_id()`), -1 for transfers.
+		"""
+		if edge_id >= self.n_trip_edges:
+			return -1
+
+		src, _ = self.edge_endpoints(edge_id)
+		return int(self._node_route[src])
+
+	def route_id(
+		self,
+		route_index: int
+	) -> str:
+		"""
+		"""
+		return self._route_ids[route_index]
+
+	def station_name(
+		self,
+		station_index: int
+	) -> str:
+		"""
+		"""
+		return self._station_names[station_index]
+
+	def station_index(
+		self,
+		station_name: str
+	) -> int:
+		"""
+		Inverse of `station_name()`. `station_name` has to be a 
+		`Stop.standard_stop_name`.
+		"""
+		try:
+			return self._station_names.index(station_name)
+		except ValueError:
+			raise KeyError(f"No station named '{station_name}'")
+
+	def node(
+		self,
+		node_id: int
+	) -> StopTimeNode:
+		"""
+		"""
+		return self._nodes[node_id]
+
+	def edge(
+		self,
+		edge_id: int
+	) -> Edge:
+		"""
+		Builds a new `Edge` object equivalent to the one a fully
+		materialized `SegmentGraph` would hold.
+		"""
+		src, dst = self.edge_endpoints(edge_id)
+
+		if edge_id < self.n_trip_edges:
+			return TripEdge(self._nodes[src], self._nodes[dst])
+
+		return TransferEdge(self._nodes[src], self._nodes[dst])
+
+	def edge_name(
+		self,
+		edge_id: int
+	) -> str:
+		"""
+		"""
+		return self.edge(edge_id).name
+
+
 class SegmentGraph:
 	"""
 	nodes are stoptime stops
@@ -448,12 +1214,16 @@ class SegmentGraph:
 	_wt_path: Optional[Path]
 	_boundary: Optional[PolygonBoundary]
 	_only_tp: bool
+	_implicit_trips: bool
 
 	_gtfs: GTFS
 	_wt: WalkingTransfers
 	
 	_stoptime_nodes: Dict[str, StopTimeNode]
 	_edges: Dict[str, Edge]
+	_rides: List[List[StopTimeNode]]
+	_csr: Optional[CSRGraph]
+	_compacted: bool
 
 	_s: Settings ## Save for any other reason needed like passing to other objs
 
@@ -478,11 +1248,15 @@ class SegmentGraph:
 			self._boundary = None
 
 		self._only_tp = settings.transfer_timepoint_only
+		self._implicit_trips = settings.implicit_trip_edges
 
 		self._s = settings
 
 		self._stoptime_nodes = {}
 		self._edges = {}
+		self._rides = []
+		self._csr = None
+		self._compacted = False
 
 	def _get_transfer(
 		self,
@@ -500,28 +1274,29 @@ class SegmentGraph:
 			self._gtfs.get_stop(to_stoptime.stop_id)
 		)
 		
-	def _get_time_grouped_stoptimes(
+	def _get_stop_grouped_stoptimes(
 		self,
 		use_stops: List[Stop]
-	) -> Dict[GTFSTime, List[StopTime]]:
+	) -> Dict[int, List[StopTime]]:
 		"""
-		Get lists of all stop_times with arrivals at each second
+		Get lists of all stop_times at each stop on the service date, sorted
+		by departure time.
 		"""
-		t_d = {}
+		st_d: Dict[int, List[StopTime]] = {}
 
 		for stop in use_stops:
-			#for stop_time in stop.stop_times:
 			try:
-				for stop_time in self._gtfs.get_stop_stoptimes_on_date(self._service_date, stop.stop_id):
-					append_to_dict_of_lists(
-						t_d,
-						stop_time.arrival_time,
-						stop_time
-					)
+				stop_stoptimes = self._gtfs.get_stop_stoptimes_on_date(
+					self._service_date,
+					stop.stop_id
+				)
 			except KeyError:
 				continue
 
-		return t_d
+			if len(stop_stoptimes) > 0:
+				st_d[stop.stop_id] = stop_stoptimes
+
+		return st_d
 	
 	def _stoptimes_compatible(
 		self,
@@ -546,17 +1321,41 @@ class SegmentGraph:
 		else:
 			return STJoinType.TRANFSER
 		
-	def _add_edge(
+	def _get_rides(
 		self,
-		stname1: str,
-		stname2: str,
+		trip_ids: List[int]
+	) -> List[List[StopTimeNode]]:
+		"""
+		For each trip, its nodes that can be boarded or alighted, in stop 
+		order. Stops outside the boundary are skipped, so a trip that 
+		leaves the boundary is like one that ends at its last stop inside.
+		"""
+		rides: List[List[StopTimeNode]] = []
+
+		for trip_id in trip_ids:
+			ride: List[StopTimeNode] = []
+
+			for st in self._gtfs.get_trip(trip_id).stop_times:
+				if self._only_tp and not st.is_timepoint:
+					continue
+
+				try:
+					ride.append(self._stoptime_nodes[st.name])
+				except KeyError:
+					continue
+
+			rides.append(ride)
+
+		return rides
+
+	def _connect_nodes(
+		self,
+		stnode1: StopTimeNode,
+		stnode2: StopTimeNode,
 		edge_type: STJoinType
 	) -> None:
 		"""
 		"""
-		stnode1 = self._stoptime_nodes[stname1]
-		stnode2 = self._stoptime_nodes[stname2]
-
 		if self._stoptimes_compatible(stnode1, stnode2) != edge_type:
 			return
 
@@ -574,6 +1373,55 @@ class SegmentGraph:
 		stnode1.add_nxt_edge(new_edge)
 		stnode2.add_prv_edge(new_edge)
 
+	def _add_transfer_edges(
+		self,
+		stop_nodes_d: Dict[int, List[StopTimeNode]]
+	) -> None:
+		"""
+		For every pair of stops within walking distance, join each arrival 
+		at the first stop with the departures at the second stop that fall
+		in [arrival + min transfer time, arrival + max transfer time]. The
+		window is found by bisecting the second stop's departure-sorted 
+		times, so only real candidates are visited.
+		"""
+		min_s = int(self._min_time)
+		max_s = int(self._max_time)
+
+		dep_times_d = {
+			stop_id: [int(node.departure_time) for node in nodes]
+			for stop_id, nodes in stop_nodes_d.items()
+		}
+
+		for i, (from_stop_id, from_nodes) in enumerate(stop_nodes_d.items()):
+			if i % 500 == 0:
+				print(f"Have checked transfers at {i} of {len(stop_nodes_d)} stops...")
+
+			nearby_stops = self._wt.get_nearby_stops(from_stop_id)
+
+			for to_stop_id, tdist in nearby_stops.items():
+				if tdist > self._max_dist:
+					continue
+
+				try:
+					to_nodes = stop_nodes_d[to_stop_id]
+				except KeyError:
+					continue
+
+				to_dep_times = dep_times_d[to_stop_id]
+
+				for from_node in from_nodes:
+					arr_time = int(from_node.arrival_time)
+
+					lo = bisect_left(to_dep_times, arr_time + min_s)
+					hi = bisect_right(to_dep_times, arr_time + max_s, lo = lo)
+
+					for to_node in to_nodes[lo:hi]:
+						self._connect_nodes(
+							from_node,
+							to_node,
+							STJoinType.TRANFSER
+						)
+
 	def build_graph(
 		self
 	) -> None:
@@ -586,15 +1434,25 @@ class SegmentGraph:
 		print("Building segment graph...")
 
 		if self._boundary is not None:
+			all_stops = list(self._gtfs.stops)
+			in_boundary = self._boundary.contains_many(
+				[stop.stop_point for stop in all_stops]
+			)
 			use_stops = [
-				stop for stop in self._gtfs.stops
-				if self._boundary.contains(stop.stop_point)
+				stop for stop, inside in zip(all_stops, in_boundary)
+				if inside
 			]
 		else:
 			use_stops = [
 				stop for stop in self._gtfs.stops
 			]
 
+		if self._s.filtered_load:
+			self._gtfs.restrict(
+				self._service_date,
+				[stop.stop_id for stop in use_stops]
+			)
+
 		## load or build walking transfers
 		if self._wt_path is not None:
 			with open(self._wt_path, 'rb') as f:
@@ -606,78 +1464,43 @@ class SegmentGraph:
 				self._max_dist
 			)
 
-		## Get all stop times sorted by departure time
-		st_all_d = self._get_time_grouped_stoptimes(use_stops)
-		times_ordered = sorted(list(st_all_d.keys()))
+		## Get all stop times at each stop, sorted by departure time
+		st_stop_d = self._get_stop_grouped_stoptimes(use_stops)
 
 		## Add nodes
-		for gt in st_all_d.keys():
-			for stoptime in st_all_d[gt]:
+		stop_nodes_d: Dict[int, List[StopTimeNode]] = {}
+
+		for stop_id, stoptimes in st_stop_d.items():
+			for stoptime in stoptimes:
 				try:
-					self._stoptime_nodes[stoptime.name]
+					stnode = self._stoptime_nodes[stoptime.name]
 				except KeyError:
-					self._stoptime_nodes[stoptime.name] = StopTimeNode(
-						self._gtfs,
-						stoptime
-					)
+					stnode = StopTimeNode(self._gtfs, stoptime)
+					self._stoptime_nodes[stoptime.name] = stnode
+
+				append_to_dict_of_lists(stop_nodes_d, stop_id, stnode)
 
 		## Connect same trip stoptimes with TripEdge
 		trip_ids = StopTimes.get_trip_id_set_from_stoptimes([
 			node.stoptime for node in self._stoptime_nodes.values()
 		])
 
-		for trip_id in trip_ids:
-			trip_st = self._gtfs.get_trip(trip_id).stop_times
-
-			for st1 in trip_st:
-				for st2 in trip_st:
-					#if st1.stop_sequence >= st2.stop_sequence:
-					#	continue
-					#if self._only_tp and not (st1.is_timepoint and st2.is_timepoint):
-					#	continue
-
-					try:
-						self._add_edge(st1.name, st2.name, STJoinType.TRIP)
-					except KeyError:
-						## Assuming this is for trips that extend outside boundary.
-						## We will ignore them, it will be like trip ends at 
-						## last valid stop before boundary.
-						continue
-
-		## Connect walking/waiting transfers with TransferEdge
+		self._rides = self._get_rides(trip_ids)
 
-		for _, arr_time_1 in enumerate(times_ordered):
+		## Riding from any stop to any later stop of a trip is an edge. 
+		## With implicit trip edges these only exist in the CSRGraph, 
+		## which computes them from the rides on demand.
+		if not self._implicit_trips:
+			for ride in self._rides:
+				for i, stnode1 in enumerate(ride):
+					for stnode2 in ride[i+1:]:
+						self._connect_nodes(stnode1, stnode2, STJoinType.TRIP)
 
-			if int(arr_time_1)%3600 == 0:
-				print(f"Checking arr_time_1 {arr_time_1.to_fstr()}")
-
-			for from_st in st_all_d[arr_time_1]:
-				offset = self._min_time
-
-				while offset <= self._max_time:
-					arr_time_2 = arr_time_1 + offset
-					
-					try:
-						st_all_d[arr_time_2]
-					except KeyError:
-						offset += Minutes(1)
-						continue
-
-					for to_st in st_all_d[arr_time_2]:
-						tdist = self._wt.get_transfer(
-							self._gtfs.get_stop(from_st.stop_id),
-							self._gtfs.get_stop(to_st.stop_id)
-						)
-
-						if (tdist is not None) and (tdist <= self._max_dist):
-							self._add_edge(
-								from_st.name,
-								to_st.name,
-								STJoinType.TRANFSER
-							)
-
-					offset += Minutes(1)
+		## Connect walking/waiting transfers with TransferEdge
+		self._add_transfer_edges(stop_nodes_d)
 
+		self._csr = None
+		self._compacted = False
 
 		#n_trip_edges = len([
 		#	edge for edge in self._edges.values()
@@ -693,13 +1516,119 @@ class SegmentGraph:
 
 
 	@property
-	def edges(self) -> Dict[str, Edge]: return self._edges
+	def csr(self) -> CSRGraph:
+		"""
+		Integer-indexed form of this graph, compiled on first use.
+		"""
+		if self._csr is None:
+			self._csr = CSRGraph(
+				list(self._stoptime_nodes.values()),
+				self._rides,
+				[
+					edge for edge in self._edges.values()
+					if isinstance(edge, TransferEdge)
+				]
+			)
+		return self._csr
+
+	def _materialize_edges(self) -> None:
+		"""
+		Rebuild the `Edge` objects and per-node edge dicts from the 
+		`CSRGraph`. Edge IDs are in the order `build_graph()` connected 
+		them, so every dict comes back in its original order.
+		"""
+		csr = self.csr
+
+		first = csr.n_trip_edges if self._implicit_trips else 0
+
+		for edge_id in range(first, csr.n_edges):
+			edge = csr.edge(edge_id)
+
+			self._edges[edge.name] = edge
+			edge.prv_node.add_nxt_edge(edge)
+			edge.nxt_node.add_prv_edge(edge)
+
+	def __getstate__(self) -> Dict:
+		"""
+		Pickled without its `Edge` objects, see `StopTimeNode.__getstate__()`.
+		The `CSRGraph` is compiled first so they can be rebuilt.
+		"""
+		_ = self.csr
+
+		state = dict(self.__dict__)
+		state["_edges"] = {}
+		return state
+
+	def __setstate__(
+		self,
+		state: Dict
+	) -> None:
+		"""
+		"""
+		self.__dict__.update(state)
+
+		## Graphs pickled before the CSR form existed
+		self.__dict__.setdefault("_csr", None)
+		self.__dict__.setdefault("_compacted", False)
+		self.__dict__.setdefault("_implicit_trips", False)
+
+		if "_rides" not in self.__dict__:
+			self._rides = self._get_rides(
+				StopTimes.get_trip_id_set_from_stoptimes([
+					node.stoptime for node in self._stoptime_nodes.values()
+				])
+			)
+
+		## Older pickles still have their edges
+		if (len(self._edges) == 0) and (not self._compacted):
+			self._materialize_edges()
+
+	def compact(self) -> None:
+		"""
+		Keep only the `CSRGraph` form of the edges and free the `Edge` 
+		objects and per-node edge dicts. `edges` and `trip_edges` still 
+		work afterwards but build new `Edge` objects on every call.
+		"""
+		_ = self.csr
+
+		self._edges = {}
+
+		for node in self._stoptime_nodes.values():
+			node._prv_edges = {}
+			node._nxt_edges = {}
+
+		self._compacted = True
 
 	@property
-	def edge_names(self) -> List[str]: return list(self._edges.keys())
+	def _edges_materialized(self) -> bool:
+		return not (self._compacted or self._implicit_trips)
+
+	@property
+	def implicit_trip_edges(self) -> bool: return self._implicit_trips
+
+	@property
+	def edges(self) -> Dict[str, Edge]:
+		if self._edges_materialized:
+			return self._edges
+
+		edges: Dict[str, Edge] = {}
+
+		for edge_id in range(self.csr.n_edges):
+			edge = self.csr.edge(edge_id)
+			edges[edge.name] = edge
+
+		return edges
+
+	@property
+	def edge_names(self) -> List[str]: return list(self.edges.keys())
 
 	@property 
 	def trip_edges(self) -> List[TripEdge]:
+		if not self._edges_materialized:
+			return [
+				cast(TripEdge, self.csr.edge(edge_id))
+				for edge_id in range(self.csr.n_trip_edges)
+			]
 		return [
 			edge for edge in self._edges.values()
 			if isinstance(edge, TripEdge)
@@ -722,4 +1651,6 @@ class SegmentGraph:
 		"""
 		"""
 		with open(path, 'rb') as f:
-			return pickle.load(f)
+			sg = pickle.load(f)
+
+		return sg
@@ -7,7 +7,7 @@ route exclusions, etc.
 from datetime import datetime
 import json
 from pathlib import Path
-from typing import cast, Dict, List, Optional, TypedDict
+from typing import cast, Dict, List, NotRequired, Optional, TypedDict
 
 
 from . import GTFS_STRF
@@ -19,6 +19,8 @@ class _SegmentGraphSettings(TypedDict):
 	min_transfer_time_minutes: float
 	max_transfer_distance_miles: float
 	transfer_timepoint_only: bool
+	implicit_trip_edges: NotRequired[bool]
+	filtered_load: NotRequired[bool]
 
 
 class _LoopSettings(TypedDict):
@@ -39,7 +41,7 @@ class SettingsJSON(TypedDict):
 	walking_transfers_path: Optional[str]
 	boundary_path: Optional[str]
 	segment_graph_path: Optional[str]
-	loops_path: None
+	loops_path: Optional[str]
 
 	service_date: str
 
@@ -138,6 +140,22 @@ class Settings:
 	def transfer_timepoint_only(self) -> bool:
 		return self._sd["segment_graph"]["transfer_timepoint_only"]
 	
+	@property
+	def implicit_trip_edges(self) -> bool:
+		"""
+		Don't build a `TripEdge` for every pair of stops on a trip, the 
+		`CSRGraph` computes them when traversed instead.
+		"""
+		return self._sd["segment_graph"].get("implicit_trip_edges", False)
+
+	@property
+	def filtered_load(self) -> bool:
+		"""
+		Only load the trips running on the service date and their stop 
+		times inside the boundary, see `GTFS.restrict()`.
+		"""
+		return self._sd["segment_graph"].get("filtered_load", False)
+	
 	## Loop options
 	
 	@property
@@ -185,7 +203,10 @@ class Settings:
 	
 	@property
 	def loops_path(self) -> Optional[Path]:
-		raise NotImplementedError
+		"""
+		SQLite `LoopCatalog` that generated loops are saved to.
+		"""
+		return self._get_optional_path(self._sd["loops_path"])
 	
 	@property
 	def service_date(self) -> datetime:
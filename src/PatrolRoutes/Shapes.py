@@ -12,10 +12,11 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import (
-	Any, cast, Dict, Generic, List, Optional, overload, 
+	Any, cast, Dict, Generic, IO, List, Optional, overload, 
 	TYPE_CHECKING, Type, TypedDict, TypeVar, TypeAlias
 )
 
+from .FeedCache import Columns
 from .Utils import Point
 from .POI import POI, POIs
 from .PolygonBoundary import LineSegment
@@ -569,22 +570,37 @@ class Shapes:
 	_shape_id_d: Dict[str, Shape]
 	_err_tol: float
 
+	_columns: List[str] = [
+		"shape_id",
+		"shape_pt_lat",
+		"shape_pt_lon",
+		"shape_pt_sequence",
+		"shape_dist_traveled"
+	]
+
 	def __init__(
 		self,
-		shapes_path: Path,
+		shapes: "Path|Columns",
 		shape_feature_max_error: float = 0.02
 	) -> None:
 		"""
+		`shapes` is either the path to shapes.txt or the columns returned by
+		`Shapes.read_columns()`.
 		"""
 		self._shape_id_d = {}
 		self._err_tol = shape_feature_max_error
 
+		if not isinstance(shapes, dict):
+			shapes = self.read_columns(shapes)
+
 		raw_rows_d: Dict[str, List[_ShapeRow]] = {}
 
-		shapes_df = pd.read_csv(shapes_path)
+		shape_ids = shapes["shape_id"]
 
-		for _, row in shapes_df.iterrows():
-			shapes_row = cast(_ShapeRow, row)
+		for i in np.lexsort((shapes["shape_pt_sequence"], shape_ids)):
+			shapes_row = cast(_ShapeRow, {
+				col: shapes[col][i] for col in self._columns
+			})
 			try:
 				raw_rows_d[shapes_row['shape_id']].append(shapes_row)
 			except KeyError:
@@ -597,6 +613,35 @@ class Shapes:
 				shape_feature_max_error = self._err_tol
 			)
 
+	@classmethod
+	def read_columns(
+		cls,
+		shapes_path: "Path|IO[bytes]"
+	) -> Columns:
+		"""
+		"""
+		shapes_df = pd.read_csv(
+			shapes_path,
+			usecols = lambda col: col in cls._columns,
+			dtype = {"shape_id": str}
+		)
+
+		cols: Columns = {
+			"shape_id": shapes_df["shape_id"].to_numpy(dtype = str),
+			"shape_pt_lat": shapes_df["shape_pt_lat"].to_numpy(dtype = np.float64),
+			"shape_pt_lon": shapes_df["shape_pt_lon"].to_numpy(dtype = np.float64),
+			"shape_pt_sequence": shapes_df["shape_pt_sequence"].to_numpy(dtype = np.int32)
+		}
+
+		if "shape_dist_traveled" in shapes_df.columns:
+			cols["shape_dist_traveled"] = (
+				shapes_df["shape_dist_traveled"].to_numpy(dtype = np.float64)
+			)
+		else:
+			cols["shape_dist_traveled"] = np.full(len(shapes_df), np.nan)
+
+		return cols
+
 	def __getitem__(
 		self,
 		shape_id: str
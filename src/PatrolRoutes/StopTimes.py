@@ -1,42 +1,79 @@
 """
 Manage stop_times. Query by trip_id and stop_id
+
+Stored column-wise: every stop_time is one row across a handful of numpy
+arrays sorted by (trip_id, departure_time, stop_sequence). Trip and stop
+lookups go through CSR-style offset arrays, and `StopTime` objects are
+only light views onto a row of that storage.
 """
 
-from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import cast, Dict, List, Optional, TypedDict
+from typing import Dict, IO, Iterable, List, Optional, Tuple
 import warnings
 
 
+from .FeedCache import Columns
+from .FeedSource import read_csv_filtered
 from .GTFSTime import GTFSTime
-from .Utils import append_to_dict_of_lists
 
 
-@dataclass
 class StopTime:
-	_trip_id: int
-	_arr_time: GTFSTime
-	_dep_time: Optional[GTFSTime]
-	_stop_id: int
-	_stop_seq: int
-	_timepoint: bool
+	"""
+	View of a single row in a `StopTimes` table. Nothing is copied out of
+	the table until a property is read.
+	"""
+	__slots__ = ("_st", "_row")
+
+	_st: "StopTimes"
+	_row: int
+
+	def __init__(
+		self,
+		stop_times: "StopTimes",
+		row: int
+	) -> None:
+		"""
+		"""
+		self._st = stop_times
+		self._row = row
+
+	def __repr__(self) -> str:
+		return (
+			f"StopTime(trip_id={self.trip_id}, stop_id={self.stop_id}, "
+			f"stop_sequence={self.stop_sequence}, "
+			f"arrival_time={self.arrival_time}, "
+			f"departure_time={self.departure_time})"
+		)
+
+	def __eq__(
+		self,
+		other: object
+	) -> bool:
+		if not isinstance(other, StopTime):
+			return False
+		return (self._st is other._st) and (self._row == other._row)
 
+	def __hash__(self) -> int:
+		return hash(self._row)
+
+	@property
+	def trip_id(self) -> int: return int(self._st._trip_id[self._row])
 	@property
-	def trip_id(self) -> int: return self._trip_id
+	def arrival_time(self) -> GTFSTime:
+		return GTFSTime(int(self._st._arr[self._row]))
 	@property
-	def arrival_time(self) -> GTFSTime: return self._arr_time
+	def departure_time(self) -> GTFSTime:
+		return GTFSTime(int(self._st._dep[self._row]))
 	@property
-	def departure_time(self) -> GTFSTime: 
-		if self._dep_time is None:
-			return self._arr_time
-		return self._dep_time
+	def stop_id(self) -> int: return int(self._st._stop_id[self._row])
 	@property
-	def stop_id(self) -> int: return self._stop_id
+	def stop_sequence(self) -> int: return int(self._st._stop_seq[self._row])
 	@property
-	def stop_sequence(self) -> int: return self._stop_seq
+	def is_timepoint(self) -> bool: return bool(self._st._tp[self._row])
 	@property
-	def is_timepoint(self) -> bool: return self._timepoint
+	def row(self) -> int: return self._row
 
 	#def get_nx_node_name(self) -> str:
 	#	return f"{self.trip_id}_{self.stop_id}"
@@ -46,92 +83,269 @@ class StopTime:
 
 
 class StopTimes:
-	## {stop_id: [stop_times]}
-	_stop_id_d: Dict[int, List[StopTime]]
+	## Row columns, sorted by (trip_id, departure_time, stop_sequence)
+	_trip_id: np.ndarray
+	_stop_id: np.ndarray
+	_stop_seq: np.ndarray
+	_arr: np.ndarray ## seconds since midnight
+	_dep: np.ndarray ## seconds since midnight, arrival if not given
+	_tp: np.ndarray
 
-	## {trip_id: [stop_times]}
-	_trip_id_d: Dict[int, List[StopTime]]
+	## Trip index: rows of _trip_ids[i] are _trip_offsets[i]:_trip_offsets[i+1]
+	_trip_ids: np.ndarray
+	_trip_offsets: np.ndarray
+	_row_trip: np.ndarray ## position in _trip_ids of each row
 
-	class _StopTimeRow(TypedDict):
-		"""
-		Types are as they will be parsed by pandas
-		"""
-		trip_id: int
-		arrival_time: str
-		departure_time: str
-		stop_id: int
-		stop_sequence: int
-		stop_headsign: str
-		pickup_type: int
-		drop_off_type: int
-		shape_dist_traveled: float
-		timepoint: int
+	## Stop index: rows of _stop_ids[i] are
+	## _stop_rows[_stop_offsets[i]:_stop_offsets[i+1]], sorted by departure
+	_stop_ids: np.ndarray
+	_stop_offsets: np.ndarray
+	_stop_rows: np.ndarray
+
+	_usecols: List[str] = [
+		"trip_id",
+		"arrival_time",
+		"departure_time",
+		"stop_id",
+		"stop_sequence",
+		"timepoint"
+	]
 
 	def __init__(
 		self,
-		stoptime_path: Path
+		stoptimes: "Path|Columns"
 	) -> None:
 		"""
+		`stoptimes` is either the path to stop_times.txt or the columns
+		returned by `StopTimes.read_columns()`, e.g. from a `FeedCache`.
+		"""
+		if not isinstance(stoptimes, dict):
+			stoptimes = self.read_columns(stoptimes)
+
+		self._trip_id = stoptimes["trip_id"]
+		self._stop_id = stoptimes["stop_id"]
+		self._stop_seq = stoptimes["stop_sequence"]
+		self._arr = stoptimes["arrival_time"]
+		self._dep = stoptimes["departure_time"]
+		self._tp = stoptimes["timepoint"]
+
+		self._trip_ids = stoptimes["trip_ids"]
+		self._trip_offsets = stoptimes["trip_offsets"]
+		self._row_trip = np.repeat(
+			np.arange(len(self._trip_ids), dtype = np.int32),
+			np.diff(self._trip_offsets)
+		)
+		self._stop_ids = stoptimes["stop_ids"]
+		self._stop_offsets = stoptimes["stop_offsets"]
+		self._stop_rows = stoptimes["stop_rows"]
+
+	@classmethod
+	def read_columns(
+		cls,
+		stoptime_path: "Path|IO[bytes]",
+		trip_ids: Optional[Iterable[int]] = None,
+		stop_ids: Optional[Iterable[int]] = None
+	) -> Columns:
+		"""
+		Parse stop_times.txt into sorted row columns plus the trip and stop
+		index arrays.
+
+		With `trip_ids` or `stop_ids`, only the stop times of those trips
+		at those stops are kept, filtered while reading.
 		"""
-		self._stop_id_d = {}
-		self._trip_id_d = {}
+		read_kwargs = dict(
+			usecols = lambda col: col in cls._usecols,
+			dtype = {"arrival_time": str, "departure_time": str}
+		)
 
 		with warnings.catch_warnings():
 			warnings.filterwarnings("ignore")
 
-			stoptimes_df = pd.read_csv(stoptime_path)
+			if (trip_ids is None) and (stop_ids is None):
+				stoptimes_df = pd.read_csv(stoptime_path, **read_kwargs)
+			else:
+				keep_trips = None if trip_ids is None else set(trip_ids)
+				keep_stops = None if stop_ids is None else set(stop_ids)
 
-		for _, row in stoptimes_df.iterrows():
-			stoptime_row = cast("StopTimes._StopTimeRow", row)
+				def keep(chunk: pd.DataFrame) -> pd.Series:
+					mask = pd.Series(True, index = chunk.index)
 
-			arr_time = GTFSTime(stoptime_row["arrival_time"])
-			dep_time = GTFSTime(stoptime_row["departure_time"])
+					if keep_trips is not None:
+						mask &= chunk["trip_id"].isin(keep_trips)
+					if keep_stops is not None:
+						mask &= chunk["stop_id"].isin(keep_stops)
 
-			if arr_time == dep_time:
-				dep_time = None
+					return mask
 
-			new_stoptime = StopTime(
-				stoptime_row["trip_id"],
-				arr_time,
-				dep_time,
-				stoptime_row["stop_id"],
-				stoptime_row["stop_sequence"],
-				bool(stoptime_row["timepoint"])
-			)
+				stoptimes_df = read_csv_filtered(
+					stoptime_path, keep, **read_kwargs
+				)
 
-			append_to_dict_of_lists(
-				self._stop_id_d,
-				new_stoptime.stop_id,
-				new_stoptime
-			)
+		trip_id = stoptimes_df["trip_id"].to_numpy(dtype = np.int64)
+		stop_id = stoptimes_df["stop_id"].to_numpy(dtype = np.int64)
+		stop_seq = stoptimes_df["stop_sequence"].to_numpy(dtype = np.int32)
 
-			append_to_dict_of_lists(
-				self._trip_id_d,
-				new_stoptime.trip_id,
-				new_stoptime
-			)
+		arr = cls._parse_time_column(stoptimes_df["arrival_time"])
+		dep = cls._parse_time_column(stoptimes_df["departure_time"])
 
-		for stop_id in self._stop_id_d.keys():
-			self._stop_id_d[stop_id] = sorted(
-				self._stop_id_d[stop_id],
-				key = lambda x: x.departure_time
-			)
+		## Missing times fall back to the other one, as a StopTime without
+		## a departure time departs when it arrives.
+		arr_missing = arr < 0
+		dep_missing = dep < 0
+		arr[arr_missing] = dep[arr_missing]
+		dep[dep_missing] = arr[dep_missing]
+
+		if "timepoint" in stoptimes_df.columns:
+			tp = stoptimes_df["timepoint"].fillna(1).to_numpy(dtype = bool)
+		else:
+			tp = np.ones(len(stoptimes_df), dtype = bool)
+
+		order = np.lexsort((stop_seq, dep, trip_id))
+
+		cols: Columns = {
+			"trip_id": trip_id[order],
+			"stop_id": stop_id[order],
+			"stop_sequence": stop_seq[order],
+			"arrival_time": arr[order],
+			"departure_time": dep[order],
+			"timepoint": tp[order]
+		}
+
+		cols.update(cls._build_indexes(cols))
+
+		return cols
+
+	@classmethod
+	def _build_indexes(
+		cls,
+		cols: Columns
+	) -> Columns:
+		"""
+		Build the trip and stop offset arrays from the sorted row columns.
+		"""
+		n_rows = len(cols["trip_id"])
+
+		trip_ids, trip_starts = cls._get_group_starts(cols["trip_id"])
+
+		## lexsort is stable, so departure ties keep trip order
+		stop_rows = np.lexsort(
+			(cols["departure_time"], cols["stop_id"])
+		).astype(np.int64)
+
+		stop_ids, stop_starts = cls._get_group_starts(
+			cols["stop_id"][stop_rows]
+		)
+
+		return {
+			"trip_ids": trip_ids,
+			"trip_offsets": np.append(trip_starts, n_rows).astype(np.int64),
+			"stop_ids": stop_ids,
+			"stop_offsets": np.append(stop_starts, n_rows).astype(np.int64),
+			"stop_rows": stop_rows
+		}
+
+	@classmethod
+	def _get_group_starts(
+		cls,
+		sorted_keys: np.ndarray
+	) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		Unique keys of a sorted array and the index where each one starts.
+		"""
+		if len(sorted_keys) == 0:
+			return sorted_keys.copy(), np.zeros(0, dtype = np.int64)
+
+		is_start = np.empty(len(sorted_keys), dtype = bool)
+		is_start[0] = True
+		np.not_equal(sorted_keys[1:], sorted_keys[:-1], out = is_start[1:])
+
+		starts = np.flatnonzero(is_start)
+
+		return sorted_keys[starts], starts
+
+	@classmethod
+	def _parse_time_column(
+		cls,
+		times: pd.Series
+	) -> np.ndarray:
+		"""
+		Bulk version of `GTFSTime._parse_fstr()`. Missing values are -1.
+		"""
+		if len(times) == 0:
+			return np.zeros(0, dtype = np.int32)
+
+		tokens = times.str.strip().str.split(':', expand = True)
 
-		for trip_id in self._trip_id_d.keys():
-			self._trip_id_d[trip_id] = sorted(
-				self._trip_id_d[trip_id],
-				key = lambda x: x.departure_time
+		if tokens.shape[1] not in (2, 3):
+			raise GTFSTime.InvalidGTFSTimeException(
+				str(times.dropna().iloc[0]) if times.notna().any() else "",
+				"Time strings must be 'HH:MM:SS' or 'HH:MM'."
 			)
-	
+
+		hms = tokens.apply(pd.to_numeric).to_numpy(dtype = np.float64)
+
+		seconds = hms[:, 0]*3600 + hms[:, 1]*60
+
+		if hms.shape[1] == 3:
+			seconds += np.nan_to_num(hms[:, 2])
+
+		return np.where(np.isnan(seconds), -1, seconds).astype(np.int32)
+
+	def _find(
+		self,
+		ids: np.ndarray,
+		key: int
+	) -> int:
+		"""
+		Position of `key` in a sorted id array, `KeyError` if it's missing.
+		"""
+		i = int(np.searchsorted(ids, key))
+
+		if (i == len(ids)) or (ids[i] != key):
+			raise KeyError(key)
+
+		return i
+
+	def __len__(self) -> int:
+		return len(self._trip_id)
+
+	def trip_mask(
+		self,
+		trip_ids: Iterable[int]
+	) -> np.ndarray:
+		"""
+		Boolean array over this table's trips, true for `trip_ids`. Trips
+		without stop_times are ignored. For `get_stop_stoptimes()`.
+		"""
+		ids = np.fromiter(trip_ids, dtype = np.int64)
+
+		pos = np.searchsorted(self._trip_ids, ids)
+		found = pos < len(self._trip_ids)
+		found[found] = self._trip_ids[pos[found]] == ids[found]
+
+		mask = np.zeros(len(self._trip_ids), dtype = bool)
+		mask[pos[found]] = True
+
+		return mask
+
 	def get_stop_stoptimes(
 		self,
-		stop_id: int
+		stop_id: int,
+		trip_mask: Optional[np.ndarray] = None
 	) -> List[StopTime]:
 		"""
-		Returns sorted stop_times from first to last stop.
+		Returns sorted stop_times from first to last stop. With `trip_mask`
+		(see `trip_mask()`), only those of the trips it's true for.
 		"""
-		return self._stop_id_d[stop_id]
-	
+		i = self._find(self._stop_ids, stop_id)
+
+		rows = self._stop_rows[self._stop_offsets[i]:self._stop_offsets[i+1]]
+
+		if trip_mask is not None:
+			rows = rows[trip_mask[self._row_trip[rows]]]
+
+		return [StopTime(self, int(row)) for row in rows]
+
 	def get_trip_stoptimes(
 		self,
 		trip_id: int
@@ -139,8 +353,16 @@ class StopTimes:
 		"""
 		Returns sorted stop_times from first to last stop.
 		"""
-		return self._trip_id_d[trip_id]
-	
+		i = self._find(self._trip_ids, trip_id)
+
+		return [
+			StopTime(self, row)
+			for row in range(
+				int(self._trip_offsets[i]),
+				int(self._trip_offsets[i+1])
+			)
+		]
+
 	@classmethod
 	def get_trip_id_set_from_stoptimes(
 		cls,
@@ -148,13 +370,9 @@ class StopTimes:
 	) -> List[int]:
 		"""
 		"""
-		trip_id_d = {}
+		trip_id_d: Dict[int, int] = {}
 
 		for stoptime in stoptimes:
 			trip_id_d[stoptime.trip_id] = 1
 
 		return list(trip_id_d.keys())
-
-
-
-
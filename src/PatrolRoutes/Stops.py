@@ -4,11 +4,13 @@ Location of all stops
 
 
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import cast, Dict, Iterator, List, TypedDict
+from typing import Callable, cast, Dict, IO, Iterator, List, TypedDict
 
 
+from .FeedCache import Columns
 from .StopTimes import StopTimes, StopTime
 from .Utils import Point
 
@@ -18,7 +20,7 @@ class Stop:
 	_stop_id: int
 	_stop_name: str
 	_stop_point: Point
-	_stop_times: List[StopTime]
+	_stop_times: "List[StopTime]|Callable[[], StopTimes]"
 
 	@property
 	def stop_id(self) -> int: return self._stop_id
@@ -26,15 +28,40 @@ class Stop:
 	def stop_name(self) -> str: return self._stop_name
 	@property
 	def stop_point(self) -> Point: return self._stop_point
+
 	@property
-	def stop_times(self) -> List[StopTime]: return self._stop_times
+	def stop_times(self) -> List[StopTime]:
+		"""
+		Looked up on first access if the stop was given the feed's stop
+		times as a function, see `Stops`.
+		"""
+		if callable(self._stop_times):
+			try:
+				self._stop_times = self._stop_times().get_stop_stoptimes(
+					self._stop_id
+				)
+			except KeyError:
+				self._stop_times = []
+
+		return self._stop_times
 
 	@property
 	def standard_stop_name(self) -> str:
-		tokens = self.stop_name.split(' & ')
+		return self.standardize_stop_name(self.stop_name)
+
+	@classmethod
+	def standardize_stop_name(
+		cls,
+		stop_name: str
+	) -> str:
+		"""
+		Sorts the streets of an intersection, so "A St & B Av" and 
+		"B Av & A St" are the same station.
+		"""
+		tokens = stop_name.split(' & ')
 
 		if len(tokens) == 1:
-			return self.stop_name
+			return stop_name
 		
 		return ' & '.join(sorted(tokens))
 
@@ -95,44 +122,78 @@ class Stops:
 
 	def __init__(
 		self,
-		stops_path: Path,
-		stop_times: StopTimes,
+		stops: "Path|Columns",
+		stop_times: "StopTimes|Callable[[], StopTimes]",
 		skip_str_stops: bool = True
 	) -> None:
 		"""
+		`stops` is either the path to stops.txt or the columns returned by
+		`Stops.read_columns()`.
+
+		`stop_times` is either the feed's `StopTimes` or a function returning
+		them, called the first time a stop's stop times are used.
+
 		If `skip_str_stops` is `True`, skip stops whose IDs aren't integers.
 		This might be an MTS-specific hack, likely not to generalize well
 		to other agency feeds. 
 		"""
 		self._stop_d = {}
 
-		stops_df = pd.read_csv(stops_path)
+		if not isinstance(stops, dict):
+			stops = self.read_columns(stops)
 
-		for _, row in stops_df.iterrows():
-			stop_row = cast("Stops._StopRow", row)
+		stop_ids = stops["stop_id"]
+		stop_names = stops["stop_name"]
+		stop_lats = stops["stop_lat"]
+		stop_lons = stops["stop_lon"]
 
-			if skip_str_stops:
-				try:
-					stop_id = int(stop_row["stop_id"])
-				except ValueError:
+		for i in range(len(stop_ids)):
+			try:
+				stop_id = int(stop_ids[i])
+			except ValueError:
+				if skip_str_stops:
 					continue
-			else:
-				stop_id = stop_row["stop_id"]
+				raise
 
-			try:
-				stop_stoptimes = stop_times.get_stop_stoptimes(int(stop_id))
-			except KeyError:
-				stop_stoptimes = []
+			stop_stoptimes: "List[StopTime]|Callable[[], StopTimes]"
+
+			if isinstance(stop_times, StopTimes):
+				try:
+					stop_stoptimes = stop_times.get_stop_stoptimes(stop_id)
+				except KeyError:
+					stop_stoptimes = []
+			else:
+				stop_stoptimes = stop_times
 
 			new_stop = Stop(
-				int(stop_id),
-				stop_row["stop_name"],
-				Point((stop_row["stop_lat"], stop_row["stop_lon"])),
+				stop_id,
+				str(stop_names[i]),
+				Point((float(stop_lats[i]), float(stop_lons[i]))),
 				stop_stoptimes
 			)
 
 			self._stop_d[new_stop.stop_id] = new_stop
 
+	@classmethod
+	def read_columns(
+		cls,
+		stops_path: "Path|IO[bytes]"
+	) -> Columns:
+		"""
+		"""
+		stops_df = pd.read_csv(
+			stops_path,
+			usecols = ["stop_id", "stop_name", "stop_lat", "stop_lon"],
+			dtype = {"stop_id": str, "stop_name": str}
+		)
+
+		return {
+			"stop_id": stops_df["stop_id"].fillna("").to_numpy(dtype = str),
+			"stop_name": stops_df["stop_name"].fillna("").to_numpy(dtype = str),
+			"stop_lat": stops_df["stop_lat"].to_numpy(dtype = np.float64),
+			"stop_lon": stops_df["stop_lon"].to_numpy(dtype = np.float64)
+		}
+
 	def __getitem__(
 		self,
 		stop_id: int
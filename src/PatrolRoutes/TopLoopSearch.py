@@ -0,0 +1,398 @@
+"""
+Find the best loops under a score, rather than any loop.
+"""
+
+
+from abc import ABC, abstractmethod
+import heapq
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+
+from .GTFSTime import GTFSTime
+from .Loop import Loop
+from .LoopEnumerator import LoopEnumerator, _EnumFrame
+from .SegmentGraph import CSRGraph, EdgeKind, SegmentGraph
+from .Settings import Settings
+from .Stops import Stop
+
+
+class LoopScore(ABC):
+	"""
+	Score of a loop given as `CSRGraph` edge IDs, higher is better.
+
+	`bound()` has to be admissible: never less than the score of any valid
+	loop that starts with the given edges, or `TopLoopSearch` can miss
+	loops. The closer it is, the more of the search it can skip.
+	"""
+	def prepare(
+		self,
+		g: CSRGraph,
+		settings: Settings
+	) -> None:
+		"""
+		Called once before a search.
+		"""
+		pass
+
+	@abstractmethod
+	def score(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> float:
+		pass
+
+	@abstractmethod
+	def bound(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int],
+		remaining_sec: Optional[int]
+	) -> float:
+		"""
+		Upper bound on `score()` of loops starting with `edge_ids`, which
+		have at most `remaining_sec` more seconds (unlimited if `None`).
+		"""
+		pass
+
+
+class FewestWalkingTransfers(LoopScore):
+	"""
+	Minus the number of walking transfers.
+	"""
+	def score(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> float:
+		"""
+		"""
+		return -sum(
+			1 for edge_id in edge_ids
+			if g.edge_kind(edge_id) == EdgeKind.WALKING
+		)
+
+	def bound(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int],
+		remaining_sec: Optional[int]
+	) -> float:
+		"""
+		Walking transfers can only be added.
+		"""
+		return self.score(g, edge_ids)
+
+
+class LeastWaiting(LoopScore):
+	"""
+	Minus the seconds spent on transfers.
+	"""
+	def score(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> float:
+		"""
+		"""
+		return -sum(
+			g.edge_duration(edge_id) for edge_id in edge_ids
+			if g.edge_kind(edge_id) != EdgeKind.TRIP
+		)
+
+	def bound(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int],
+		remaining_sec: Optional[int]
+	) -> float:
+		"""
+		Transfer time can only be added.
+		"""
+		return self.score(g, edge_ids)
+
+
+class MostDistinctRoutes(LoopScore):
+	"""
+	Number of different routes ridden.
+	"""
+	_n_routes: int
+	_trip_min_sec: Optional[int]
+	_transfer_min_sec: int
+
+	def prepare(
+		self,
+		g: CSRGraph,
+		settings: Settings
+	) -> None:
+		"""
+		"""
+		self._n_routes = len(set(g.node_route.tolist()))
+
+		self._trip_min_sec = Loop._optional_seconds(settings.trip_min_duration)
+		self._transfer_min_sec = max(0, int(settings.min_transfer_time))
+
+	def _routes(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> Set[int]:
+		"""
+		"""
+		return {
+			g.edge_route(edge_id) for edge_id in edge_ids
+			if edge_id < g.n_trip_edges
+		}
+
+	def score(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> float:
+		"""
+		"""
+		return len(self._routes(g, edge_ids))
+
+	def bound(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int],
+		remaining_sec: Optional[int]
+	) -> float:
+		"""
+		Every route not ridden yet, up to the number of minimum length trips
+		(each with a transfer before the next) that fit in the remaining
+		time.
+		"""
+		n_routes = len(self._routes(g, edge_ids))
+		n_more = self._n_routes - n_routes
+
+		if (
+			(remaining_sec is not None)
+			and (self._trip_min_sec is not None)
+			and (self._trip_min_sec > 0)
+		):
+			n_more = min(
+				n_more,
+				(remaining_sec + self._transfer_min_sec)
+				// (self._trip_min_sec + self._transfer_min_sec)
+			)
+
+		return n_routes + max(0, n_more)
+
+
+class StationsCovered(LoopScore):
+	"""
+	Number of the given stations the loop rides through, e.g. the stops
+	along the edge of a patrol area. Stations are given by stop name.
+	"""
+	_station_names: List[str]
+	_targets: Set[int]
+
+	def __init__(
+		self,
+		station_names: Iterable[str]
+	) -> None:
+		"""
+		"""
+		self._station_names = [
+			Stop.standardize_stop_name(name) for name in station_names
+		]
+		self._targets = set()
+
+	def prepare(
+		self,
+		g: CSRGraph,
+		settings: Settings
+	) -> None:
+		"""
+		"""
+		self._targets = {g.station_index(name) for name in self._station_names}
+
+	def _covered(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> Set[int]:
+		"""
+		"""
+		covered: Set[int] = set()
+
+		for edge_id in edge_ids:
+			if edge_id < g.n_trip_edges:
+				covered.update(
+					g.node_station[g.trip_edge_nodes(edge_id)].tolist()
+				)
+
+		return covered & self._targets
+
+	def score(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> float:
+		"""
+		"""
+		return len(self._covered(g, edge_ids))
+
+	def bound(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int],
+		remaining_sec: Optional[int]
+	) -> float:
+		"""
+		Every station, unless there's no time left for another trip.
+		"""
+		if remaining_sec == 0:
+			return self.score(g, edge_ids)
+		return len(self._targets)
+
+
+class WeightedScore(LoopScore):
+	"""
+	Weighted sum of other scores. Weights can't be negative, or the sum of
+	the bounds wouldn't be a bound.
+	"""
+	_terms: List[Tuple[float, LoopScore]]
+
+	def __init__(
+		self,
+		terms: Sequence[Tuple[float, LoopScore]]
+	) -> None:
+		"""
+		"""
+		for weight, _ in terms:
+			if weight < 0:
+				raise ValueError(
+					f"Score weights can't be negative, got {weight}"
+				)
+
+		self._terms = list(terms)
+
+	def prepare(
+		self,
+		g: CSRGraph,
+		settings: Settings
+	) -> None:
+		"""
+		"""
+		for _, term in self._terms:
+			term.prepare(g, settings)
+
+	def score(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int]
+	) -> float:
+		"""
+		"""
+		return sum(weight*term.score(g, edge_ids) for weight, term in self._terms)
+
+	def bound(
+		self,
+		g: CSRGraph,
+		edge_ids: Sequence[int],
+		remaining_sec: Optional[int]
+	) -> float:
+		"""
+		"""
+		return sum(
+			weight*term.bound(g, edge_ids, remaining_sec)
+			for weight, term in self._terms
+		)
+
+
+class TopLoopSearch(LoopEnumerator):
+	"""
+	Branch-and-bound search for the `k` best loops under a `LoopScore`, out
+	of the loops `LoopEnumerator` lists. The best `k` found so far are kept
+	in a heap, and once there are `k` of them, a partial loop whose
+	`LoopScore.bound()` isn't better than the worst of them is not searched
+	any further. Ties go to the loop found first, so the result is the
+	same as scoring every loop and stable sorting.
+	"""
+	_score: LoopScore
+	_k: int
+	_heap: List[Tuple[float, int, List[int]]] ## (score, -order found, edge IDs)
+	_n_scored: int
+
+	def __init__(
+		self,
+		sg: SegmentGraph,
+		settings: Settings,
+		score: LoopScore,
+		k: int = 10
+	) -> None:
+		"""
+		"""
+		if k < 1:
+			raise ValueError(f"Need to search for at least 1 loop, got k={k}")
+
+		super().__init__(sg, settings)
+
+		self._score = score
+		self._k = k
+		self._heap = []
+		self._n_scored = 0
+
+	@property
+	def n_scored(self) -> int:
+		"""
+		Complete loops scored in the last search.
+		"""
+		return self._n_scored
+
+	def _may_extend(
+		self,
+		edge_ids: List[int],
+		frame: _EnumFrame
+	) -> bool:
+		"""
+		"""
+		if len(self._heap) < self._k:
+			return True
+
+		remaining_sec = None
+		if self._loop_max_sec is not None:
+			remaining_sec = self._loop_max_sec - frame._elapsed
+
+		return (
+			self._score.bound(self._g, edge_ids, remaining_sec)
+			> self._heap[0][0]
+		)
+
+	def search(
+		self,
+		origin_station: Optional[str] = None,
+		start_after: Optional[GTFSTime] = None,
+		start_before: Optional[GTFSTime] = None
+	) -> List[Tuple[float, Loop]]:
+		"""
+		The best `k` loops and their scores, best first, with the same
+		arguments as `LoopEnumerator.enumerate()`. Loops are numbered from
+		0 in that order.
+		"""
+		self._score.prepare(self._g, self._s)
+		self._heap = []
+		self._n_scored = 0
+
+		for edge_ids in self._search(
+			self._root_edges(origin_station, start_after, start_before)
+		):
+			entry = (
+				self._score.score(self._g, edge_ids), -self._n_scored, edge_ids
+			)
+			self._n_scored += 1
+
+			if len(self._heap) < self._k:
+				heapq.heappush(self._heap, entry)
+			elif entry[:2] > self._heap[0][:2]:
+				heapq.heapreplace(self._heap, entry)
+
+		best = sorted(self._heap, key = lambda entry: entry[:2], reverse = True)
+
+		return [
+			(score, Loop.from_edge_ids(i, -1, self._sg, self._s, edge_ids))
+			for i, (score, _, edge_ids) in enumerate(best)
+		]
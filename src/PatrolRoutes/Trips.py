@@ -4,12 +4,15 @@ Represents trips, query by ID (int) or service_id (str).
 
 
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 from pandas._libs.missing import NAType
 from pathlib import Path
-from typing import cast, Dict, List, TypedDict
+from typing import Callable, cast, Dict, IO, Iterable, List, Optional, TypedDict
 
 
+from .FeedCache import Columns
+from .FeedSource import read_csv_filtered
 from .Settings import Settings
 from .Shapes import Shapes, Shape, UnknownShapeException
 from .StopTimes import StopTimes, StopTime
@@ -38,7 +41,8 @@ class Trip:
 	_trip_headsign: str
 	_stop_times: List[StopTime]
 	_direction_name: str
-	_shape: Shape
+	_shape_id: str
+	_shapes: "Callable[[], Shapes]"
 
 	@property
 	def route_id(self) -> str: return self._route_id
@@ -53,7 +57,15 @@ class Trip:
 	@property
 	def direction_name(self) -> str: return self._direction_name
 	@property
-	def shape(self) -> Shape: return self._shape
+	def shape_id(self) -> str: return self._shape_id
+
+	@property
+	def shape(self) -> Shape:
+		"""
+		Looked up on access, so shapes aren't loaded until a trip's shape 
+		is needed.
+		"""
+		return self._shapes()[self._shape_id]
 
 	@property
 	def first_stoptime(self) -> StopTime: return self._stop_times[0]
@@ -61,6 +73,24 @@ class Trip:
 	def last_stoptime(self) -> StopTime: return self._stop_times[-1]
 
 
+class _ShapesRef:
+	"""
+	Already loaded `Shapes` given to `Trips`, returned when called.
+	"""
+	_shapes: Shapes
+
+	def __init__(
+		self,
+		shapes: Shapes
+	) -> None:
+		"""
+		"""
+		self._shapes = shapes
+
+	def __call__(self) -> Shapes:
+		return self._shapes
+
+
 class _TripRow(TypedDict):
 	"""
 	Types are as pandas will parse them.
@@ -86,40 +116,76 @@ class Trips:
 
 	_trip_d: Dict[int, Trip]
 	_svc_trips_d: Dict[str, List["Trip"]]
+
+	_columns: List[str] = [
+		"route_id",
+		"service_id",
+		"trip_id",
+		"trip_headsign",
+		"shape_id",
+		"direction_name"
+	]
 		
 	def __init__(
 		self,
-		trips_path: Path,
+		trips: "Path|Columns",
 		settings: Settings,
 		stop_times: StopTimes,
-		shapes: Shapes
+		shapes: "Shapes|Callable[[], Shapes]",
+		skip_missing_stoptimes: bool = False
 	) -> None:
 		"""
+		`trips` is either the path to trips.txt or the columns returned by
+		`Trips.read_columns()`.
+
+		`shapes` is either the feed's `Shapes` or a function returning them,
+		called the first time a trip's shape is used. Unknown shape IDs
+		raise `UnknownShapeException` then.
+
+		If `skip_missing_stoptimes` is `True`, skip trips with no stop times
+		instead of raising `KeyError`, e.g. when `stop_times` was only
+		loaded for some stops.
 		"""
 		self._trip_d = {}
 		self._svc_trips_d = {}
 
-		trips_df = pd.read_csv(trips_path)
+		if not isinstance(trips, dict):
+			trips = self.read_columns(trips)
+
+		if isinstance(shapes, Shapes):
+			get_shapes = _ShapesRef(shapes)
+		else:
+			get_shapes = shapes
 
-		for _, row in trips_df.iterrows():
-			trip_row = cast("_TripRow", row.to_dict())
+		for i in range(len(trips["trip_id"])):
+			trip_row = cast("_TripRow", {
+				col: trips[col][i] for col in self._columns
+			})
 
 			if settings.route_is_excluded(trip_row['route_id']):
 				continue
 
-			if pd.isnull(trip_row['shape_id']):
+			if trip_row['shape_id'] == "":
 				raise NullTripShapeException(trip_row)
-			else:  ## type hinting
-				trip_row['shape_id'] = cast(str, trip_row['shape_id'])
+
+			try:
+				trip_stoptimes = stop_times.get_trip_stoptimes(
+					int(trip_row["trip_id"])
+				)
+			except KeyError:
+				if skip_missing_stoptimes:
+					continue
+				raise
 
 			new_trip = Trip(
-				trip_row["route_id"],
-				trip_row["service_id"],
-				trip_row["trip_id"],
-				trip_row["trip_headsign"],
-				stop_times.get_trip_stoptimes(trip_row["trip_id"]),
-				trip_row["direction_name"],
-				shapes[trip_row['shape_id']]
+				str(trip_row["route_id"]),
+				str(trip_row["service_id"]),
+				int(trip_row["trip_id"]),
+				str(trip_row["trip_headsign"]),
+				trip_stoptimes,
+				str(trip_row["direction_name"]),
+				str(trip_row['shape_id']),
+				get_shapes
 			)
 
 			self._trip_d[new_trip.trip_id] = new_trip
@@ -129,6 +195,66 @@ class Trips:
 				new_trip.service_id,
 				new_trip
 			)
+
+	@classmethod
+	def read_columns(
+		cls,
+		trips_path: "Path|IO[bytes]",
+		route_is_excluded: Optional[Callable[[str], bool]] = None,
+		service_ids: Optional[Iterable[str]] = None
+	) -> Columns:
+		"""
+		Missing strings (e.g. a trip without a shape) are read as "".
+
+		With `route_is_excluded` (e.g. `Settings.route_is_excluded`) or 
+		`service_ids`, only the trips on routes that aren't excluded and
+		with one of the services are kept, filtered while reading.
+		"""
+		read_kwargs = dict(
+			usecols = lambda col: col in cls._columns,
+			dtype = {
+				col: str for col in cls._columns
+				if col != "trip_id"
+			}
+		)
+
+		if (route_is_excluded is None) and (service_ids is None):
+			trips_df = pd.read_csv(trips_path, **read_kwargs)
+		else:
+			keep_services = None
+			if service_ids is not None:
+				keep_services = set(service_ids)
+
+			excluded: Dict[str, bool] = {}
+
+			def keep(chunk: pd.DataFrame) -> pd.Series:
+				mask = pd.Series(True, index = chunk.index)
+
+				if route_is_excluded is not None:
+					for route_id in chunk["route_id"].unique():
+						if route_id not in excluded:
+							excluded[route_id] = route_is_excluded(route_id)
+
+					mask &= ~chunk["route_id"].map(excluded).astype(bool)
+
+				if keep_services is not None:
+					mask &= chunk["service_id"].isin(keep_services)
+
+				return mask
+
+			trips_df = read_csv_filtered(trips_path, keep, **read_kwargs)
+
+		cols: Columns = {}
+
+		for col in cls._columns:
+			if col == "trip_id":
+				cols[col] = trips_df[col].to_numpy(dtype = np.int64)
+			elif col in trips_df.columns:
+				cols[col] = trips_df[col].fillna("").to_numpy(dtype = str)
+			else:
+				cols[col] = np.full(len(trips_df), "", dtype = str)
+
+		return cols
 	
 	def __getitem__(
 		self,
@@ -5,8 +5,8 @@ Utility functions.
 
 import copy
 from enum import Enum
-from geopy.distance import geodesic
-from numpy import cos, dot, sqrt
+import numpy as np
+from numpy import cos, dot, radians, sqrt
 from typing import Any, Dict, Generic, List, Literal, Optional, overload, Tuple, Type, TypeVar, Union
 from typing_extensions import Self
 import warnings
@@ -135,21 +135,12 @@ class Point:
 		dist_unit: str = "mi"
 	) -> float:
 		"""
-		Either euclidean or geodesic distance. 
+		Equirectangular approximation, see `fast_distance_miles()`.
 		"""
-		dist = geodesic(self.tuple, other.tuple)
-
 		if dist_unit == "mi":
-			#return dist.miles
-
-			## Use fast version
-			## degree conversion: 68.9722
-			## https://jonisalonen.com/2014/computing-distance-between-coordinates-can-be-simple-and-fast/
-
-			deglen = 68.9722
-			x = other.lat - self.lat
-			y = (other.lon - self.lon) * cos(self.lon)
-			return deglen * sqrt(x*x + y*y)
+			return float(fast_distance_miles(
+				self.lat, self.lon, other.lat, other.lon
+			))
 
 		#elif dist_unit == "km":
 		#	return dist.km
@@ -345,6 +336,27 @@ class Point:
 	def lon(self) -> float: return self._lon
 
 
+DEGREE_LENGTH_MILES = 68.9722
+
+
+def fast_distance_miles(
+	lat1: "float|np.ndarray",
+	lon1: "float|np.ndarray",
+	lat2: "float|np.ndarray",
+	lon2: "float|np.ndarray"
+) -> "float|np.ndarray":
+	"""
+	Distance in miles from (lat1, lon1) to (lat2, lon2), with longitude 
+	scaled by the cosine of the first point's latitude. Accurate enough at
+	walking-transfer distances and works elementwise on numpy arrays.
+
+	https://jonisalonen.com/2014/computing-distance-between-coordinates-can-be-simple-and-fast/
+	"""
+	x = lat2 - lat1
+	y = (lon2 - lon1) * cos(radians(lat1))
+	return DEGREE_LENGTH_MILES * sqrt(x*x + y*y)
+
+
 def append_to_dict_of_lists(
 	d: Dict[Any, List[Any]],
 	key: Any,
@@ -0,0 +1,94 @@
+"""
+Non-interactive batch mode. Builds loops for a range of seeds and writes them
+as JSON Lines, e.g.
+
+	python -m src.PatrolRoutes examples/settings.json -n 100 --seed-start 1 \\
+		--workers 4 -o loops.jsonl
+"""
+
+
+import argparse
+import contextlib
+from pathlib import Path
+import sys
+from typing import List, Optional
+
+
+from .Duration import Seconds
+from .PatrolRoutes import PatrolRoutes
+
+
+def main(
+	argv: Optional[List[str]] = None
+) -> int:
+	"""
+	"""
+	parser = argparse.ArgumentParser(
+		prog = "python -m src.PatrolRoutes",
+		description = "Generate loops and write them as JSON Lines."
+	)
+	parser.add_argument("settings_path", type = Path)
+	parser.add_argument(
+		"-n", "--count", type = int, default = 1,
+		help = "Number of loops (seeds) to build."
+	)
+	parser.add_argument(
+		"--seed-start", type = int, default = 0,
+		help = "Seeds are seed_start, seed_start + 1, ..., one per loop."
+	)
+	parser.add_argument(
+		"-o", "--output", default = "-",
+		help = "Output path, '-' for stdout."
+	)
+	parser.add_argument(
+		"-w", "--workers", type = int, default = 1,
+		help = "Worker processes to build loops in."
+	)
+	parser.add_argument(
+		"--text", action = "store_true",
+		help = "Also include the plain text rendering of each loop."
+	)
+	parser.add_argument(
+		"--distinct", action = "store_true",
+		help = "Skip loops that were already written for an earlier seed."
+	)
+	parser.add_argument(
+		"--max-expansions", type = int, default = None,
+		help = "Give up on a loop after trying this many search nodes."
+	)
+	parser.add_argument(
+		"--time-limit", type = int, default = None,
+		help = "Give up on a loop after this many seconds of searching."
+	)
+
+	args = parser.parse_args(argv)
+
+	## Keep loading progress out of the JSON Lines when writing to stdout
+	with contextlib.redirect_stdout(sys.stderr):
+		pr = PatrolRoutes(args.settings_path)
+
+	seeds = range(args.seed_start, args.seed_start + args.count)
+
+	time_limit = None
+	if args.time_limit is not None:
+		time_limit = Seconds(args.time_limit)
+
+	if args.output == "-":
+		n_found = pr.write_loops_jsonl(
+			sys.stdout, args.count, seeds, args.workers, args.text,
+			args.distinct, args.max_expansions, time_limit
+		)
+	else:
+		with open(args.output, 'w') as f:
+			n_found = pr.write_loops_jsonl(
+				f, args.count, seeds, args.workers, args.text,
+				args.distinct, args.max_expansions, time_limit
+			)
+
+	print(f"Found {n_found} of {args.count} loops.", file = sys.stderr)
+
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
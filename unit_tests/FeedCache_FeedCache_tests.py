@@ -0,0 +1,121 @@
+from datetime import datetime
+import os
+from pathlib import Path
+import numpy as np
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes import GTFS_STRF
+from src.PatrolRoutes.FeedCache import FeedCache, StringColumn
+from src.PatrolRoutes.GTFS import GTFS
+from src.PatrolRoutes.Settings import Settings
+from src.PatrolRoutes.StopTimes import StopTimes
+from src.PatrolRoutes.Trips import Trips
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+class FeedCache_FeedCache_tests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		self._feed_dir = write_feed(Path(self._tmp.name) / "feed")
+		self._settings = Settings(write_settings(
+			Path(self._tmp.name) / "settings.json",
+			self._feed_dir
+		))
+
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def _load_stop_times(self, cache: FeedCache):
+		path = self._feed_dir / "stop_times.txt"
+		n_builds = []
+
+		def build():
+			n_builds.append(1)
+			return StopTimes.read_columns(path)
+
+		cols = cache.load("stop_times", [path], build)
+
+		return cols, len(n_builds)
+
+	def test_cache_dir_next_to_feed(self):
+		self.assertEqual(
+			FeedCache(self._feed_dir).cache_dir,
+			Path(self._tmp.name) / "feed.cache"
+		)
+
+	def test_second_load_is_memory_mapped(self):
+		_, n_builds = self._load_stop_times(FeedCache(self._feed_dir))
+		self.assertEqual(n_builds, 1)
+
+		cols, n_builds = self._load_stop_times(FeedCache(self._feed_dir))
+		self.assertEqual(n_builds, 0)
+		self.assertIsInstance(cols["trip_id"], np.memmap)
+
+	def test_changed_source_rebuilds(self):
+		self._load_stop_times(FeedCache(self._feed_dir))
+
+		with open(self._feed_dir / "stop_times.txt", 'a') as f:
+			f.write("1000,23:00:00,23:00:00,1,9,1\n")
+
+		cols, n_builds = self._load_stop_times(FeedCache(self._feed_dir))
+		self.assertEqual(n_builds, 1)
+		self.assertEqual(int(cols["departure_time"].max()), 23*3600)
+
+	def test_touched_source_with_same_content_is_reused(self):
+		self._load_stop_times(FeedCache(self._feed_dir))
+
+		path = self._feed_dir / "stop_times.txt"
+		stat = os.stat(path)
+		os.utime(path, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+		_, n_builds = self._load_stop_times(FeedCache(self._feed_dir))
+		self.assertEqual(n_builds, 0)
+
+	def test_string_columns_round_trip(self):
+		gtfs = GTFS(self._feed_dir, self._settings)
+		cached = GTFS(self._feed_dir, self._settings)
+
+		self.assertEqual(
+			gtfs.get_stop(2).stop_name,
+			cached.get_stop(2).stop_name
+		)
+		self.assertEqual(cached.get_stop(3).stop_name, "1st St & Beta Av")
+		self.assertEqual(cached.get_trip(1000).route_id, "A")
+
+		service_date = datetime.strptime("20250806", GTFS_STRF)
+
+		self.assertEqual(
+			len(gtfs.get_date_trips(service_date)),
+			len(cached.get_date_trips(service_date))
+		)
+
+	def test_string_columns_memory_mapped(self):
+		path = self._feed_dir / "trips.txt"
+		parsed = Trips.read_columns(path)
+
+		cache = FeedCache(self._feed_dir)
+		cache.load("trips", [path], lambda: Trips.read_columns(path))
+		cols = FeedCache(self._feed_dir).load("trips", [path], lambda: {})
+
+		route_ids = cols["route_id"]
+		self.assertIsInstance(route_ids, StringColumn)
+		self.assertIsInstance(route_ids.codes, np.memmap)
+		self.assertEqual(len(route_ids.strings), len(set(parsed["route_id"])))
+
+		self.assertEqual(len(route_ids), len(parsed["route_id"]))
+		self.assertEqual(list(route_ids), parsed["route_id"].tolist())
+		self.assertEqual(route_ids[3], parsed["route_id"][3])
+		np.testing.assert_array_equal(np.asarray(route_ids), parsed["route_id"])
+
+	def test_uncached_load(self):
+		gtfs = GTFS(self._feed_dir, self._settings, use_cache = False)
+
+		self.assertFalse((Path(self._tmp.name) / "feed.cache").exists())
+		self.assertEqual(
+			[st.stop_id for st in gtfs.get_trip(1000).stop_times],
+			[1, 11, 12, 2]
+		)
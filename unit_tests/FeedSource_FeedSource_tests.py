@@ -0,0 +1,127 @@
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import sys
+import tempfile
+import unittest
+import zipfile
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes import GTFS_STRF
+from src.PatrolRoutes.FeedSource import (
+	FeedSource, MissingTableException, read_csv_filtered
+)
+from src.PatrolRoutes.GTFS import GTFS
+from src.PatrolRoutes.Settings import Settings
+from src.PatrolRoutes.StopTimes import StopTimes
+from unit_tests.synthetic_feed import (
+	SERVICE_DATE, STOPS, write_feed, write_settings
+)
+
+
+class FeedSource_FeedSource_tests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(self._tmp.name)
+
+		self._feed_dir = write_feed(tmp_dir / "feed")
+		self._settings = Settings(
+			write_settings(tmp_dir / "settings.json", self._feed_dir)
+		)
+
+		## Tables inside a subdirectory, as when a feed directory is zipped
+		self._zip_path = tmp_dir / "feed.zip"
+		with zipfile.ZipFile(self._zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+			for path in sorted(self._feed_dir.iterdir()):
+				zf.write(path, f"feed/{path.name}")
+
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def test_tables(self):
+		source = FeedSource(self._zip_path)
+
+		self.assertTrue(source.is_zip)
+		self.assertFalse(FeedSource(self._feed_dir).is_zip)
+		self.assertTrue(source.has_table("stop_times"))
+		self.assertFalse(source.has_table("frequencies"))
+		self.assertEqual(source.source_paths("stops"), [self._zip_path])
+
+		with self.assertRaises(MissingTableException):
+			with source.open("frequencies"):
+				pass
+
+	def test_same_columns_as_directory(self):
+		with FeedSource(self._zip_path).open("stop_times") as table:
+			from_zip = StopTimes.read_columns(table)
+
+		from_dir = StopTimes.read_columns(self._feed_dir / "stop_times.txt")
+
+		self.assertEqual(from_zip.keys(), from_dir.keys())
+		for col in from_dir:
+			np.testing.assert_array_equal(from_zip[col], from_dir[col])
+
+	def test_gtfs_from_zip(self):
+		service_date = datetime.strptime(SERVICE_DATE, GTFS_STRF)
+
+		from_dir = GTFS(self._feed_dir, self._settings, use_cache = False)
+		from_zip = GTFS(self._zip_path, self._settings, use_cache = False)
+
+		self.assertEqual(
+			[trip.trip_id for trip in from_zip.get_date_trips(service_date)],
+			[trip.trip_id for trip in from_dir.get_date_trips(service_date)]
+		)
+
+		for stop_id, _, _, _ in STOPS:
+			self.assertEqual(
+				from_zip.get_stop(stop_id).stop_name,
+				from_dir.get_stop(stop_id).stop_name
+			)
+			self.assertEqual(
+				[
+					(st.trip_id, int(st.departure_time))
+					for st in from_zip.get_stop_stoptimes_on_date(
+						service_date, stop_id
+					)
+				],
+				[
+					(st.trip_id, int(st.departure_time))
+					for st in from_dir.get_stop_stoptimes_on_date(
+						service_date, stop_id
+					)
+				]
+			)
+
+	def test_zip_decoded_once(self):
+		first = GTFS(self._zip_path, self._settings)
+		first.stop_times
+
+		self.assertEqual(
+			first._cache.cache_dir, Path(self._tmp.name) / "feed.zip.cache"
+		)
+
+		second = GTFS(self._zip_path, self._settings)
+		self.assertIsInstance(second.stop_times._trip_id, np.memmap)
+
+	def test_read_csv_filtered(self):
+		path = self._feed_dir / "stop_times.txt"
+		full = pd.read_csv(path)
+
+		for chunk_rows in [1, 7, len(full) + 1]:
+			with self.subTest(chunk_rows = chunk_rows):
+				found = read_csv_filtered(
+					path,
+					lambda chunk: chunk["stop_id"] == STOPS[0][0],
+					chunk_rows = chunk_rows
+				)
+
+				pd.testing.assert_frame_equal(
+					found,
+					full[full["stop_id"] == STOPS[0][0]].reset_index(drop = True)
+				)
+
+
+if __name__ == "__main__":
+	unittest.main()
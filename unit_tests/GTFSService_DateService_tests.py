@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 import sys
+import tempfile
 import unittest
 
 
 sys.path.insert(0, "../")
 from src.PatrolRoutes import GTFS_STRF
 from src.PatrolRoutes.GTFSService import DateServices
+from unit_tests.synthetic_feed import write_feed
 
 
 class GTFSService_DateService_tests(unittest.TestCase):
@@ -44,4 +46,143 @@ class GTFSService_DateService_tests(unittest.TestCase):
 				"S2_84839-1111100-0",
 				datetime.strptime("20250704", GTFS_STRF)
 			)
-		)
\ No newline at end of file
+		)
+
+
+CALENDAR_TXT = """service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date
+WKDY,1,1,1,1,1,0,0,20250106,20250131
+SAT,0,0,0,0,0,1,0,20250104,20250125
+"""
+
+CALENDAR_DATES_TXT = """service_id,date,exception_type
+WKDY,20250120,2
+SAT,20250120,1
+SAT,20250201,1
+EXTRA,20250115,1
+"""
+
+
+class GTFSService_DateService_matrix_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		with open(tmp_dir / "calendar.txt", 'w') as f:
+			f.write(CALENDAR_TXT)
+		with open(tmp_dir / "calendar_dates.txt", 'w') as f:
+			f.write(CALENDAR_DATES_TXT)
+
+		cls.date_services = DateServices(
+			tmp_dir / "calendar.txt",
+			tmp_dir / "calendar_dates.txt"
+		)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _runs(self, service_id, d):
+		## GTFS: added and removed dates override the weekly pattern
+		excep = {
+			("WKDY", date(2025, 1, 20)): False,
+			("SAT", date(2025, 1, 20)): True,
+			("SAT", date(2025, 2, 1)): True,
+			("EXTRA", date(2025, 1, 15)): True
+		}
+
+		if (service_id, d) in excep:
+			return excep[(service_id, d)]
+
+		if service_id == "WKDY":
+			return (date(2025, 1, 6) <= d <= date(2025, 1, 31)) and d.weekday() < 5
+		if service_id == "SAT":
+			return (date(2025, 1, 4) <= d <= date(2025, 1, 25)) and d.weekday() == 5
+		return False
+
+	def test_matches_calendar(self):
+		self.assertEqual(self.date_services.service_ids, ["WKDY", "SAT", "EXTRA"])
+
+		start = date(2024, 12, 25)
+
+		for n in range(50):
+			d = start + timedelta(days = n)
+
+			for service_id in ["WKDY", "SAT", "EXTRA"]:
+				self.assertEqual(
+					self.date_services.service_runs_on_date(service_id, d),
+					self._runs(service_id, d),
+					(service_id, d)
+				)
+
+			self.assertEqual(
+				self.date_services.get_date_service_ids(
+					datetime(d.year, d.month, d.day)
+				),
+				[
+					service_id for service_id in ["WKDY", "SAT", "EXTRA"]
+					if self._runs(service_id, d)
+				]
+			)
+
+	def test_end_date_included(self):
+		self.assertTrue(self.date_services.service_runs_on_date(
+			"WKDY", datetime.strptime("20250131", GTFS_STRF)
+		))
+		self.assertTrue(self.date_services.service_runs_on_date(
+			"SAT", datetime.strptime("20250125", GTFS_STRF)
+		))
+
+	def test_ranges(self):
+		start = date(2025, 1, 1)
+		end = date(2025, 2, 3)
+
+		runs = self.date_services.runs_matrix(start, end)
+		self.assertEqual(runs.shape, (3, 34))
+
+		for i, service_id in enumerate(self.date_services.service_ids):
+			expected = [
+				start + timedelta(days = n) for n in range(34)
+				if self._runs(service_id, start + timedelta(days = n))
+			]
+
+			self.assertEqual(runs[i].sum(), len(expected))
+			self.assertEqual(
+				self.date_services.get_service_dates(service_id, start, end),
+				expected
+			)
+
+		self.assertEqual(
+			self.date_services.get_service_dates(
+				"SAT", date(2025, 1, 11), date(2025, 1, 18)
+			),
+			[date(2025, 1, 11), date(2025, 1, 18)]
+		)
+		self.assertEqual(
+			self.date_services.runs_matrix(date(2026, 1, 1), date(2026, 1, 2)).sum(),
+			0
+		)
+		self.assertEqual(
+			self.date_services.runs_matrix(end, start).shape, (3, 0)
+		)
+
+	def test_unknown_service(self):
+		with self.assertRaises(KeyError):
+			self.date_services.service_runs_on_date("NOPE", date(2025, 1, 6))
+
+	def test_synthetic_feed(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			feed_dir = write_feed(Path(tmp) / "feed")
+			date_services = DateServices(
+				feed_dir / "calendar.txt",
+				feed_dir / "calendar_dates.txt"
+			)
+
+		self.assertEqual(
+			date_services.get_date_service_ids(datetime(2025, 7, 4)),
+			["WKND"]
+		)
+		self.assertEqual(
+			date_services.get_date_service_ids(datetime(2025, 12, 31)),
+			["WKDY"]
+		)
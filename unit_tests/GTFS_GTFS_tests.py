@@ -1,13 +1,19 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 import sys
+import tempfile
 import unittest
 
 
 sys.path.insert(0, "../")
 from src.PatrolRoutes import GTFS_STRF
-from src.PatrolRoutes.GTFS import GTFS
+from src.PatrolRoutes.GTFS import GTFS, TablesLoadedException
 from src.PatrolRoutes.GTFSTime import GTFSTime as GT
+from src.PatrolRoutes.SegmentGraph import SegmentGraph
+from src.PatrolRoutes.Settings import Settings
+from unit_tests.synthetic_feed import (
+	SERVICE_DATE, STOPS, write_feed, write_settings
+)
 
 
 class GTFS_GTFS_tests(unittest.TestCase):
@@ -74,4 +80,203 @@ class GTFS_GTFS_tests(unittest.TestCase):
 		self.assertEqual(
 			self.gtfs.get_stop(94048).stop_times[0].departure_time,
 			GT("05:03:00")
-		)
\ No newline at end of file
+		)
+
+
+class GTFS_date_index_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		feed_dir = write_feed(tmp_dir / "feed")
+		settings = Settings(write_settings(tmp_dir / "settings.json", feed_dir))
+
+		cls.gtfs = GTFS(feed_dir, settings, use_cache = False)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _brute_force(self, service_date, stop_id):
+		trip_ids = {trip.trip_id for trip in self.gtfs.get_date_trips(service_date)}
+
+		return [
+			st for st in self.gtfs._stop_times.get_stop_stoptimes(stop_id)
+			if st.trip_id in trip_ids
+		]
+
+	def test_stop_stoptimes_on_date(self):
+		wednesday = datetime.strptime(SERVICE_DATE, GTFS_STRF)
+
+		for service_date in [
+			wednesday,
+			wednesday + timedelta(days = 3), ## Saturday
+			datetime.strptime("20250704", GTFS_STRF) ## weekend service
+		]:
+			for stop_id, _, _, _ in STOPS:
+				with self.subTest(service_date = service_date, stop_id = stop_id):
+					found = self.gtfs.get_stop_stoptimes_on_date(
+						service_date, stop_id
+					)
+
+					self.assertEqual(found, self._brute_force(service_date, stop_id))
+
+					deps = [int(st.departure_time) for st in found]
+					self.assertEqual(deps, sorted(deps))
+
+		## Only the weekend trips on route A stop at Alpha on a Saturday
+		self.assertEqual(
+			{
+				st.trip_id for st in self.gtfs.get_stop_stoptimes_on_date(
+					wednesday + timedelta(days = 3), 1
+				)
+			},
+			{9000, 9001}
+		)
+
+		with self.assertRaises(KeyError):
+			self.gtfs.get_stop_stoptimes_on_date(wednesday, 123456)
+
+	def test_date_masks_lru(self):
+		first = datetime.strptime(SERVICE_DATE, GTFS_STRF)
+		n_dates = self.gtfs._date_cache_size
+
+		self.gtfs._date_trip_masks.clear()
+
+		mask = self.gtfs.get_date_trip_mask(first)
+		self.assertIs(self.gtfs.get_date_trip_mask(first), mask)
+
+		for days in range(1, n_dates):
+			self.gtfs.get_date_trip_mask(first + timedelta(days = days))
+
+		## Using the first date again keeps it past the next eviction
+		self.gtfs.get_date_trip_mask(first)
+		self.gtfs.get_date_trip_mask(first + timedelta(days = n_dates))
+
+		cached = self.gtfs._date_trip_masks
+		self.assertEqual(len(cached), n_dates)
+		self.assertIn(SERVICE_DATE, cached)
+		self.assertNotIn(
+			(first + timedelta(days = 1)).strftime(GTFS_STRF), cached
+		)
+		self.assertIs(self.gtfs.get_date_trip_mask(first), mask)
+
+
+class GTFS_lazy_tables_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._feed_dir = write_feed(tmp_dir / "feed")
+		cls._settings = Settings(
+			write_settings(tmp_dir / "settings.json", cls._feed_dir)
+		)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def test_nothing_loaded(self):
+		gtfs = GTFS(self._feed_dir, self._settings, use_cache = False)
+		self.assertEqual(gtfs.loaded_tables, [])
+
+	def test_loads_on_access(self):
+		gtfs = GTFS(self._feed_dir, self._settings, use_cache = False)
+
+		stop = gtfs.get_stop(STOPS[0][0])
+		self.assertEqual(gtfs.loaded_tables, ["stops"])
+		self.assertIs(gtfs.get_stop(STOPS[0][0]), stop)
+
+		self.assertGreater(len(stop.stop_times), 0)
+		self.assertEqual(gtfs.loaded_tables, ["stop_times", "stops"])
+
+		trip = gtfs.get_date_trips(datetime.strptime(SERVICE_DATE, GTFS_STRF))[0]
+		self.assertEqual(
+			gtfs.loaded_tables, ["services", "stop_times", "stops", "trips"]
+		)
+
+		self.assertIs(trip.shape, gtfs.shapes[trip.shape_id])
+		self.assertIn("shapes", gtfs.loaded_tables)
+
+	def test_graph_skips_shapes(self):
+		sg = SegmentGraph(self._settings)
+		sg.build_graph()
+
+		self.assertGreater(sg.csr.n_trip_edges, 0)
+		self.assertNotIn("shapes", sg._gtfs.loaded_tables)
+
+
+class GTFS_restrict_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._feed_dir = write_feed(tmp_dir / "feed")
+		cls._settings = Settings(
+			write_settings(tmp_dir / "settings.json", cls._feed_dir)
+		)
+
+		cls._service_date = datetime.strptime(SERVICE_DATE, GTFS_STRF)
+		cls._stop_ids = [stop_id for stop_id, _, _, _ in STOPS[:3]]
+
+		cls.full = GTFS(cls._feed_dir, cls._settings, use_cache = False)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _restricted(self):
+		gtfs = GTFS(self._feed_dir, self._settings, use_cache = False)
+		gtfs.restrict(self._service_date, self._stop_ids)
+		return gtfs
+
+	def test_same_as_full_load(self):
+		gtfs = self._restricted()
+
+		for stop_id in self._stop_ids:
+			self.assertEqual(
+				[
+					(st.trip_id, int(st.departure_time))
+					for st in gtfs.get_stop_stoptimes_on_date(
+						self._service_date, stop_id
+					)
+				],
+				[
+					(st.trip_id, int(st.departure_time))
+					for st in self.full.get_stop_stoptimes_on_date(
+						self._service_date, stop_id
+					)
+				]
+			)
+
+	def test_filters(self):
+		gtfs = self._restricted()
+		full_date_trips = self.full.get_date_trips(self._service_date)
+
+		self.assertLess(len(gtfs.stop_times), len(self.full.stop_times))
+		self.assertTrue(set(gtfs.stop_times._stop_ids).issubset(self._stop_ids))
+
+		date_trip_ids = {trip.trip_id for trip in full_date_trips}
+		for trip in gtfs.get_date_trips(self._service_date):
+			self.assertIn(trip.trip_id, date_trip_ids)
+			self.assertFalse(self._settings.route_is_excluded(trip.route_id))
+
+		## Excluded routes aren't even read
+		self.assertFalse(any(
+			self._settings.route_is_excluded(route_id)
+			for route_id in gtfs._trip_columns()["route_id"]
+		))
+
+	def test_after_load(self):
+		gtfs = GTFS(self._feed_dir, self._settings, use_cache = False)
+		gtfs.get_stop(STOPS[0][0])
+		gtfs.restrict(self._service_date) ## stops alone are fine
+
+		gtfs = GTFS(self._feed_dir, self._settings, use_cache = False)
+		gtfs.stop_times
+
+		with self.assertRaises(TablesLoadedException):
+			gtfs.restrict(self._service_date, self._stop_ids)
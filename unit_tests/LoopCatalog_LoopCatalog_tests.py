@@ -0,0 +1,155 @@
+from datetime import datetime
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes import GTFS_STRF
+from src.PatrolRoutes.Duration import Minutes
+from src.PatrolRoutes.GTFSTime import GTFSTime
+from src.PatrolRoutes.Loop import SearchStatus
+from src.PatrolRoutes.LoopCatalog import LoopCatalog
+from src.PatrolRoutes.PatrolRoutes import PatrolRoutes
+from unit_tests.synthetic_feed import SERVICE_DATE, write_feed, write_settings
+
+
+class LoopCatalog_LoopCatalog_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._loops_path = tmp_dir / "loops.sqlite"
+
+		pr = PatrolRoutes(write_settings(
+			tmp_dir / "settings.json",
+			write_feed(tmp_dir / "feed"),
+			loops_path = str(cls._loops_path),
+			loop_min_segments = 3,
+			loop_max_duration_hours = 2.0
+		))
+
+		cls._loops = [
+			loop.to_json_dict() for loop in pr.generate_loops(30)
+			if loop.status == SearchStatus.FOUND
+		]
+
+		assert pr.catalog is not None
+		pr.catalog.close()
+
+		cls._catalog = LoopCatalog(cls._loops_path)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._catalog.close()
+		cls._tmp.cleanup()
+
+	def _distinct(self, loops):
+		return {
+			LoopCatalog._signature(loop_d): loop_d for loop_d in loops
+		}
+
+	def _assert_query(self, expected, **filters):
+		got = self._catalog.query(**filters)
+
+		self.assertEqual(
+			sorted(LoopCatalog._signature(loop_d) for loop_d in got),
+			sorted(self._distinct(expected))
+		)
+		self.assertEqual(
+			[int(GTFSTime.from_fstr(loop_d["departure_time"])) for loop_d in got],
+			sorted(
+				int(GTFSTime.from_fstr(loop_d["departure_time"]))
+				for loop_d in got
+			)
+		)
+
+	def test_saved_once_per_distinct_loop(self):
+		self.assertGreater(len(self._loops), 0)
+		self.assertEqual(len(self._catalog), len(self._distinct(self._loops)))
+		self._assert_query(self._loops)
+
+	def test_origin_and_start(self):
+		origin = self._loops[0]["origin_station"]
+		after = GTFSTime.from_fstr("08:00:00")
+
+		self._assert_query(
+			[
+				loop_d for loop_d in self._loops
+				if (loop_d["origin_station"] == origin)
+				and (GTFSTime.from_fstr(loop_d["departure_time"]) >= after)
+			],
+			origin_station = origin,
+			start_after = after
+		)
+
+	def test_origin_is_standardized(self):
+		origin = "Beta Av & 1st St"
+
+		self.assertEqual(
+			self._catalog.query(origin_station = origin),
+			self._catalog.query(origin_station = "1st St & Beta Av")
+		)
+
+	def test_start_window(self):
+		after = GTFSTime.from_fstr("07:00:00")
+		before = GTFSTime.from_fstr("08:40:00")
+
+		self._assert_query(
+			[
+				loop_d for loop_d in self._loops
+				if after <= GTFSTime.from_fstr(loop_d["departure_time"]) <= before
+			],
+			start_after = after,
+			start_before = before
+		)
+
+	def test_duration_and_segments(self):
+		## Every loop on the synthetic feed is the same length
+		duration = self._loops[0]["duration_seconds"]
+		n_segments = self._loops[0]["n_segments"]
+
+		self._assert_query(
+			self._loops,
+			min_duration = Minutes(duration/60),
+			max_duration = Minutes(duration/60),
+			min_segments = n_segments,
+			max_segments = n_segments
+		)
+		self._assert_query([], max_duration = Minutes(duration/60 - 1))
+		self._assert_query([], min_duration = Minutes(duration/60 + 1))
+		self._assert_query([], min_segments = n_segments + 1)
+
+	def test_routes(self):
+		self._assert_query(self._loops, routes = ["A"])
+		self._assert_query(self._loops, routes = ["B", "A"])
+		self._assert_query([], routes = ["A", "Z"])
+
+		self._assert_query(self._loops, route_set = ["C", "A", "B"])
+		self._assert_query([], route_set = ["A", "B"])
+
+	def test_service_date_and_limit(self):
+		service_date = datetime.strptime(SERVICE_DATE, GTFS_STRF)
+
+		self.assertEqual(
+			len(self._catalog.query(service_date = service_date)),
+			len(self._catalog)
+		)
+		self.assertEqual(
+			self._catalog.query(service_date = datetime(2000, 1, 1)),
+			[]
+		)
+		self.assertEqual(len(self._catalog.query(limit = 2)), 2)
+
+	def test_origin_query_uses_index(self):
+		plan = self._catalog._conn.execute(
+			"""
+			EXPLAIN QUERY PLAN SELECT loop_json FROM loops
+			WHERE origin_station = ? AND start_sec >= ?
+			""",
+			("Gamma Station", 0)
+		).fetchall()
+
+		self.assertIn("loops_origin_start", str(plan))
@@ -0,0 +1,206 @@
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.Duration import Minutes
+from src.PatrolRoutes.GTFSTime import GTFSTime
+from src.PatrolRoutes.Loop import Loop, SearchStatus
+from src.PatrolRoutes.LoopEnumerator import LoopEnumerator
+from src.PatrolRoutes.SegmentGraph import SegmentGraph
+from src.PatrolRoutes.Settings import Settings
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+def brute_force(sg, settings, roots = None):
+	"""
+	Every valid loop by plain recursion, no pruning or memoization.
+	"""
+	g = sg.csr
+
+	max_sec = int(settings.loop_max_duration)
+	min_sec = int(settings.loop_min_duration)
+	min_seg = settings.loop_min_segments
+	trip_min_sec = int(settings.trip_min_duration)
+	consec_ok = settings.allow_consecutive_same_route
+
+	loops = []
+
+	def extend(path, elapsed, routes, origin):
+		edge_id = path[-1]
+		is_trip = edge_id < g.n_trip_edges
+		src, dst = g.edge_endpoints(edge_id)
+		duration = g.edge_duration(edge_id)
+
+		if elapsed > max_sec:
+			return
+		if is_trip:
+			if duration < trip_min_sec:
+				return
+			if (not consec_ok) and (len(routes) > 1) and (routes[-1] == routes[-2]):
+				return
+
+		if (
+			is_trip and (g.node_station[dst] == origin)
+			and (elapsed >= min_sec) and (len(path) >= min_seg)
+		):
+			loops.append(tuple(path))
+			return
+
+		for nxt in g.out_edges(dst):
+			nxt = int(nxt)
+
+			if is_trip == (nxt < g.n_trip_edges):
+				continue
+
+			nxt_routes = routes
+			if nxt < g.n_trip_edges:
+				nxt_routes = routes + [g.edge_route(nxt)]
+
+			extend(path + [nxt], elapsed + g.edge_duration(nxt), nxt_routes, origin)
+
+	if roots is None:
+		roots = range(g.n_trip_edges)
+
+	for root in roots:
+		src, _ = g.edge_endpoints(root)
+		extend(
+			[root], g.edge_duration(root), [g.edge_route(root)],
+			g.node_station[src]
+		)
+
+	return loops
+
+
+class LoopEnumerator_LoopEnumerator_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		cls._feed_dir = write_feed(Path(cls._tmp.name) / "feed")
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _graph(self, name, **overrides):
+		settings = Settings(write_settings(
+			Path(self._tmp.name) / f"{name}.json",
+			self._feed_dir,
+			**overrides
+		))
+
+		sg = SegmentGraph(settings)
+		sg.build_graph()
+
+		return sg, settings
+
+	def _enumerated(self, enumerator, **filters):
+		return [tuple(loop.edge_ids) for loop in enumerator.enumerate(**filters)]
+
+	def test_matches_brute_force(self):
+		for name, overrides in [
+			("default", {}),
+			("long", {"loop_max_duration_hours": 2.0, "loop_min_segments": 5}),
+			("consecutive", {"allow_consecutive_same_route": True}),
+			("no_min", {"loop_min_duration_hours": 0.0, "loop_min_segments": 1}),
+			("long_transfers", {
+				"max_transfer_time_minutes": 40,
+				"loop_max_duration_hours": 2.5,
+				"loop_min_duration_hours": 2.0
+			})
+		]:
+			with self.subTest(name):
+				sg, settings = self._graph(name, **overrides)
+				expected = brute_force(sg, settings)
+
+				self.assertGreater(len(expected), 0)
+
+				for bucket in [Minutes(1), Minutes(30)]:
+					memoized = LoopEnumerator(sg, settings, bucket = bucket)
+					self.assertEqual(self._enumerated(memoized), expected)
+
+				plain = LoopEnumerator(sg, settings, memoize = False)
+				self.assertEqual(self._enumerated(plain), expected)
+
+				self.assertEqual(plain.n_memo_hits, 0)
+				self.assertLessEqual(memoized.n_expansions, plain.n_expansions)
+
+	def test_memo_cuts_repeated_subtrees(self):
+		## Transfers longer than the headway let different paths reach the 
+		## same state
+		sg, settings = self._graph(
+			"memo",
+			max_transfer_time_minutes = 40,
+			loop_max_duration_hours = 2.5,
+			loop_min_segments = 7
+		)
+
+		memoized = LoopEnumerator(sg, settings)
+		plain = LoopEnumerator(sg, settings, memoize = False)
+
+		self.assertEqual(self._enumerated(memoized), self._enumerated(plain))
+		self.assertGreater(memoized.n_memo_hits, 0)
+		self.assertLess(memoized.n_expansions, plain.n_expansions)
+
+	def test_random_loops_are_enumerated(self):
+		sg, settings = self._graph("random", loop_max_duration_hours = 2.0)
+
+		enumerated = set(self._enumerated(LoopEnumerator(sg, settings)))
+
+		for seed in range(10):
+			loop = Loop(1, seed, sg, settings)
+			loop.build()
+
+			if loop.status == SearchStatus.FOUND:
+				self.assertIn(tuple(loop.edge_ids), enumerated)
+
+	def test_origin_and_time_window(self):
+		sg, settings = self._graph("window")
+		g = sg.csr
+
+		after = GTFSTime.from_fstr("07:00:00")
+		before = GTFSTime.from_fstr("08:00:00")
+		origin = "Beta Av & 1st St"
+
+		roots = [
+			edge_id for edge_id in range(g.n_trip_edges)
+			if (g.station_name(g.node_station[g.edge_endpoints(edge_id)[0]])
+				== "1st St & Beta Av")
+			and (int(after) <= g.node_departure[g.edge_endpoints(edge_id)[0]]
+				<= int(before))
+		]
+
+		expected = brute_force(sg, settings, roots)
+
+		self.assertGreater(len(expected), 0)
+		self.assertEqual(
+			self._enumerated(
+				LoopEnumerator(sg, settings),
+				origin_station = origin,
+				start_after = after,
+				start_before = before
+			),
+			expected
+		)
+
+		with self.assertRaises(KeyError):
+			list(LoopEnumerator(sg, settings).enumerate("Nowhere"))
+
+	def test_loops_are_valid(self):
+		sg, settings = self._graph("valid", loop_max_duration_hours = 2.0)
+
+		for i, loop in enumerate(LoopEnumerator(sg, settings).enumerate()):
+			self.assertEqual(loop.status, SearchStatus.FOUND)
+			self.assertEqual(loop.loop_number, i)
+			self.assertEqual(loop.seed, -1)
+			self.assertTrue(loop._ll.returns_to_first_stop)
+			self.assertLessEqual(
+				loop._ll.cumulative_seconds,
+				int(settings.loop_max_duration)
+			)
+			self.assertGreaterEqual(
+				loop._ll.cumulative_seconds,
+				int(settings.loop_min_duration)
+			)
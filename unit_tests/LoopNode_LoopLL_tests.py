@@ -0,0 +1,115 @@
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.LinkedList import (
+	InvalidConnectionException, InvalidDisconnectionException
+)
+from src.PatrolRoutes.Loop import Loop, SearchStatus
+from src.PatrolRoutes.LoopNode import LoopLL, TripNode
+from src.PatrolRoutes.SegmentGraph import SegmentGraph
+from src.PatrolRoutes.Settings import Settings
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+class LoopNode_LoopLL_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._settings = Settings(write_settings(
+			tmp_dir / "settings.json",
+			write_feed(tmp_dir / "feed"),
+			loop_min_segments = 5,
+			loop_max_duration_hours = 2.0
+		))
+
+		cls._sg = SegmentGraph(cls._settings)
+		cls._sg.build_graph()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _walk(self, ll):
+		nodes = []
+
+		node = ll.root
+		while node is not None:
+			nodes.append(node)
+			node = node.next
+
+		return nodes
+
+	def test_running_totals_match_walk(self):
+		csr = self._sg.csr
+
+		for seed in range(3):
+			loop = Loop(1, seed, self._sg, self._settings)
+
+			while loop.resume(max_expansions = 1) == SearchStatus.PAUSED:
+				ll = loop._ll
+				nodes = self._walk(ll)
+
+				self.assertIs(ll.last, nodes[-1])
+				self.assertEqual(ll.n_segments, len(nodes))
+				self.assertEqual(
+					ll.cumulative_seconds,
+					sum(int(node.segment_edge.duration) for node in nodes)
+				)
+
+				routes = [
+					csr.edge_route(node.edge_id) for node in nodes
+					if isinstance(node, TripNode)
+				]
+				self.assertEqual(ll.last_route, routes[-1] if routes else -1)
+
+				self.assertEqual(
+					ll.signature,
+					Loop.from_edge_ids(
+						1, seed, self._sg, self._settings,
+						[node.edge_id for node in nodes]
+					)._ll.signature
+				)
+
+				self.assertEqual(
+					ll.returns_to_first_stop,
+					ll.first_stop.standard_stop_name
+					== ll.last_stop.standard_stop_name
+				)
+
+	def test_only_appends_at_tail(self):
+		loop = Loop(1, 0, self._sg, self._settings)
+
+		## Step until the partial loop has two segments
+		while len(loop.frontier) < 2:
+			self.assertEqual(
+				loop.resume(max_expansions = 1), SearchStatus.PAUSED
+			)
+
+		ll = loop._ll
+		nodes = self._walk(ll)
+
+		self.assertEqual(len(nodes), 2)
+
+		other = TripNode(1, 3, self._sg.csr, nodes[0].edge_id, self._settings)
+
+		with self.assertRaises(InvalidConnectionException):
+			ll.connect_nodes(nodes[0], other)
+
+		with self.assertRaises(InvalidDisconnectionException):
+			ll.disconnect_nodes(nodes[0], other)
+
+	def test_empty(self):
+		ll = LoopLL()
+
+		self.assertIsNone(ll.last)
+		self.assertEqual(ll.cumulative_seconds, 0)
+		self.assertEqual(ll.n_segments, 0)
+		self.assertEqual(ll.last_route, -1)
+		self.assertEqual(ll.signature, 0)
+		self.assertFalse(ll.returns_to_first_stop)
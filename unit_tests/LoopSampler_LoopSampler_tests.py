@@ -0,0 +1,131 @@
+from collections import Counter
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.GTFSTime import GTFSTime
+from src.PatrolRoutes.Loop import SearchStatus
+from src.PatrolRoutes.LoopEnumerator import LoopEnumerator
+from src.PatrolRoutes.LoopSampler import LoopSampler
+from src.PatrolRoutes.SegmentGraph import EdgeKind, SegmentGraph
+from src.PatrolRoutes.Settings import Settings
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+class LoopSampler_LoopSampler_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._settings = Settings(write_settings(
+			tmp_dir / "settings.json",
+			write_feed(tmp_dir / "feed"),
+			max_transfer_time_minutes = 40,
+			loop_max_duration_hours = 2.0,
+			loop_min_duration_hours = 1.5
+		))
+
+		cls._sg = SegmentGraph(cls._settings)
+		cls._sg.build_graph()
+
+		cls._loops = [
+			tuple(loop.edge_ids)
+			for loop in LoopEnumerator(cls._sg, cls._settings).enumerate()
+		]
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _draws(self, sampler, n, seed = 0, **filters):
+		return [
+			tuple(loop.edge_ids)
+			for loop in sampler.sample(n, seed, **filters)
+		]
+
+	def test_count_matches_enumeration(self):
+		sampler = LoopSampler(self._sg, self._settings)
+
+		self.assertGreater(len(self._loops), 10)
+		self.assertEqual(sampler.count(), len(self._loops))
+
+		after = GTFSTime.from_fstr("07:00:00")
+		origin = "Gamma Station"
+
+		self.assertEqual(
+			sampler.count(origin_station = origin, start_after = after),
+			len(list(LoopEnumerator(self._sg, self._settings).enumerate(
+				origin_station = origin, start_after = after
+			)))
+		)
+
+	def test_uniform(self):
+		sampler = LoopSampler(self._sg, self._settings)
+
+		n_per_loop = 200
+		draws = Counter(
+			self._draws(sampler, n_per_loop*len(self._loops), seed = 5)
+		)
+
+		self.assertEqual(set(draws), set(self._loops))
+
+		for n_draws in draws.values():
+			self.assertGreater(n_draws, 0.6*n_per_loop)
+			self.assertLess(n_draws, 1.4*n_per_loop)
+
+	def test_weighted(self):
+		csr = self._sg.csr
+
+		## Twice as likely for every walking transfer
+		def edge_weight(edge_id):
+			if csr.edge_kind(edge_id) == EdgeKind.WALKING:
+				return 2.0
+			return 1.0
+
+		sampler = LoopSampler(self._sg, self._settings, edge_weight)
+
+		weights = {}
+		for loop in LoopEnumerator(self._sg, self._settings).enumerate():
+			weight = 1.0
+			for edge_id in loop.edge_ids:
+				weight *= edge_weight(edge_id)
+			weights[tuple(loop.edge_ids)] = weight
+
+		self.assertAlmostEqual(sampler.count(), sum(weights.values()))
+		self.assertGreater(len(set(weights.values())), 1)
+
+		n = 20000
+		draws = Counter(self._draws(sampler, n, seed = 3))
+
+		for loop, weight in weights.items():
+			expected = n*weight/sampler.count()
+			self.assertGreater(draws[loop], 0.6*expected)
+			self.assertLess(draws[loop], 1.4*expected)
+
+	def test_deterministic_valid_loops(self):
+		sampler = LoopSampler(self._sg, self._settings)
+
+		loops = list(sampler.sample(10, seed = 11))
+
+		self.assertEqual(
+			[tuple(loop.edge_ids) for loop in loops],
+			self._draws(LoopSampler(self._sg, self._settings), 10, seed = 11)
+		)
+
+		for i, loop in enumerate(loops):
+			self.assertEqual(loop.loop_number, i)
+			self.assertEqual(loop.seed, 11)
+			self.assertEqual(loop.status, SearchStatus.FOUND)
+			self.assertIn(tuple(loop.edge_ids), self._loops)
+
+	def test_no_loops(self):
+		sampler = LoopSampler(self._sg, self._settings)
+
+		self.assertEqual(
+			list(sampler.sample(3, 0, start_after = GTFSTime.from_fstr("23:00:00"))),
+			[]
+		)
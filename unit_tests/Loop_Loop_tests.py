@@ -0,0 +1,365 @@
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.Duration import Seconds
+from src.PatrolRoutes.GTFSTime import GTFSTime
+from src.PatrolRoutes.Loop import Loop, SearchStatus, StopReason
+from src.PatrolRoutes.SearchStats import DeadEnd, SearchPhase
+from src.PatrolRoutes.LoopNode import (
+	_SIGNATURE_BASE, SIGNATURE_MOD, TripNode
+)
+from src.PatrolRoutes.SegmentGraph import SegmentGraph
+from src.PatrolRoutes.Settings import Settings
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+class Loop_Loop_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		feed_dir = write_feed(tmp_dir / "feed")
+
+		cls._settings = Settings(write_settings(
+			tmp_dir / "settings.json",
+			feed_dir,
+			loop_min_segments = 5,
+			loop_max_duration_hours = 2.0
+		))
+
+		cls._sg = SegmentGraph(cls._settings)
+		cls._sg.build_graph()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _built(self, seed):
+		loop = Loop(1, seed, self._sg, self._settings)
+		loop.build()
+		return loop
+
+	def test_build_finds_loop(self):
+		loop = self._built(3)
+
+		self.assertEqual(loop.status, SearchStatus.FOUND)
+		self.assertTrue(loop._ll.returns_to_first_stop)
+		self.assertGreaterEqual(
+			loop._ll.last.segment_number,
+			self._settings.loop_min_segments
+		)
+
+	def test_unbuilt(self):
+		loop = Loop(1, 3, self._sg, self._settings)
+
+		self.assertIsNone(loop._ll.root)
+
+		with self.assertRaises(RuntimeError):
+			str(loop)
+
+	def test_paused_search_matches_build(self):
+		for seed in range(5):
+			loop = Loop(1, seed, self._sg, self._settings)
+			loop.start()
+
+			n_pauses = 0
+			while loop.resume(max_expansions = 3) == SearchStatus.PAUSED:
+				n_pauses += 1
+
+			self.assertGreater(n_pauses, 0)
+			self.assertEqual(loop.n_expansions, self._built(seed).n_expansions)
+			self.assertEqual(str(loop), str(self._built(seed)))
+
+	def test_frontier_follows_partial_loop(self):
+		loop = Loop(1, 3, self._sg, self._settings)
+
+		self.assertEqual(loop.resume(max_expansions = 4), SearchStatus.PAUSED)
+
+		frontier = loop.frontier
+
+		self.assertGreater(len(frontier), 0)
+		self.assertIs(frontier[0].node, loop._ll.root)
+		self.assertIsInstance(frontier[0].node, TripNode)
+
+		for frame, nxt_frame in zip(frontier, frontier[1:]):
+			self.assertIs(frame.node.next, nxt_frame.node)
+			self.assertEqual(
+				nxt_frame.node.segment_number,
+				frame.node.segment_number + 1
+			)
+
+	def test_pruning_keeps_outcome(self):
+		for seed in range(5):
+			pruned = self._built(seed)
+
+			unpruned = Loop(1, seed, self._sg, self._settings, prune = False)
+			unpruned.build()
+
+			self.assertEqual(pruned.status, unpruned.status)
+			self.assertLessEqual(pruned.n_expansions, unpruned.n_expansions)
+			self.assertLessEqual(
+				pruned._ll.cumulative_seconds,
+				int(self._settings.loop_max_duration)
+			)
+
+	def test_exhausted(self):
+		settings = Settings(write_settings(
+			Path(self._tmp.name) / "impossible_settings.json",
+			self._settings.gtfs_path,
+			loop_min_duration_hours = 1.0,
+			loop_max_duration_hours = 0.75
+		))
+
+		sg = SegmentGraph(settings)
+		sg.build_graph()
+
+		loop = Loop(1, 0, sg, settings)
+		loop.build()
+
+		self.assertEqual(loop.status, SearchStatus.EXHAUSTED)
+		self.assertEqual(loop.frontier, [])
+		self.assertEqual(loop.resume(), SearchStatus.EXHAUSTED)
+
+	def test_signature(self):
+		loops = [self._built(seed) for seed in range(20)]
+		found = [loop for loop in loops if loop.status == SearchStatus.FOUND]
+
+		self.assertGreater(len(found), 0)
+
+		for loop in found:
+			expected = 0
+			for edge_id in loop.edge_ids:
+				expected = (
+					expected*_SIGNATURE_BASE + edge_id + 1
+				) % SIGNATURE_MOD
+
+			self.assertEqual(loop.get_signature(), expected)
+			self.assertLess(loop.get_signature().bit_length(), 128)
+
+			rebuilt = Loop.from_edge_ids(
+				7, loop.seed, self._sg, self._settings, loop.edge_ids
+			)
+
+			self.assertEqual(rebuilt.get_signature(), loop.get_signature())
+			self.assertEqual(rebuilt, loop)
+			self.assertEqual(hash(rebuilt), hash(loop))
+
+		self.assertEqual(
+			len(set(found)),
+			len(set(tuple(loop.edge_ids) for loop in found))
+		)
+
+	def test_start_restrictions(self):
+		g = self._sg.csr
+		origin = "Gamma Station"
+		after = GTFSTime.from_fstr("07:00:00")
+		before = GTFSTime.from_fstr("07:30:00")
+
+		n_found = 0
+
+		for seed in range(10):
+			loop = Loop(
+				1, seed, self._sg, self._settings, origin_station = origin,
+				start_after = after, start_before = before
+			)
+			loop.build()
+
+			again = Loop(
+				1, seed, self._sg, self._settings, origin_station = origin,
+				start_after = after, start_before = before
+			)
+			again.build()
+			self.assertEqual(loop.edge_ids, again.edge_ids)
+
+			if loop.status != SearchStatus.FOUND:
+				continue
+			n_found += 1
+
+			src, _ = g.edge_endpoints(loop.edge_ids[0])
+			self.assertEqual(g.station_name(g.node_station[src]), origin)
+			self.assertGreaterEqual(g.node_departure[src], int(after))
+			self.assertLessEqual(g.node_departure[src], int(before))
+
+		self.assertGreater(n_found, 0)
+
+		with self.assertRaises(KeyError):
+			Loop(1, 0, self._sg, self._settings, origin_station = "Nowhere")
+
+	def test_no_start_edges(self):
+		loop = Loop(
+			1, 0, self._sg, self._settings,
+			start_after = GTFSTime.from_fstr("23:00:00")
+		)
+
+		self.assertEqual(loop.resume(), SearchStatus.EXHAUSTED)
+		self.assertEqual(loop.n_expansions, 0)
+
+	def _is_partial_loop(self, edge_ids):
+		g = self._sg.csr
+
+		for edge_id, nxt_edge_id in zip(edge_ids, edge_ids[1:]):
+			self.assertEqual(
+				g.edge_endpoints(edge_id)[1], g.edge_endpoints(nxt_edge_id)[0]
+			)
+
+	def test_search_budget(self):
+		for seed in range(5):
+			built = self._built(seed)
+			budget = built.n_expansions - 1
+
+			loop = Loop(1, seed, self._sg, self._settings)
+
+			self.assertEqual(
+				loop.search(max_expansions = budget), StopReason.MAX_EXPANSIONS
+			)
+			self.assertEqual(loop.status, SearchStatus.PAUSED)
+			self.assertEqual(loop.n_expansions, budget)
+			self.assertGreater(len(loop.best_partial), 0)
+			self._is_partial_loop(loop.best_partial)
+
+			self.assertEqual(loop.search(), StopReason.FOUND)
+			self.assertEqual(loop.stop_reason, StopReason.FOUND)
+			self.assertEqual(loop.edge_ids, built.edge_ids)
+			self.assertEqual(loop.best_partial, built.edge_ids)
+			self.assertEqual(loop.n_expansions, built.n_expansions)
+
+	def test_search_time_limit(self):
+		settings = Settings(write_settings(
+			Path(self._tmp.name) / "slow_settings.json",
+			self._settings.gtfs_path,
+			loop_min_segments = 41,
+			loop_max_duration_hours = 4.0,
+			allow_consecutive_same_route = False
+		))
+
+		sg = SegmentGraph(settings)
+		sg.build_graph()
+
+		loop = Loop(1, 0, sg, settings)
+
+		self.assertEqual(
+			loop.build(time_limit = Seconds(0)), StopReason.TIME_LIMIT
+		)
+		self.assertEqual(loop.status, SearchStatus.PAUSED)
+		self.assertGreater(loop.n_expansions, 0)
+		self.assertGreater(len(loop.best_partial), 0)
+		self.assertEqual(loop.to_json_dict()["stop_reason"], "TIME_LIMIT")
+
+		## The tighter budget wins
+		loop.start()
+		self.assertEqual(
+			loop.search(max_expansions = 10, time_limit = Seconds(60)),
+			StopReason.MAX_EXPANSIONS
+		)
+		self.assertEqual(loop.n_expansions, 10)
+
+	def test_rebuilt_partial(self):
+		loop = Loop(1, 3, self._sg, self._settings)
+		loop.search(max_expansions = 6)
+
+		rebuilt = Loop.from_edge_ids(
+			1, 3, self._sg, self._settings, loop.best_partial,
+			stop_reason = loop.stop_reason
+		)
+
+		self.assertEqual(rebuilt.status, SearchStatus.PAUSED)
+		self.assertEqual(rebuilt.stop_reason, StopReason.MAX_EXPANSIONS)
+		self.assertEqual(rebuilt.best_partial, loop.best_partial)
+
+		self.assertEqual(rebuilt.resume(), SearchStatus.FOUND)
+		self.assertEqual(rebuilt.edge_ids, self._built(3).edge_ids)
+
+	def _check_stats(self, loop):
+		stats = loop.stats
+		n_dead = sum(stats.dead_ends.values())
+
+		self.assertEqual(stats.n_expansions, loop.n_expansions)
+		self.assertEqual(sum(stats.dead_ends_by_station.values()), n_dead)
+		self.assertGreaterEqual(stats.max_depth, len(loop.frontier))
+
+		## Every expanded node is a dead end, backtracked from, still on the
+		## stack, or the end of the loop
+		self.assertEqual(
+			stats.n_expansions,
+			n_dead + stats.n_backtracks + len(loop.frontier)
+			+ (1 if loop.status == SearchStatus.FOUND else 0)
+		)
+
+		self.assertGreater(stats.search_seconds, 0)
+		self.assertLessEqual(
+			sum(stats.phase_seconds.values()), stats.search_seconds
+		)
+
+	def test_instrumentation(self):
+		dead_ends = {dead_end: 0 for dead_end in DeadEnd}
+
+		for seed in range(5):
+			plain = self._built(seed)
+			self.assertIsNone(plain.stats)
+
+			loop = Loop(1, seed, self._sg, self._settings)
+
+			calls = []
+			stats = loop.instrument(
+				progress = lambda stats: calls.append(stats.n_expansions),
+				progress_every = 5
+			)
+			loop.build()
+
+			self.assertIs(loop.stats, stats)
+			self.assertEqual(loop.edge_ids, plain.edge_ids)
+			self.assertEqual(stats.n_starts, loop._next_root)
+			self.assertEqual(
+				calls, list(range(5, loop.n_expansions + 1, 5))
+			)
+			self._check_stats(loop)
+
+			stats_d = stats.to_json_dict()
+			self.assertEqual(stats_d["n_expansions"], loop.n_expansions)
+			self.assertEqual(
+				set(stats_d["dead_ends"]), {dead_end.name for dead_end in DeadEnd}
+			)
+			self.assertEqual(
+				set(stats_d["phase_seconds"]), {phase.name for phase in SearchPhase}
+			)
+
+			for dead_end, count in stats.dead_ends.items():
+				dead_ends[dead_end] += count
+
+			loop.start()
+			self.assertEqual(stats.n_expansions, 0)
+			self.assertEqual(stats.dead_ends_by_station, {})
+
+		self.assertGreater(dead_ends[DeadEnd.SHORT_TRIP], 0)
+		self.assertGreater(dead_ends[DeadEnd.CANNOT_RETURN], 0)
+
+	def test_instrumentation_dead_ends(self):
+		settings = Settings(write_settings(
+			Path(self._tmp.name) / "impossible_settings.json",
+			self._settings.gtfs_path,
+			loop_min_duration_hours = 1.0,
+			loop_max_duration_hours = 0.75
+		))
+
+		sg = SegmentGraph(settings)
+		sg.build_graph()
+
+		loop = Loop(1, 0, sg, settings)
+		stats = loop.instrument()
+
+		self.assertEqual(loop.search(max_expansions = 50), StopReason.MAX_EXPANSIONS)
+		self._check_stats(loop)
+
+		self.assertEqual(loop.search(), StopReason.EXHAUSTED)
+		self._check_stats(loop)
+
+		self.assertEqual(stats.n_starts, sg.csr.n_trip_edges)
+		self.assertGreater(stats.dead_ends[DeadEnd.CANNOT_RETURN], 0)
+
+		by_station = list(stats.dead_ends_by_station.values())
+		self.assertEqual(by_station, sorted(by_station, reverse = True))
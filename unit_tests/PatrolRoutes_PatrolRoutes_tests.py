@@ -0,0 +1,305 @@
+import contextlib
+import gc
+import io
+import json
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+import weakref
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.Loop import Loop, SearchStatus, StopReason
+from src.PatrolRoutes.PatrolRoutes import PatrolRoutes
+from src.PatrolRoutes.__main__ import main
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+class PatrolRoutes_generate_loops_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._pr = PatrolRoutes(write_settings(
+			tmp_dir / "settings.json",
+			write_feed(tmp_dir / "feed"),
+			loop_min_segments = 5,
+			loop_max_duration_hours = 2.0
+		))
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _by_seed(self, loops):
+		return {loop.seed: loop for loop in loops}
+
+	def test_parallel_matches_serial(self):
+		seeds = [3, 11, 0, 7, 42, 5]
+
+		serial = self._by_seed(self._pr.generate_loops(len(seeds), seeds))
+		parallel = self._by_seed(
+			self._pr.generate_loops(len(seeds), seeds, workers = 3)
+		)
+
+		self.assertEqual(sorted(parallel), sorted(seeds))
+
+		for seed in seeds:
+			self.assertEqual(parallel[seed].status, serial[seed].status)
+			self.assertEqual(parallel[seed].edge_ids, serial[seed].edge_ids)
+			self.assertEqual(
+				parallel[seed].loop_number,
+				serial[seed].loop_number
+			)
+
+			if serial[seed].status == SearchStatus.FOUND:
+				self.assertEqual(str(parallel[seed]), str(serial[seed]))
+
+	def test_matches_single_build(self):
+		loops = list(self._pr.generate_loops(2, workers = 2))
+
+		for loop in loops:
+			built = Loop(
+				loop.loop_number, loop.seed, self._pr._sg, self._pr._s
+			)
+			built.build()
+
+			self.assertEqual(loop.edge_ids, built.edge_ids)
+
+		self.assertEqual(self._pr._loop_d, {})
+
+	def test_distinct(self):
+		seeds = list(range(40))
+
+		all_loops = [
+			loop for loop in self._pr.generate_loops(len(seeds), seeds)
+			if loop.status == SearchStatus.FOUND
+		]
+		n_distinct = len(set(tuple(loop.edge_ids) for loop in all_loops))
+
+		self.assertLess(n_distinct, len(all_loops))
+
+		for workers in [1, 3]:
+			loops = [
+				loop for loop in self._pr.generate_loops(
+					len(seeds), seeds, workers, distinct = True
+				)
+				if loop.status == SearchStatus.FOUND
+			]
+
+			self.assertEqual(len(loops), n_distinct)
+			self.assertEqual(len(set(loops)), n_distinct)
+
+	def test_distinct_keeps_no_loops(self):
+		seeds = list(range(40))
+
+		for workers in [1, 3]:
+			with self.subTest(workers = workers):
+				refs = []
+
+				for loop in self._pr.generate_loops(
+					len(seeds), seeds, workers, distinct = True
+				):
+					refs.append(weakref.ref(loop))
+
+				del loop
+				gc.collect()
+
+				self.assertGreater(len(refs), 0)
+				self.assertTrue(all(ref() is None for ref in refs))
+
+	def test_budget(self):
+		seeds = list(range(10))
+
+		serial = self._by_seed(
+			self._pr.generate_loops(len(seeds), seeds, max_expansions = 20)
+		)
+		parallel = self._by_seed(self._pr.generate_loops(
+			len(seeds), seeds, workers = 3, max_expansions = 20
+		))
+
+		reasons = {loop.stop_reason for loop in serial.values()}
+		self.assertIn(StopReason.FOUND, reasons)
+		self.assertIn(StopReason.MAX_EXPANSIONS, reasons)
+
+		for seed in seeds:
+			self.assertEqual(parallel[seed].status, serial[seed].status)
+			self.assertEqual(
+				parallel[seed].stop_reason, serial[seed].stop_reason
+			)
+			self.assertEqual(
+				parallel[seed].best_partial, serial[seed].best_partial
+			)
+
+			if serial[seed].stop_reason == StopReason.MAX_EXPANSIONS:
+				self.assertEqual(serial[seed].status, SearchStatus.PAUSED)
+				self.assertLessEqual(serial[seed].n_expansions, 20)
+
+	def test_too_few_seeds(self):
+		with self.assertRaises(ValueError):
+			list(self._pr.generate_loops(3, [1, 2]))
+
+
+class PatrolRoutes_segment_graph_path_tests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(self._tmp.name)
+
+		self._sg_path = tmp_dir / "sg.pickle"
+		self._feed_dir = write_feed(tmp_dir / "feed")
+
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def _settings_path(self, **overrides):
+		return write_settings(
+			Path(self._tmp.name) / "settings.json",
+			self._feed_dir,
+			segment_graph_path = str(self._sg_path),
+			loop_min_segments = 5,
+			loop_max_duration_hours = 2.0,
+			**overrides
+		)
+
+	def test_build_save_load(self):
+		for implicit in [False, True]:
+			with self.subTest(implicit_trip_edges = implicit):
+				self._sg_path.unlink(missing_ok = True)
+				settings_path = self._settings_path(
+					implicit_trip_edges = implicit
+				)
+
+				## At the default recursion limit
+				self.assertLessEqual(sys.getrecursionlimit(), 1000)
+
+				built = PatrolRoutes(settings_path)
+				self.assertTrue(self._sg_path.exists())
+
+				loaded = PatrolRoutes(settings_path)
+
+				for pr in [built, loaded]:
+					self.assertTrue(pr._sg._compacted)
+					self.assertEqual(pr._sg._edges, {})
+					self.assertTrue(all(
+						(len(node.nxt_edges) == 0) and (len(node.prv_edges) == 0)
+						for node in pr._sg._stoptime_nodes.values()
+					))
+
+				self.assertEqual(
+					loaded._sg.edge_names, built._sg.edge_names
+				)
+				self.assertEqual(
+					[loop.edge_ids for loop in loaded.generate_loops(3)],
+					[loop.edge_ids for loop in built.generate_loops(3)]
+				)
+
+
+class PatrolRoutes_batch_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._settings_path = write_settings(
+			tmp_dir / "settings.json",
+			write_feed(tmp_dir / "feed"),
+			loop_min_segments = 5,
+			loop_max_duration_hours = 2.0
+		)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _run(self, *args):
+		out_path = Path(self._tmp.name) / "loops.jsonl"
+
+		with contextlib.redirect_stderr(io.StringIO()):
+			self.assertEqual(
+				main([str(self._settings_path), "-o", str(out_path), *args]),
+				0
+			)
+
+		with open(out_path, 'r') as f:
+			return [json.loads(line) for line in f]
+
+	def test_one_line_per_seed(self):
+		loops = self._run("-n", "4", "--seed-start", "10", "-w", "2")
+
+		self.assertEqual(
+			sorted(loop["seed"] for loop in loops),
+			[10, 11, 12, 13]
+		)
+		self.assertTrue(all(loop["text"] is None for loop in loops))
+
+	def test_steps(self):
+		loops = [
+			loop for loop in self._run("-n", "3", "--text")
+			if loop["status"] == SearchStatus.FOUND.name
+		]
+
+		self.assertGreater(len(loops), 0)
+
+		for loop in loops:
+			steps = loop["steps"]
+
+			self.assertEqual(len(steps), loop["n_segments"])
+			self.assertEqual(
+				[step["segment_number"] for step in steps],
+				list(range(1, len(steps) + 1))
+			)
+			self.assertEqual(
+				sum(step["duration_seconds"] for step in steps),
+				loop["duration_seconds"]
+			)
+			self.assertEqual(
+				[step["route_id"] for step in steps if step["kind"] == "trip"],
+				loop["route_ids"]
+			)
+			self.assertEqual(steps[0]["departure_time"], loop["departure_time"])
+			self.assertEqual(steps[-1]["arrival_time"], loop["arrival_time"])
+			self.assertIn(loop["start_stop_name"], loop["text"])
+
+			for step, nxt_step in zip(steps, steps[1:]):
+				self.assertNotEqual(
+					step["kind"] == "trip",
+					nxt_step["kind"] == "trip"
+				)
+
+			for step in steps:
+				if step["kind"] == "trip":
+					self.assertGreater(step["n_stops"], 0)
+					self.assertIsNotNone(step["trip_id"])
+				elif step["kind"] == "walk":
+					self.assertGreaterEqual(step["distance_miles"], 0.0)
+				else:
+					self.assertEqual(step["kind"], "wait")
+					self.assertEqual(step["from_stop_id"], step["to_stop_id"])
+
+	def test_budget(self):
+		loops = self._run("-n", "10", "--max-expansions", "20")
+
+		self.assertEqual(len(loops), 10)
+		self.assertEqual(
+			{loop["stop_reason"] for loop in loops},
+			{StopReason.FOUND.name, StopReason.MAX_EXPANSIONS.name}
+		)
+
+		for loop in loops:
+			if loop["stop_reason"] == StopReason.MAX_EXPANSIONS.name:
+				self.assertEqual(loop["status"], SearchStatus.PAUSED.name)
+				self.assertEqual(loop["steps"], [])
+
+	def test_stdout(self):
+		out = io.StringIO()
+
+		with contextlib.redirect_stdout(out), \
+			contextlib.redirect_stderr(io.StringIO()):
+			main([str(self._settings_path), "-n", "2"])
+
+		lines = out.getvalue().splitlines()
+
+		self.assertEqual(len(lines), 2)
+		self.assertEqual([json.loads(line)["seed"] for line in lines], [0, 1])
@@ -1,5 +1,7 @@
 from pathlib import Path
+import numpy as np
 import sys
+import tempfile
 import unittest
 
 sys.path.insert(0, "../")
@@ -367,4 +369,78 @@ class PolygonBoundary_PolygonBoundary_tests(unittest.TestCase):
 		self.assertEqual(
 			round(hseg.get_angle_with(point3), 2),
 			-135.00
-		)
\ No newline at end of file
+		)
+
+
+## Concave "C" shape opening east, with horizontal and vertical edges
+C_SHAPE_TXT = """32.80, -117.20 # northwest
+32.80, -117.05 # northeast
+32.77, -117.05
+32.77, -117.15 # inner northwest
+32.73, -117.14 # inner southwest, slanted edge
+32.73, -117.05
+32.70, -117.06 # southeast, slanted edge
+32.70, -117.20 # southwest
+"""
+
+
+class PolygonBoundary_contains_many_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		path = Path(cls._tmp.name) / "c_shape.txt"
+
+		with open(path, 'w') as f:
+			f.write(C_SHAPE_TXT)
+
+		cls._pb = PolygonBoundary(path)
+
+		rng = np.random.default_rng(7)
+		cls._coords = np.column_stack((
+			rng.uniform(32.65, 32.85, 2000),
+			rng.uniform(-117.25, -117.00, 2000)
+		))
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _ray_crossings(self, point):
+		ray = self._pb._get_horizontal_ray(point)
+
+		return sum(
+			1 for line in self._pb._p.iter_lines() if ray.intersects(line)
+		)
+
+	def test_matches_ray_intersections(self):
+		inside = self._pb.contains_many(self._coords)
+
+		for (lat, lon), is_inside in zip(self._coords, inside):
+			n_intersects = self._ray_crossings(Point((lat, lon)))
+
+			self.assertEqual(is_inside, n_intersects % 2 == 1)
+
+	def test_known_points(self):
+		self.assertTrue(self._pb.contains(Point((32.79, -117.10)))) ## top arm
+		self.assertTrue(self._pb.contains(Point((32.75, -117.18)))) ## spine
+		self.assertFalse(self._pb.contains(Point((32.75, -117.10)))) ## mouth
+		self.assertFalse(self._pb.contains(Point((32.90, -117.10)))) ## north of bbox
+
+		## Ray passes through the (32.77, -117.05) and (32.73, -117.05) vertices
+		self.assertTrue(self._pb.contains(Point((32.77, -117.18))))
+		self.assertTrue(self._pb.contains(Point((32.73, -117.18))))
+
+	def test_points_and_array_agree(self):
+		points = [Point((lat, lon)) for lat, lon in self._coords[:100]]
+
+		self.assertEqual(
+			self._pb.contains_many(points).tolist(),
+			self._pb.contains_many(self._coords[:100]).tolist()
+		)
+		self.assertEqual(
+			[self._pb.contains(pt) for pt in points],
+			self._pb.contains_many(points).tolist()
+		)
+
+	def test_empty(self):
+		self.assertEqual(len(self._pb.contains_many([])), 0)
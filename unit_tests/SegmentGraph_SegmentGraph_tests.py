@@ -2,6 +2,7 @@ from datetime import datetime
 from pathlib import Path
 import numpy as np
 import sys
+import tempfile
 import unittest
 
 
@@ -11,8 +12,11 @@ from src.PatrolRoutes.Duration import BaseDuration, Hours, Minutes, Seconds
 from src.PatrolRoutes.Loop import Loop
 from src.PatrolRoutes.PolygonBoundary import PolygonBoundary
 from src.PatrolRoutes.Settings import Settings
-from src.PatrolRoutes.SegmentGraph import Boundary, SegmentGraph
+from src.PatrolRoutes.SegmentGraph import (
+	Boundary, EdgeKind, SegmentGraph, TransferEdge
+)
 from src.PatrolRoutes.Utils import Point
+from unit_tests.synthetic_feed import write_boundary, write_feed, write_settings
 
 
 
@@ -78,4 +82,292 @@ class SegmentGraph_SegmentGraph_tests(unittest.TestCase):
 			_ = input("build next loop?")
 
 	def test_placeholder(self):
-		self.assertEqual(1, 1)
\ No newline at end of file
+		self.assertEqual(1, 1)
+
+class SegmentGraph_build_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		feed_dir = write_feed(tmp_dir / "feed")
+
+		## Route B trip leaving Beta on a half minute
+		with open(feed_dir / "trips.txt", 'a') as f:
+			f.write("B,WKDY,5000,Gamma,0,shp_B,Forward\n")
+
+		with open(feed_dir / "stop_times.txt", 'a') as f:
+			f.write("5000,06:18:30,06:18:30,3,1,1\n")
+			f.write("5000,06:30:30,06:30:30,4,2,1\n")
+
+		cls._settings = Settings(write_settings(
+			tmp_dir / "settings.json",
+			feed_dir,
+			boundary_path = write_boundary(tmp_dir / "boundary.txt")
+		))
+
+		cls._sg = SegmentGraph(cls._settings)
+		cls._sg.build_graph()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _transfer_names(self):
+		return set(
+			name for name, edge in self._sg.edges.items()
+			if isinstance(edge, TransferEdge)
+		)
+
+	def test_walking_transfer_window(self):
+		names = self._transfer_names()
+
+		## A arrives at Beta 06:12, B leaves across the street at 06:20
+		self.assertIn("transfer_start-1000_2_4_end-2001_3_1", names)
+
+		## 06:05 is before the arrival, 06:35 is past the 15 minute limit
+		self.assertNotIn("transfer_start-1000_2_4_end-2000_3_1", names)
+		self.assertNotIn("transfer_start-1000_2_4_end-2002_3_1", names)
+
+	def test_off_minute_departure(self):
+		self.assertIn(
+			"transfer_start-1000_2_4_end-5000_3_1",
+			self._transfer_names()
+		)
+
+	def test_transfers_respect_time_limits(self):
+		for edge in self._sg.edges.values():
+			if isinstance(edge, TransferEdge):
+				self.assertGreaterEqual(edge.duration, self._settings.min_transfer_time)
+				self.assertLessEqual(edge.duration, self._settings.max_transfer_time)
+
+	def test_trip_edges(self):
+		trip_edge_names = set(edge.name for edge in self._sg.trip_edges)
+
+		self.assertIn("trip-1000_start-1000_1_1_end-1000_2_4", trip_edge_names)
+		self.assertNotIn("trip-1000_start-1000_2_4_end-1000_1_1", trip_edge_names)
+
+		## Route X is excluded in settings
+		self.assertFalse(any(
+			edge.trip.route_id == "X" for edge in self._sg.trip_edges
+		))
+
+	def test_csr_matches_edge_dicts(self):
+		csr = self._sg.csr
+
+		self.assertEqual(csr.n_edges, len(self._sg.edges))
+
+		for node_id in range(csr.n_nodes):
+			node = csr.node(node_id)
+
+			self.assertEqual(
+				[csr.edge_name(int(eid)) for eid in csr.out_edges(node_id)],
+				list(node.nxt_edges.keys())
+			)
+			self.assertEqual(
+				sorted(csr.edge_name(int(eid)) for eid in csr.in_edges(node_id)),
+				sorted(node.prv_edges.keys())
+			)
+
+		self.assertEqual(
+			[csr.edge_name(int(eid)) for eid in csr.trip_edge_ids],
+			[edge.name for edge in self._sg.trip_edges]
+		)
+
+	def test_csr_edge_columns(self):
+		csr = self._sg.csr
+
+		for eid, edge in enumerate(self._sg.edges.values()):
+			self.assertEqual(int(csr.edge_duration(eid)), int(edge.duration))
+
+			if isinstance(edge, TransferEdge):
+				self.assertEqual(csr.edge_trip(eid), -1)
+				self.assertEqual(
+					csr.edge_kind(eid),
+					EdgeKind.WAITING
+					if edge.prv_node.stop.stop_id == edge.nxt_node.stop.stop_id
+					else EdgeKind.WALKING
+				)
+			else:
+				self.assertEqual(csr.edge_kind(eid), EdgeKind.TRIP)
+				self.assertEqual(
+					csr.route_id(csr.edge_route(eid)),
+					edge.trip.route_id
+				)
+
+	def test_loop_meets_constraints(self):
+		loop = Loop(1, 49, self._sg, self._settings)
+		loop.build()
+
+		ll = loop._ll
+		last = ll.last
+
+		self.assertIsNotNone(last)
+		self.assertTrue(ll.returns_to_first_stop)
+		self.assertGreaterEqual(last.segment_number, self._settings.loop_min_segments)
+		self.assertGreaterEqual(ll.cumulative_duration, self._settings.loop_min_duration)
+		self.assertLessEqual(ll.cumulative_duration, self._settings.loop_max_duration)
+
+		self.assertIn("Loop 1", str(loop))
+
+	def test_compact(self):
+		sg = SegmentGraph(self._settings)
+		sg.build_graph()
+
+		trip_edge_names = [edge.name for edge in sg.trip_edges]
+		edge_names = sg.edge_names
+
+		sg.compact()
+
+		self.assertEqual([edge.name for edge in sg.trip_edges], trip_edge_names)
+		self.assertEqual(sg.edge_names, edge_names)
+
+		compact_loop = Loop(1, 49, sg, self._settings)
+		compact_loop.build()
+
+		loop = Loop(1, 49, self._sg, self._settings)
+		loop.build()
+
+		self.assertEqual(str(compact_loop), str(loop))
+
+	def test_earliest_return_matches_brute_force(self):
+		csr = self._sg.csr
+
+		for origin in range(csr.n_stations):
+			memo = {}
+
+			def brute_force(node_id):
+				if node_id not in memo:
+					best = csr.UNREACHABLE
+
+					for eid in csr.out_edges(node_id):
+						_, nxt = csr.edge_endpoints(int(eid))
+
+						if (
+							(csr.edge_kind(int(eid)) == EdgeKind.TRIP)
+							and (csr.node_station[nxt] == origin)
+						):
+							best = min(best, int(csr.node_departure[nxt]))
+
+						best = min(best, brute_force(nxt))
+
+					memo[node_id] = best
+
+				return memo[node_id]
+
+			bound = csr.earliest_return(origin)
+
+			self.assertEqual(
+				bound.tolist(),
+				[brute_force(node_id) for node_id in range(csr.n_nodes)]
+			)
+			self.assertIs(csr.earliest_return(origin), bound)
+
+	def test_trip_edges_from(self):
+		csr = self._sg.csr
+
+		sources = csr.trip_edge_sources()
+		deps = csr.node_departure[sources]
+		stations = csr.node_station[sources]
+
+		self.assertEqual(
+			csr.trip_edges_from().to_array().tolist(),
+			csr.trip_edge_ids.tolist()
+		)
+
+		windows = [
+			(None, None),
+			(7*3600, None),
+			(None, 7*3600),
+			(6*3600 + 19*60, 7*3600 + 4*60), ## departures at both ends
+			(23*3600, None)
+		]
+
+		for origin in [None] + list(range(csr.n_stations)):
+			for after, before in windows:
+				with self.subTest(origin = origin, after = after, before = before):
+					keep = np.ones(csr.n_trip_edges, dtype = bool)
+					if origin is not None:
+						keep &= stations == origin
+					if after is not None:
+						keep &= deps >= after
+					if before is not None:
+						keep &= deps <= before
+
+					expected = np.flatnonzero(keep).tolist()
+					found = csr.trip_edges_from(origin, after, before)
+
+					self.assertEqual(len(found), len(expected))
+					self.assertEqual(found.to_array().tolist(), expected)
+					self.assertEqual(
+						[found.edge_id(k) for k in range(len(found))],
+						expected
+					)
+
+	def test_implicit_trip_edges(self):
+		settings = Settings(write_settings(
+			Path(self._tmp.name) / "implicit_settings.json",
+			self._settings.gtfs_path,
+			boundary_path = self._settings.boundary_path,
+			implicit_trip_edges = True
+		))
+
+		sg = SegmentGraph(settings)
+		sg.build_graph()
+
+		## Only transfers are stored as Edge objects
+		self.assertTrue(all(
+			isinstance(edge, TransferEdge) for edge in sg._edges.values()
+		))
+
+		self.assertEqual(
+			[edge.name for edge in sg.trip_edges],
+			[edge.name for edge in self._sg.trip_edges]
+		)
+		self.assertEqual(sg.edge_names, self._sg.edge_names)
+
+		csr = sg.csr
+
+		for node_id in range(csr.n_nodes):
+			self.assertEqual(
+				[csr.edge_name(int(eid)) for eid in csr.out_edges(node_id)],
+				list(self._sg.csr.node(node_id).nxt_edges.keys())
+			)
+
+		implicit_loop = Loop(1, 49, sg, settings)
+		implicit_loop.build()
+
+		loop = Loop(1, 49, self._sg, self._settings)
+		loop.build()
+
+		self.assertEqual(str(implicit_loop), str(loop))
+
+	def test_filtered_load(self):
+		settings = Settings(write_settings(
+			Path(self._tmp.name) / "filtered_settings.json",
+			self._settings.gtfs_path,
+			boundary_path = self._settings.boundary_path,
+			filtered_load = True
+		))
+
+		sg = SegmentGraph(settings)
+		sg.build_graph()
+
+		self.assertTrue(sg._gtfs.is_restricted)
+		self.assertLess(
+			len(sg._gtfs.stop_times), len(self._sg._gtfs.stop_times)
+		)
+
+		self.assertEqual(sg.edge_names, self._sg.edge_names)
+		self.assertEqual(
+			[edge.name for edge in sg.trip_edges],
+			[edge.name for edge in self._sg.trip_edges]
+		)
+
+		filtered_loop = Loop(1, 49, sg, settings)
+		filtered_loop.build()
+
+		loop = Loop(1, 49, self._sg, self._settings)
+		loop.build()
+
+		self.assertEqual(str(filtered_loop), str(loop))
@@ -1,4 +1,5 @@
 from pathlib import Path
+import numpy as np
 import sys
 import unittest
 
@@ -8,6 +9,7 @@ sys.path.insert(0, "../")
 from src.PatrolRoutes.GTFS import GTFS
 from src.PatrolRoutes.SegmentGraph import Boundary, WalkingTransfers
 from src.PatrolRoutes.PolygonBoundary import PolygonBoundary
+from src.PatrolRoutes.Stops import Stop
 from src.PatrolRoutes.Utils import Point
 
 
@@ -49,4 +51,46 @@ class SegmentGraph_WalkingTransfers_tests(unittest.TestCase):
 	#	)
 	#
 	#	with self.assertWarns(Warning):
-	#		WalkingTransfers.load("examples/wt_hc-np.pickle", bad_boundary)
\ No newline at end of file
+	#		WalkingTransfers.load("examples/wt_hc-np.pickle", bad_boundary)
+
+class SegmentGraph_WalkingTransfers_grid_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		rng = np.random.default_rng(49)
+
+		cls._stops = [
+			Stop(
+				i,
+				f"Stop {i}",
+				Point((32.70 + rng.random()*0.05, -117.20 + rng.random()*0.05)),
+				[]
+			)
+			for i in range(300)
+		]
+
+		cls._max_dist = 0.15
+
+		cls._wt = WalkingTransfers(cls._stops, None, cls._max_dist)
+
+	def test_matches_all_pairs(self):
+		for i, stop1 in enumerate(self._stops):
+			for stop2 in self._stops[i+1:]:
+				dist = stop1.stop_point.distance_to(stop2.stop_point)
+
+				if dist <= self._max_dist:
+					self.assertAlmostEqual(
+						self._wt.get_transfer(stop1, stop2),
+						dist
+					)
+					self.assertAlmostEqual(
+						self._wt.get_transfer(stop2, stop1),
+						dist
+					)
+				else:
+					self.assertIsNone(self._wt.get_transfer(stop1, stop2))
+
+	def test_waiting_transfer(self):
+		self.assertEqual(
+			self._wt.get_transfer(self._stops[0], self._stops[0]),
+			0.0
+		)
@@ -0,0 +1,99 @@
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.GTFSTime import GTFSTime as GT
+from src.PatrolRoutes.StopTimes import StopTimes
+
+
+STOP_TIMES_TXT = """trip_id,arrival_time,departure_time,stop_id,stop_sequence,stop_headsign,pickup_type,drop_off_type,shape_dist_traveled,timepoint
+20,08:10:00,08:10:00,3,3,,0,0,,1
+10,07:00:00,07:00:00,1,1,,0,0,,1
+10,07:05:00,07:06:00,2,2,,0,0,,0
+20,08:00:00,08:00:00,1,1,,0,0,,1
+10,25:10:30,25:10:30,3,3,,0,0,,1
+20,08:05:00,08:05:00,2,2,,0,0,,
+"""
+
+
+class StopTimes_StopTimes_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		path = Path(cls._tmp.name) / "stop_times.txt"
+
+		with open(path, 'w') as f:
+			f.write(STOP_TIMES_TXT)
+
+		cls._st = StopTimes(path)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def test_trip_stoptimes_sorted(self):
+		self.assertEqual(
+			[st.stop_id for st in self._st.get_trip_stoptimes(10)],
+			[1, 2, 3]
+		)
+
+		self.assertEqual(
+			[st.stop_sequence for st in self._st.get_trip_stoptimes(20)],
+			[1, 2, 3]
+		)
+
+	def test_stop_stoptimes_sorted(self):
+		self.assertEqual(
+			[st.trip_id for st in self._st.get_stop_stoptimes(3)],
+			[20, 10]
+		)
+
+	def test_trip_mask(self):
+		mask = self._st.trip_mask([20, 30])
+
+		self.assertEqual(mask.tolist(), [False, True])
+		self.assertEqual(
+			[st.trip_id for st in self._st.get_stop_stoptimes(3, mask)],
+			[20]
+		)
+		self.assertEqual(
+			self._st.get_stop_stoptimes(1, self._st.trip_mask([])),
+			[]
+		)
+
+	def test_times(self):
+		st = self._st.get_trip_stoptimes(10)[1]
+
+		self.assertEqual(st.arrival_time, GT("07:05:00"))
+		self.assertEqual(st.departure_time, GT("07:06:00"))
+		self.assertFalse(st.is_timepoint)
+
+		self.assertEqual(
+			self._st.get_trip_stoptimes(10)[2].departure_time,
+			GT("25:10:30")
+		)
+
+	def test_missing_timepoint_defaults_true(self):
+		self.assertTrue(self._st.get_trip_stoptimes(20)[1].is_timepoint)
+
+	def test_name(self):
+		self.assertEqual(
+			self._st.get_trip_stoptimes(20)[0].name,
+			"20_1_1"
+		)
+
+	def test_unknown_ids(self):
+		with self.assertRaises(KeyError):
+			self._st.get_trip_stoptimes(30)
+
+		with self.assertRaises(KeyError):
+			self._st.get_stop_stoptimes(4)
+
+	def test_views_compare_by_row(self):
+		self.assertEqual(
+			self._st.get_trip_stoptimes(10)[0],
+			self._st.get_stop_stoptimes(1)[0]
+		)
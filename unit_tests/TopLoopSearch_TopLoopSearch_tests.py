@@ -0,0 +1,140 @@
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, "../")
+from src.PatrolRoutes.GTFSTime import GTFSTime
+from src.PatrolRoutes.LoopEnumerator import LoopEnumerator
+from src.PatrolRoutes.SegmentGraph import SegmentGraph
+from src.PatrolRoutes.Settings import Settings
+from src.PatrolRoutes.TopLoopSearch import (
+	FewestWalkingTransfers, LeastWaiting, MostDistinctRoutes, StationsCovered,
+	TopLoopSearch, WeightedScore
+)
+from unit_tests.synthetic_feed import write_feed, write_settings
+
+
+class TopLoopSearch_TopLoopSearch_tests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		tmp_dir = Path(cls._tmp.name)
+
+		cls._settings = Settings(write_settings(
+			tmp_dir / "settings.json",
+			write_feed(tmp_dir / "feed"),
+			max_transfer_time_minutes = 40,
+			loop_max_duration_hours = 2.0,
+			loop_min_duration_hours = 1.5
+		))
+
+		cls._sg = SegmentGraph(cls._settings)
+		cls._sg.build_graph()
+
+		cls._enumerator = LoopEnumerator(cls._sg, cls._settings)
+		cls._loops = [
+			loop.edge_ids for loop in cls._enumerator.enumerate()
+		]
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _scores(self):
+		return {
+			"walking": FewestWalkingTransfers(),
+			"waiting": LeastWaiting(),
+			"routes": MostDistinctRoutes(),
+			"stations": StationsCovered(["Beta Av & Hill St", "Gamma Rd & Low St"]),
+			"weighted": WeightedScore([
+				(1.0, MostDistinctRoutes()),
+				(1/600, LeastWaiting())
+			])
+		}
+
+	def _brute_force(self, score, k):
+		g = self._sg.csr
+		score.prepare(g, self._settings)
+
+		ranked = sorted(
+			self._loops, key = lambda edge_ids: score.score(g, edge_ids),
+			reverse = True
+		)
+
+		return [(score.score(g, edge_ids), edge_ids) for edge_ids in ranked[:k]]
+
+	def test_matches_brute_force(self):
+		self.assertGreater(len(self._loops), 10)
+
+		for name, score in self._scores().items():
+			for k in [1, 5, 2*len(self._loops)]:
+				with self.subTest(score = name, k = k):
+					search = TopLoopSearch(self._sg, self._settings, score, k)
+					found = [
+						(s, loop.edge_ids) for s, loop in search.search()
+					]
+
+					self.assertEqual(found, self._brute_force(score, k))
+
+	def test_bound_cuts_search(self):
+		score = LeastWaiting()
+		search = TopLoopSearch(self._sg, self._settings, score, k = 3)
+		best = search.search()
+
+		self.assertEqual(len(best), 3)
+		self.assertLess(search.n_scored, len(self._loops))
+		self.assertLess(search.n_expansions, self._enumerator.n_expansions)
+
+		scores = [s for s, _ in best]
+		self.assertEqual(scores, sorted(scores, reverse = True))
+
+	def test_loops(self):
+		search = TopLoopSearch(
+			self._sg, self._settings, MostDistinctRoutes(), k = 4
+		)
+
+		for i, (_, loop) in enumerate(search.search()):
+			self.assertEqual(loop.loop_number, i)
+			self.assertIn(loop.edge_ids, self._loops)
+
+	def test_filters(self):
+		origin = "Gamma Station"
+		after = GTFSTime.from_fstr("07:00:00")
+
+		search = TopLoopSearch(self._sg, self._settings, LeastWaiting(), k = 100)
+		best = search.search(origin_station = origin, start_after = after)
+
+		expected = [
+			loop.edge_ids
+			for loop in LoopEnumerator(self._sg, self._settings).enumerate(
+				origin_station = origin, start_after = after
+			)
+		]
+
+		self.assertGreater(len(best), 0)
+		self.assertEqual(len(best), min(100, len(expected)))
+		for _, loop in best:
+			self.assertIn(loop.edge_ids, expected)
+
+	def test_negative_weight(self):
+		with self.assertRaises(ValueError):
+			WeightedScore([(-1.0, LeastWaiting())])
+
+	def test_k_too_small(self):
+		for k in [0, -1]:
+			with self.assertRaises(ValueError):
+				TopLoopSearch(self._sg, self._settings, FewestWalkingTransfers(), k)
+
+	def test_unknown_station(self):
+		search = TopLoopSearch(
+			self._sg, self._settings, StationsCovered(["Nowhere"]), k = 1
+		)
+
+		with self.assertRaises(KeyError):
+			search.search()
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,201 @@
+"""
+Small generated GTFS feed for tests that can't rely on a full agency feed
+being checked out.
+
+Three routes run around a triangle of stations:
+
+	A: Alpha -> Beta, B: Beta -> Gamma, C: Gamma -> Alpha
+
+Alpha and Gamma are single stops shared by two routes (waiting transfers).
+At Beta, route A arrives at "Beta Av & 1st St" and route B leaves from
+"1st St & Beta Av" across the street (walking transfer, same standard stop
+name). Route X duplicates route A and is excluded in the generated
+settings. Every route runs every 15 minutes from 06:00 on weekdays, and
+each trip takes 12 minutes over 4 stops.
+"""
+
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+SERVICE_DATE = "20250806" ## Wednesday
+
+STOPS: List[Tuple[int, str, float, float]] = [
+	(1, "Alpha Transit Center", 32.7500, -117.1500),
+	(11, "Alpha Rd & 2nd St", 32.7500, -117.1400),
+	(12, "Alpha Rd & 3rd St", 32.7500, -117.1300),
+	(2, "Beta Av & 1st St", 32.7500, -117.1200),
+	(3, "1st St & Beta Av", 32.7502, -117.1198),
+	(21, "Beta Av & Hill St", 32.7580, -117.1250),
+	(22, "Beta Av & Top St", 32.7660, -117.1300),
+	(4, "Gamma Station", 32.7750, -117.1350),
+	(31, "Gamma Rd & Low St", 32.7670, -117.1400),
+	(32, "Gamma Rd & Park St", 32.7580, -117.1450),
+]
+
+## route_id: (stop_ids, first departure minutes after midnight, headsign)
+ROUTES: Dict[str, Tuple[List[int], int, str]] = {
+	"A": ([1, 11, 12, 2], 6*60, "Beta"),
+	"B": ([3, 21, 22, 4], 6*60 + 5, "Gamma"),
+	"C": ([4, 31, 32, 1], 6*60 + 10, "Alpha"),
+	"X": ([1, 11, 12, 2], 6*60 + 7, "Beta"),
+}
+
+N_TRIPS_PER_ROUTE = 16
+HEADWAY_MIN = 15
+STOP_SPACING_MIN = 4
+
+NON_TIMEPOINT_STOPS = {12}
+
+
+def _fmt(minutes: int) -> str:
+	return f"{minutes // 60:02}:{minutes % 60:02}:00"
+
+
+def trip_id(route_id: str, n: int) -> int:
+	return (1 + sorted(ROUTES.keys()).index(route_id))*1000 + n
+
+
+def write_feed(feed_dir: Path) -> Path:
+	"""
+	Writes the feed files into `feed_dir` and returns it.
+	"""
+	feed_dir = Path(feed_dir)
+	feed_dir.mkdir(parents = True, exist_ok = True)
+
+	with open(feed_dir / "calendar.txt", 'w') as f:
+		f.write(
+			"service_id,monday,tuesday,wednesday,thursday,friday,saturday,"
+			"sunday,start_date,end_date,service_name\n"
+			"WKDY,1,1,1,1,1,0,0,20250101,20251231,Weekdays\n"
+			"WKND,0,0,0,0,0,1,1,20250101,20251231,Weekends\n"
+		)
+
+	with open(feed_dir / "calendar_dates.txt", 'w') as f:
+		f.write(
+			"service_id,date,exception_type\n"
+			"WKDY,20250704,2\n"
+			"WKND,20250704,1\n"
+		)
+
+	with open(feed_dir / "stops.txt", 'w') as f:
+		f.write("stop_id,stop_code,stop_name,stop_lat,stop_lon,location_type\n")
+		f.write("alphaS,,Alpha Transit Center,32.75,-117.15,1\n")
+		for stop_id, name, lat, lon in STOPS:
+			f.write(f"{stop_id},,{name},{lat},{lon},0\n")
+
+	trips_rows = [
+		"route_id,service_id,trip_id,trip_headsign,direction_id,shape_id,"
+		"direction_name"
+	]
+	stop_times_rows = [
+		"trip_id,arrival_time,departure_time,stop_id,stop_sequence,timepoint"
+	]
+	shapes_rows = [
+		"shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence,"
+		"shape_dist_traveled"
+	]
+
+	stop_pts = {stop_id: (lat, lon) for stop_id, _, lat, lon in STOPS}
+
+	for route_id, (stop_ids, first_dep, headsign) in ROUTES.items():
+		for seq, stop_id in enumerate(stop_ids):
+			lat, lon = stop_pts[stop_id]
+			shapes_rows.append(f"shp_{route_id},{lat},{lon},{seq + 1},{float(seq)}")
+
+		for n in range(N_TRIPS_PER_ROUTE):
+			tid = trip_id(route_id, n)
+			trips_rows.append(
+				f"{route_id},WKDY,{tid},{headsign},0,shp_{route_id},Forward"
+			)
+
+			for seq, stop_id in enumerate(stop_ids):
+				t = _fmt(first_dep + n*HEADWAY_MIN + seq*STOP_SPACING_MIN)
+				tp = 0 if stop_id in NON_TIMEPOINT_STOPS else 1
+				stop_times_rows.append(f"{tid},{t},{t},{stop_id},{seq + 1},{tp}")
+
+	## A couple of weekend-only trips on route A
+	for n in range(2):
+		tid = 9000 + n
+		trips_rows.append(f"A,WKND,{tid},Beta,0,shp_A,Forward")
+		for seq, stop_id in enumerate(ROUTES["A"][0]):
+			t = _fmt(8*60 + n*60 + seq*STOP_SPACING_MIN)
+			stop_times_rows.append(f"{tid},{t},{t},{stop_id},{seq + 1},1")
+
+	for name, rows in (
+		("trips.txt", trips_rows),
+		("stop_times.txt", stop_times_rows),
+		("shapes.txt", shapes_rows)
+	):
+		with open(feed_dir / name, 'w') as f:
+			f.write('\n'.join(rows) + '\n')
+
+	return feed_dir
+
+
+def write_boundary(path: Path) -> Path:
+	"""
+	A box around every stop in the feed.
+	"""
+	with open(path, 'w') as f:
+		f.write(
+			"32.78, -117.16 # northwest\n"
+			"32.78, -117.11 # northeast\n"
+			"32.74, -117.11 # southeast\n"
+			"32.74, -117.16 # southwest\n"
+		)
+
+	return Path(path)
+
+
+def write_settings(
+	path: Path,
+	feed_dir: Path,
+	boundary_path: "Path|None" = None,
+	**overrides: Any
+) -> Path:
+	"""
+	Settings JSON for the generated feed. Keyword arguments replace keys in
+	the "segment_graph" or "loop" sections, or top-level keys.
+	"""
+	sd: Dict[str, Any] = {
+		"gtfs_path": str(feed_dir),
+		"walking_transfers_path": None,
+		"boundary_path": None if boundary_path is None else str(boundary_path),
+		"segment_graph_path": None,
+		"loops_path": None,
+		"service_date": SERVICE_DATE,
+		"route_id_masks": {"A": "Alpha Line"},
+		"exclude_routes": ["X"],
+		"the_routes": ["A"],
+		"segment_graph": {
+			"max_transfer_time_minutes": 15,
+			"min_transfer_time_minutes": 2,
+			"max_transfer_distance_miles": 0.1,
+			"transfer_timepoint_only": False,
+			"implicit_trip_edges": False,
+			"filtered_load": False
+		},
+		"loop": {
+			"loop_max_duration_hours": 1.5,
+			"loop_min_duration_hours": 0.5,
+			"loop_min_segments": 3,
+			"trip_min_duration_minutes": 5,
+			"allow_consecutive_same_route": False
+		}
+	}
+
+	for key, val in overrides.items():
+		if key in sd["segment_graph"]:
+			sd["segment_graph"][key] = val
+		elif key in sd["loop"]:
+			sd["loop"][key] = val
+		else:
+			sd[key] = val
+
+	with open(path, 'w') as f:
+		json.dump(sd, f, indent = 1)
+
+	return Path(path)